@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.instrumentation.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -85,13 +87,141 @@ ASGI_APPLICATION = 'core.asgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE=postgres bo'lsa PostgreSQL (POSTGRES_* o'zgaruvchilari), aks holda SQLite
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'expense'),
+            'USER': os.environ.get('POSTGRES_USER', 'expense'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # Ulanish ishlatishdan oldin tekshiriladi (pulda ham - psycopg_pool `check`)
+            'CONN_HEALTH_CHECKS': True,
+            # Eksport va katta `.iterator()` lar server tomonidagi kursor bilan o'qiladi;
+            # PgBouncer transaction rejimida o'chirish kerak
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+            'OPTIONS': {},
+            'TEST': {'NAME': os.environ.get('POSTGRES_TEST_DB')},
+        }
+    }
+    if os.environ.get('DB_POOL', '1') == '1':
+        # psycopg[pool]: har bir jarayonda ulanishlar puli (CONN_MAX_AGE bilan birga ishlatilmaydi)
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # Ulanish so'rovlar orasida saqlanadi - PRAGMA lar har safar qayta o'rnatilmaydi
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Yozish qulfi tranzaksiya boshida olinadi (busy_timeout davomida kutiladi)
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Har bir SQLite ulanishida o'rnatiladigan PRAGMA lar (qarang: main/sqlite.py).
+# journal_mode=WAL bu yerda yo'q: u baza fayli sarlavhasiga yoziladi va bir marta
+# `python manage.py optimize_sqlite --wal` bilan yoqiladi.
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',         # faqat WAL da; rollback jurnalida FULL qo'llanadi
+    'busy_timeout': 5000,            # ms
+    'mmap_size': 256 * 1024 * 1024,  # bayt
+    'cache_size': -64 * 1024,        # KiB (64 MB)
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Statistika javoblari va ma'lumotlar avlodi tokenlari shu yerda saqlanadi.
+# Bir nechta worker jarayonlari bir xil keshni ko'rishi uchun umumiy backend kerak
+# (fayl, Redis yoki Memcached); LocMemCache faqat bitta jarayon uchun yaroqli.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
     }
 }
 
+# Statistika javoblarini keshda saqlash muddati (soniya)
+STATS_CACHE_TIMEOUT = 300
+
+# Dashboard snapshoti yozuvdan keyin qayta hisoblanadi: 'thread' (fon oqimida,
+# DASHBOARD_SNAPSHOT_DELAY soniya ichidagi yozuvlar bitta hisoblashga birlashadi)
+# yoki 'sync' (tranzaksiya tasdiqlangan zahoti)
+DASHBOARD_SNAPSHOT_BACKEND = 'thread'
+DASHBOARD_SNAPSHOT_DELAY = 1.0
+
+
+# So'rovlar o'lchovi (Server-Timing)
+# DB, serializatsiya, view va render vaqtini javob sarlavhasida qaytarish
+SERVER_TIMING_ENABLED = True
+# Har bir so'rov o'lchovlarini `main.timing` loggeriga JSON qator sifatida yozish
+SERVER_TIMING_LOG = False
+
+# Yig'ma metrikalar (/api/metrics/). Har bir worker jarayoni METRICS_DIR ga
+# o'z faylini yozadi, endpoint ularni qo'shib chiqaradi.
+METRICS_ENABLED = True
+METRICS_DIR = BASE_DIR / '.metrics'
+# Jarayon metrikalarini faylga yozish oralig'i (soniya)
+METRICS_FLUSH_INTERVAL = 1.0
+# Prometheus uchun token (X-Metrics-Token sarlavhasi); bo'sh bo'lsa faqat ceoadmin ko'radi
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Chiqim rasmlarini WebP ga o'girish: 'process' (alohida jarayonlar puli),
+# 'thread' (fon oqimi) yoki 'sync' (so'rov ichida)
+IMAGE_ENCODE_BACKEND = 'process'
+IMAGE_ENCODE_WORKERS = 2
+# Ro'yxat va ko'rinishlar uchun kichraytirilgan nusxalar (eng uzun tomoni, px)
+IMAGE_VARIANT_SIZES = (128, 512)
+# Qabul qilinadigan rasmning eng ko'p piksellari soni (dekompressiya bombasidan himoya)
+IMAGE_MAX_PIXELS = 50_000_000
+# Saqlanadigan rasmning eng uzun tomoni (px); JPEG shu o'lchamga yaqin masshtabda o'qiladi
+IMAGE_MAX_DIMENSION = 2048
+
+# Multipart fayllar xotirada emas, darhol vaqtinchalik faylga oqim bilan yoziladi
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+
+# Bo'laklab yuklash (/api/uploads/)
+UPLOAD_SESSION_DIR = BASE_DIR / '.uploads'
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 5 * 1024 * 1024
+# Tugallanmagan yoki biriktirilmagan sessiyalar shu muddatdan (soniya) keyin o'chiriladi
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+# Import uchun yuklangan CSV fayllar (MEDIA_ROOT dan tashqarida, veb orqali berilmaydi)
+IMPORT_ROOT = BASE_DIR / '.imports'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'main.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -126,13 +256,32 @@ USE_TZ = True
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
-import os
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / "static/"]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Chek rasmlari kontent xeshi bo'yicha saqlanadi (bir xil fayl bir marta yoziladi)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'receipts': {
+        'BACKEND': 'main.storage.ContentHashStorage',
+    },
+}
+# Chek rasmlarini kim uzatadi: '' - Django (Range bilan), 'nginx' - X-Accel-Redirect,
+# 'apache'/'lighttpd' - X-Sendfile (qarang: main/media.py)
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '')
+# nginx dagi `internal` location prefiksi (MEDIA_ROOT ga alias)
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Havolasi qolmagan chek fayllari shu muddatdan (soniya) keyin o'chiriladi (gc_receipts)
+RECEIPT_GC_GRACE = 60 * 60
+
 STATICFILES_FINDERS = [
     'django.contrib.staticfiles.finders.FileSystemFinder',
     'django.contrib.staticfiles.finders.AppDirectoriesFinder',
@@ -149,7 +298,8 @@ CORS_ALLOW_ALL_ORIGINS = True  # Development only - restrict in production
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Rol versiyasi eskirgan tokenlarni rad etadi (qarang: main/tokens.py)
+        'main.authentication.RoleClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -159,6 +309,10 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# JWT autentifikatsiyasida foydalanuvchilar keshi (har bir jarayonda, qarang: main/authentication.py)
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL = 300
+
 # Simple JWT Configuration
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=12),
@@ -166,6 +320,9 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Access tokenga rol, ceoadmin holati va rol versiyasi yoziladi
+    'TOKEN_OBTAIN_SERIALIZER': 'main.tokens.ExpenseTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'main.tokens.ExpenseTokenRefreshSerializer',
 }
 
 # DRF Spectacular (Swagger) Configuration - O'zbek tilida
@@ -29,6 +29,7 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 from drf_spectacular.utils import extend_schema
+from main.views import ReceiptMediaView
 
 
 # JWT views uchun Swagger dokumentatsiyasi
@@ -108,4 +109,7 @@ urlpatterns = [
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Chek rasmlari ruxsat tekshirilib beriladi (qarang: main/media.py)
+urlpatterns += [
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:name>", ReceiptMediaView.as_view(), name='receipt-media'),
+]
\ No newline at end of file
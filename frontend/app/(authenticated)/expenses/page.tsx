@@ -5,6 +5,7 @@ import { useEffect, useState } from "react"
 import { createPortal } from "react-dom"
 import { useSearchParams } from "next/navigation"
 import { apiCall } from "@/lib/auth"
+import { useProtectedImage } from "@/hooks/use-protected-image"
 import { getErrorMessage } from "@/lib/error-utils"
 import { MoneyInput, DateInput } from "@/components/formatted-inputs"
 import { formatCurrency, dmyToYmd, ymdToDmy } from "@/lib/format-utils"
@@ -104,6 +105,7 @@ function ExpensesContent() {
   // Image preview state
   const [imageModalOpen, setImageModalOpen] = useState(false)
   const [previewImage, setPreviewImage] = useState("")
+  const previewImageSrc = useProtectedImage(previewImage)
 
   const [formData, setFormData] = useState({
     building: "",
@@ -270,6 +272,7 @@ function ExpensesContent() {
   const pageTotalAmount = expenses.reduce((sum, exp) => sum + (Number(exp.amount) || 0), 0)
 
   const showEditWarning = editingId && formData.image && expenses.find(e => e.id === editingId)?.image;
+  const formImageSrc = useProtectedImage(formData.image || (editingId ? expenses.find(e => e.id === editingId)?.image : "") || "")
 
   return (
     <div className="space-y-6">
@@ -538,7 +541,7 @@ function ExpensesContent() {
                 <div className="relative w-32 h-32 rounded-lg overflow-hidden border border-slate-600 bg-slate-900">
                   {/* eslint-disable-next-line @next/next/no-img-element */}
                   <img
-                    src={formData.image || expenses.find(e => e.id === editingId)?.image || ""}
+                    src={formImageSrc}
                     alt="Preview"
                     className="w-full h-full object-cover cursor-zoom-in hover:opacity-90 transition-opacity"
                     onClick={() => openImagePreview(formData.image || expenses.find(e => e.id === editingId)?.image || "")}
@@ -592,7 +595,7 @@ function ExpensesContent() {
             <div className="relative w-full h-full flex items-center justify-center" onClick={(e) => e.stopPropagation()}>
               {/* eslint-disable-next-line @next/next/no-img-element */}
               <img
-                src={previewImage}
+                src={previewImageSrc}
                 alt="Full preview"
                 className="max-w-full max-h-full object-contain rounded-lg shadow-2xl"
               />
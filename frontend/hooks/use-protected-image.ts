@@ -0,0 +1,40 @@
+import * as React from 'react'
+
+import { getAuthToken } from '@/lib/auth'
+
+// Chek rasmlari JWT bilan himoyalangan - <img src> o'zi Authorization
+// sarlavhasini yubora olmaydi, shuning uchun rasm fetch bilan olinib,
+// blob URL sifatida ko'rsatiladi. data: va blob: URL lar o'zgarmaydi.
+export function useProtectedImage(url: string | null | undefined) {
+  const [src, setSrc] = React.useState('')
+
+  React.useEffect(() => {
+    if (!url || url.startsWith('data:') || url.startsWith('blob:')) {
+      setSrc(url || '')
+      return
+    }
+
+    let objectUrl = ''
+    let cancelled = false
+    ;(async () => {
+      const token = await getAuthToken()
+      const response = await fetch(url, {
+        headers: token ? { Authorization: `Bearer ${token}` } : {},
+      })
+      if (!response.ok || cancelled) return
+      objectUrl = URL.createObjectURL(await response.blob())
+      if (cancelled) {
+        URL.revokeObjectURL(objectUrl)
+        return
+      }
+      setSrc(objectUrl)
+    })().catch(() => setSrc(''))
+
+    return () => {
+      cancelled = true
+      if (objectUrl) URL.revokeObjectURL(objectUrl)
+    }
+  }, [url])
+
+  return src
+}
@@ -56,7 +56,10 @@ class BuildingAdmin(admin.ModelAdmin):
     ]
     list_filter = ['status', 'start_date', 'created_at']
     search_fields = ['name', 'description']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = [
+        'created_at', 'updated_at',
+        'expenses_count', 'last_expense_date', 'category_totals'
+    ]
     list_per_page = 25
     date_hierarchy = 'created_at'
     
@@ -67,6 +70,9 @@ class BuildingAdmin(admin.ModelAdmin):
         ("Moliyaviy ma'lumotlar", {
             'fields': ('budget', 'spent_amount')
         }),
+        ("Chiqimlar hisoblagichlari", {
+            'fields': ('expenses_count', 'last_expense_date', 'category_totals')
+        }),
         ('Sanalar', {
             'fields': ('start_date', 'end_date', 'created_at', 'updated_at')
         }),
@@ -101,8 +107,7 @@ class BuildingAdmin(admin.ModelAdmin):
     formatted_remaining.short_description = 'Qolgan'
     
     def expenses_count(self, obj):
-        count = obj.expenses.count()
-        return mark_safe(f'<a href="/admin/main/expense/?building__id__exact={obj.id}">{count} ta</a>')
+        return mark_safe(f'<a href="/admin/main/expense/?building__id__exact={obj.id}">{obj.expenses_count} ta</a>')
     expenses_count.short_description = 'Chiqimlar'
 
 
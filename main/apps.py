@@ -7,3 +7,6 @@ class MainConfig(AppConfig):
 
     def ready(self):
         import main.signals
+        from django.db.backends.signals import connection_created
+        from main.sqlite import configure_connection
+        connection_created.connect(configure_connection, dispatch_uid='main.sqlite')
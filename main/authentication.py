@@ -0,0 +1,95 @@
+"""
+JWT autentifikatsiyasi
+
+- rol versiyasi eskirgan tokenlar rad etiladi (qarang: tokens.py);
+- foydalanuvchi obyekti har bir so'rovda bazadan o'qilmaydi: jarayon ichidagi
+  LRU keshda `AUTH_USER_CACHE_TTL` soniya saqlanadi. Foydalanuvchi yoki uning
+  guruhlari o'zgarsa 'users' avlodi almashtiriladi (signals.py) va barcha
+  worker jarayonlaridagi yozuvlar bir vaqtda eskiradi.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from . import metrics, tokens
+from .generations import get_generation
+
+
+class UserCache:
+    """
+    Foydalanuvchilar uchun chegaralangan, muddatli LRU kesh (bitta jarayon uchun)
+
+    Yozuv (foydalanuvchi, 'users' avlodi tokeni, muddati) ko'rinishida saqlanadi;
+    avlod tokeni o'zgargan yoki muddati o'tgan yozuv ishlatilmaydi.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id, generation):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            user, stored_generation, expires = entry
+            if stored_generation != generation or expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+        # Har bir so'rov o'z nusxasini oladi - view obyektga yozsa boshqalarga ta'sir qilmaydi
+        return copy.copy(user)
+
+    def set(self, user_id, user, generation):
+        ttl = getattr(settings, 'AUTH_USER_CACHE_TTL', 300)
+        size = getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024)
+        with self.lock:
+            self.entries[user_id] = (copy.copy(user), generation, time.monotonic() + ttl)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Tokendagi `rv` joriy rol versiyasiga teng bo'lishi kerak
+
+    Rol ma'lumotlari bo'lmagan (eski) tokenlar ham qabul qilinmaydi - mijoz
+    refresh token bilan yangisini oladi. Foydalanuvchi `user_cache` dan olinadi.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        if not tokens.has_role_claims(token) or token[tokens.VERSION_CLAIM] != tokens.role_version(user_id):
+            raise InvalidToken("Foydalanuvchi roli o'zgargan - tokenni yangilang")
+        return token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024):
+            return super().get_user(validated_token)
+        # Avlod tokeni bazadan oldin olinadi: o'qish paytida o'zgarish bo'lsa, yozuv keyingi so'rovda eskiradi
+        generation = get_generation('users')
+        user = user_cache.get(user_id, generation)
+        if user is not None:
+            metrics.inc('auth_user_cache_total', result='hit')
+            return user
+        metrics.inc('auth_user_cache_total', result='miss')
+        # Tekshiruvlar (faol emas, topilmadi) simplejwt ning o'zida
+        user = super().get_user(validated_token)
+        user_cache.set(user_id, user, generation)
+        return user
@@ -0,0 +1,97 @@
+"""
+Chiqimlarni ommaviy qo'shish
+
+Bino va kategoriyalar har bir model uchun bitta `in_bulk` so'rovi bilan
+tekshiriladi, to'g'ri qatorlar bitta tranzaksiyada `bulk_create` bilan
+yoziladi, kunlik yig'indi va bino hisoblagichlari esa har bir bino uchun
+bir marta yangilanadi. Xato qatorlar qolganlarini to'xtatmaydi - ular
+indeksi bilan alohida qaytariladi.
+"""
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from . import rollup
+from .generations import bump_generation
+from .models import Building, Expense, ExpenseCategory
+
+
+# Bitta so'rovdagi eng ko'p chiqimlar soni
+MAX_ITEMS = 500
+
+
+class BulkExpenseItemSerializer(serializers.Serializer):
+    """
+    Ommaviy qo'shishdagi bitta chiqim
+
+    Bino va kategoriya bu yerda faqat ID sifatida o'qiladi - ularning mavjudligi
+    barcha qatorlar uchun birgalikda tekshiriladi.
+    """
+    building = serializers.IntegerField(help_text="Bino ID si")
+    category = serializers.IntegerField(required=False, allow_null=True, help_text="Kategoriya ID si")
+    description = serializers.CharField(max_length=500, help_text="Chiqim haqida qisqacha ma'lumot")
+    amount = serializers.DecimalField(max_digits=15, decimal_places=2, help_text="Chiqim summasi (so'm)")
+    date = serializers.DateField(
+        required=False,
+        allow_null=True,
+        help_text="Chiqim sanasi (YYYY-MM-DD). Kiritilmasa bugungi sana ishlatiladi."
+    )
+
+
+def _does_not_exist(pk):
+    return [PrimaryKeyRelatedField.default_error_messages['does_not_exist'].format(pk_value=pk)]
+
+
+def create_expenses(items, user):
+    """
+    Chiqimlarni ommaviy yaratish
+
+    Natija: (yaratilgan chiqimlar ro'yxati, [{'index': i, 'errors': {...}}, ...])
+    """
+    validated = []
+    errors = []
+    for index, item in enumerate(items):
+        serializer = BulkExpenseItemSerializer(data=item)
+        if serializer.is_valid():
+            validated.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    buildings = Building.objects.in_bulk({data['building'] for _, data in validated})
+    categories = ExpenseCategory.objects.in_bulk(
+        {data['category'] for _, data in validated if data.get('category') is not None}
+    )
+
+    today = timezone.now().date()
+    expenses = []
+    for index, data in validated:
+        item_errors = {}
+        building = buildings.get(data['building'])
+        if building is None:
+            item_errors['building'] = _does_not_exist(data['building'])
+        category = None
+        if data.get('category') is not None:
+            category = categories.get(data['category'])
+            if category is None:
+                item_errors['category'] = _does_not_exist(data['category'])
+        if item_errors:
+            errors.append({'index': index, 'errors': item_errors})
+            continue
+        expenses.append(Expense(
+            building=building,
+            category=category,
+            description=data['description'],
+            amount=data['amount'],
+            date=data.get('date') or today,
+            created_by=user
+        ))
+
+    if expenses:
+        with transaction.atomic():
+            Expense.objects.bulk_create(expenses)
+            rollup.record_created([rollup.expense_values(expense) for expense in expenses])
+            bump_generation('expenses', 'buildings')
+
+    errors.sort(key=lambda error: error['index'])
+    return expenses, errors
@@ -0,0 +1,179 @@
+"""
+Statistika endpointlari uchun javoblar keshi
+
+Kesh kaliti endpoint nomi, normallashtirilgan so'rov parametrlari, foydalanuvchi
+roli va ma'lumotlar avlodi tokenlaridan tuziladi. Chiqim, bino yoki kategoriya
+o'zgarganda tokenlar almashtiriladi (qarang: generations.py), shuning uchun
+eski yozuvlarni alohida o'chirish shart emas.
+
+Bir xil kalit bo'yicha bir vaqtda kelgan so'rovlarda natija faqat bir marta
+hisoblanadi (single-flight): jarayon ichida boshqa oqimlar birinchi oqim
+natijasini kutadi, jarayonlar orasida esa qulf orqali kutiladi. Qulf
+`cache.add` bilan olinadi (Redis, Memcached - atomar amal), faqat
+FileBasedCache da `add` atomar emas (tekshirish va yozish alohida), shuning
+uchun u yerda kesh papkasidagi fayl qulfidan (flock) foydalaniladi.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+from django.utils import timezone
+
+from . import metrics
+from .generations import DATA_GENERATIONS, get_generations
+from .stats import CEO_ADMIN_USERNAME
+
+
+KEY_PREFIX = 'stats:'
+
+# Boshqa jarayon hisoblayotgan natijani kutish vaqti (soniya)
+LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+
+# FileBasedCache: kalitlar shuncha qulf fayliga taqsimlanadi (fayllar soni cheklangan)
+LOCK_STRIPES = 64
+
+
+class _Flight:
+    """Jarayon ichida hisoblanayotgan bitta kalit"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def role_scope(user):
+    """Javob tarkibiga ta'sir qiluvchi rol (ceoadmin boshqa foydalanuvchilardan ko'proq ko'radi)"""
+    return 'ceoadmin' if user.username == CEO_ADMIN_USERNAME else 'user'
+
+
+def normalize_params(params):
+    """So'rov parametrlarini tartiblangan, bo'sh qiymatlarsiz ko'rinishga keltirish"""
+    return tuple(sorted(
+        (key, value)
+        for key in params
+        for value in params.getlist(key)
+        if value != ''
+    ))
+
+
+def cache_key(endpoint, params=(), scope='', dependencies=DATA_GENERATIONS):
+    generations = get_generations(dependencies)
+    raw = repr((endpoint, params, scope, generations))
+    return KEY_PREFIX + endpoint + ':' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _file_lock(backend, key):
+    """Kesh papkasidagi fayl qulfi - jarayon to'xtasa ham OT uni o'zi bo'shatadi"""
+    directory = os.path.join(backend._dir, 'locks')
+    os.makedirs(directory, exist_ok=True)
+    stripe = int(hashlib.sha1(key.encode()).hexdigest(), 16) % LOCK_STRIPES
+    handle = open(os.path.join(directory, f'{stripe}.lock'), 'ab')
+    if not locks.lock(handle, locks.LOCK_EX | locks.LOCK_NB):
+        handle.close()
+        return None
+
+    def release():
+        locks.unlock(handle)
+        handle.close()
+    return release
+
+
+def _try_lock(key):
+    """Qulfni kutmasdan olishga urinish: olinsa uni bo'shatuvchi funksiya, aks holda None"""
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, FileBasedCache):
+        return _file_lock(backend, key)
+    lock_key = key + ':lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        return lambda: cache.delete(lock_key)
+    return None
+
+
+def _compute_shared(key, compute, timeout):
+    """Boshqa jarayonlar bilan qulf orqali kelishib hisoblash"""
+    release = _try_lock(key)
+    if release is None:
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            release = _try_lock(key)
+            if release is not None:
+                # Qulf egasi natijani yozib, endigina bo'shatgan bo'lishi mumkin
+                value = cache.get(key)
+                if value is not None:
+                    release()
+                    return value
+                break
+    try:
+        value = compute()
+        cache.set(key, value, timeout)
+        return value
+    finally:
+        if release is not None:
+            release()
+
+
+def get_or_compute(key, compute, timeout=None):
+    """Keshdan olish yoki (bir marta) hisoblab keshga yozish"""
+    if timeout is None:
+        timeout = getattr(settings, 'STATS_CACHE_TIMEOUT', 300)
+
+    value = cache.get(key)
+    if value is not None:
+        metrics.inc('stats_cache_requests_total', result='hit')
+        return value
+    metrics.inc('stats_cache_requests_total', result='miss')
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        if not flight.event.wait(LOCK_TIMEOUT):
+            return compute()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    try:
+        flight.value = _compute_shared(key, compute, timeout)
+        return flight.value
+    except Exception as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.event.set()
+
+
+def cached_response_data(request, endpoint, compute, extra=()):
+    """
+    Statistika endpointi javobini keshdan olish
+
+    `extra` - URL dan olinadigan qo'shimcha qiymatlar (masalan, bino ID si).
+    Statistika oynalari (so'nggi 30 kun va h.k.) joriy sanaga bog'liq, shuning
+    uchun sana ham kalitga kiradi.
+    """
+    key = cache_key(
+        endpoint,
+        params=normalize_params(request.query_params) + tuple(extra) + (('today', timezone.localdate()),),
+        scope=role_scope(request.user)
+    )
+    return get_or_compute(key, compute)
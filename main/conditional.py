@@ -0,0 +1,100 @@
+"""
+Shartli GET (ETag / Last-Modified) yordamchilari
+
+Validatorlar javob tanasini serializatsiya qilmasdan hisoblanadi:
+- ro'yxatlar uchun filtrlangan querysetdagi eng so'nggi o'zgarish vaqti va
+  qatorlar soni (bitta aggregate so'rov);
+- bog'liq ma'lumotlar uchun avlod tokenlari (qarang: generations.py) -
+  masalan, bino ro'yxatidagi `expenses_count` chiqim yozilganda o'zgaradi,
+  lekin binoning `updated_at` maydoni o'zgarmaydi.
+
+Mijoz yuborgan `If-None-Match` / `If-Modified-Since` mos kelsa, 304 javob
+qaytariladi va view hech qanday og'ir ish bajarmaydi.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .caching import normalize_params
+from .generations import get_generations, token_time
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest()[:32])
+
+
+def queryset_state(queryset, field):
+    """Querysetdagi qatorlar soni va `field` bo'yicha eng so'nggi vaqt"""
+    state = queryset.order_by().aggregate(last=Max(field), count=Count('pk'))
+    return state['count'], state['last']
+
+
+class ConditionalGetMixin:
+    """
+    View javoblariga ETag va Last-Modified qo'shish
+
+    `etag_generations` - javob bog'liq bo'lgan ma'lumotlar guruhlari.
+    Ro'yxatlar uchun `last_modified_field` beriladi (masalan, 'updated_at'),
+    statistika viewlarida esa faqat avlod tokenlari va joriy sana ishlatiladi.
+    """
+    etag_generations = ()
+    last_modified_field = None
+
+    def get_validator_state(self, request):
+        """
+        ETag ga qo'shiladigan qiymatlar va oxirgi o'zgarish vaqti
+
+        Ro'yxat viewlarida filtrlangan queryset bo'yicha hisoblanadi.
+        """
+        if self.last_modified_field and getattr(self, 'action', None) == 'list':
+            count, last = queryset_state(
+                self.filter_queryset(self.get_queryset()), self.last_modified_field
+            )
+            return (count, last), last
+        # Statistika oynalari (so'nggi 30 kun va h.k.) joriy sanaga bog'liq
+        return (timezone.localdate(),), None
+
+    def conditional_response(self, request, build_response, generations=None, tokens=None):
+        """
+        Validatorlar mos kelsa 304, aks holda `build_response()` natijasini
+        ETag va Last-Modified sarlavhalari bilan qaytarish
+
+        `tokens` - javob aynan qaysi avlod tokenlari bilan hisoblangan bo'lsa
+        (masalan, snapshotda saqlangan); berilmasa joriy tokenlar olinadi.
+        """
+        state, last_modified = self.get_validator_state(request)
+        if tokens is not None:
+            generations = tuple(tokens)
+        else:
+            generations = get_generations(generations or self.etag_generations)
+        times = [last_modified, *(token_time(token) for token in generations)]
+        times = [value for value in times if value is not None]
+        last_modified = int(max(times).timestamp()) if times else None
+
+        etag = make_etag(
+            type(self).__name__,
+            request.path,
+            normalize_params(request.query_params),
+            request.user.pk,
+            state,
+            generations
+        )
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = build_response()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Javob foydalanuvchiga bog'liq - har safar validator bilan qayta tekshirilsin
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """Viewsetlarda ro'yxat javobi (faqat viewsetlar uchun)"""
+        parent = super().list
+        return self.conditional_response(request, lambda: parent(request, *args, **kwargs))
@@ -0,0 +1,186 @@
+"""
+Chiqimlarni CSV / XLSX formatida eksport qilish
+
+Qatorlar `.values()` va `iterator(chunk_size=...)` orqali bo'laklab o'qiladi
+va `StreamingHttpResponse` ga darhol yoziladi - xotira sarfi qatorlar soniga
+bog'liq emas. XLSX fayl standart kutubxona `zipfile` bilan oqim sifatida
+yoziladi (faqat yozish uchun, qo'shimcha kutubxona kerak emas).
+"""
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+CHUNK_SIZE = 2000
+
+# (sarlavha, values() maydoni)
+COLUMNS = [
+    ('ID', 'id'),
+    ('Sana', 'date'),
+    ('Bino', 'building__name'),
+    ('Kategoriya', 'category__name'),
+    ('Tavsif', 'description'),
+    ('Summa', 'amount'),
+    ('Kim tomonidan', 'created_by__username'),
+    ('Yaratilgan vaqt', 'created_at'),
+]
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def export_rows(queryset):
+    """Eksport qatorlari: har biri ustunlar tartibidagi qiymatlar ro'yxati"""
+    fields = [field for _, field in COLUMNS]
+    rows = queryset.order_by('-date', '-created_at', 'id').values_list(*fields)
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        row = list(row)
+        # Yaratilgan vaqt mahalliy vaqtda, soniyagacha
+        if row[-1] is not None:
+            row[-1] = timezone.localtime(row[-1]).strftime('%Y-%m-%d %H:%M:%S')
+        yield row
+
+
+class _Echo:
+    """csv.writer uchun: yozilgan qatorni qaytaradi"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    # Excel UTF-8 ni to'g'ri ochishi uchun BOM
+    yield '\ufeff' + writer.writerow([title for title, _ in COLUMNS])
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+class _ZipStream:
+    """
+    Faqat oldinga yoziladigan bufer
+
+    `seek` yo'qligi sababli zipfile har bir fayl uchun data descriptor yozadi
+    va ortga qaytmaydi - yozilgan baytlarni darhol mijozga yuborish mumkin.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Chiqimlar" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+# Son sifatida yoziladigan ustunlar (ID, Summa)
+NUMERIC_COLUMNS = {0, 5}
+
+# XML da ruxsat etilmagan boshqaruv belgilari
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_row(values):
+    cells = []
+    for index, value in enumerate(values):
+        if value is None:
+            cells.append('<c/>')
+        elif index in NUMERIC_COLUMNS:
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            text = escape(INVALID_XML_CHARS.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t>{text}</t></is></c>')
+    return '<row>' + ''.join(cells) + '</row>'
+
+
+def stream_xlsx(rows):
+    buffer = _ZipStream()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(XLSX_SHEET_START.encode())
+            sheet.write(_xlsx_row([title for title, _ in COLUMNS]).encode())
+            for number, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row).encode())
+                if number % CHUNK_SIZE == 0:
+                    yield buffer.drain()
+            sheet.write(XLSX_SHEET_END.encode())
+    yield buffer.drain()
+
+
+def export_response(queryset, file_format):
+    """Filtrlangan chiqimlarni fayl sifatida oqim bilan qaytarish"""
+    rows = export_rows(queryset)
+    stream = stream_xlsx(rows) if file_format == 'xlsx' else stream_csv(rows)
+    response = StreamingHttpResponse(stream, content_type=FORMATS[file_format])
+    filename = f'chiqimlar-{timezone.localdate().isoformat()}.{file_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
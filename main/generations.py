@@ -0,0 +1,84 @@
+"""
+Ma'lumotlar avlodi (generation) hisoblagichlari
+
+Har bir ma'lumotlar guruhi ('expenses', 'buildings', 'categories' va h.k.)
+uchun keshda tasodifiy token saqlanadi. Ma'lumot o'zgarganda token
+almashtiriladi va shu token bilan tuzilgan barcha kesh kalitlari o'z-o'zidan
+eskiradi. Kesh barcha worker jarayonlari uchun umumiy bo'lgani sababli
+o'zgarish hamma jarayonlarda bir vaqtda ko'rinadi.
+"""
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.dispatch import Signal
+
+
+KEY_PREFIX = 'generation:'
+
+# Statistika javoblari bog'liq bo'lgan ma'lumotlar guruhlari
+DATA_GENERATIONS = ('expenses', 'buildings', 'categories')
+
+# Foydalanuvchilar va ularning rollari
+USER_GENERATIONS = ('users',)
+
+# Tokenlar almashtirilganda yuboriladi (`names` - guruhlar nomlari)
+generations_bumped = Signal()
+
+
+def _cache():
+    return caches[getattr(settings, 'GENERATION_CACHE_ALIAS', 'default')]
+
+
+def _new_token():
+    # "<millisekundlar>-<tasodifiy>" - token yaratilgan vaqtni Last-Modified uchun olish mumkin
+    return '%x-%s' % (int(time.time() * 1000), uuid.uuid4().hex[:8])
+
+
+def token_time(token):
+    """Token yaratilgan vaqt (UTC) yoki aniqlab bo'lmasa None"""
+    try:
+        millis = int(token.split('-', 1)[0], 16)
+    except (AttributeError, ValueError):
+        return None
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc)
+
+
+def get_generations(names):
+    """Bir nechta guruh tokenlarini bitta kesh murojaati bilan olish"""
+    cache = _cache()
+    keys = [KEY_PREFIX + name for name in names]
+    found = cache.get_many(keys)
+    result = []
+    for key in keys:
+        token = found.get(key)
+        if token is None:
+            # Token yo'q (kesh tozalangan) - yangisini yaratamiz, eski kalitlar bilan to'qnashmaydi
+            cache.add(key, _new_token(), None)
+            token = cache.get(key)
+        result.append(token)
+    return tuple(result)
+
+
+def get_generation(name):
+    return get_generations([name])[0]
+
+
+def _bump(names):
+    _cache().set_many({KEY_PREFIX + name: _new_token() for name in names}, None)
+
+
+def bump_generation(*names):
+    """
+    Guruh tokenlarini almashtirish
+
+    Token darhol va tranzaksiya tasdiqlangandan keyin yana bir bor
+    almashtiriladi: tasdiqlanishdan oldin eski ma'lumot bilan hisoblangan
+    natija yangi token ostida keshda qolib ketmasligi uchun.
+    """
+    _bump(names)
+    transaction.on_commit(lambda: _bump(names))
+    generations_bumped.send(sender=None, names=names)
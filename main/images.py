@@ -0,0 +1,247 @@
+"""
+Chiqim rasmlarini fonda WebP ga o'girish
+
+So'rov ichida faqat base64 ochiladi va rasm sarlavhasi tekshiriladi (tez),
+asl fayl darhol saqlanadi va chiqim `image_status = pending` bo'ladi.
+Tranzaksiya tasdiqlangach, o'girish fonda bajariladi:
+- `IMAGE_ENCODE_BACKEND = 'process'` - Pillow ishi alohida jarayonlar
+  pulida (GIL ni band qilmaydi), natijani kutish va saqlash fon oqimida;
+- `'thread'` - hammasi fon oqimida;
+- `'sync'` - shu oqimning o'zida (testlar va boshqaruv buyruqlari uchun).
+
+Rasm piksellari soni `IMAGE_MAX_PIXELS` bilan cheklanadi, saqlanadigan rasm
+`IMAGE_MAX_DIMENSION` gacha kichraytiriladi (qarang: webp.py).
+
+Shu bilan birga ro'yxatdagi kichik rasmlar uchun `IMAGE_VARIANT_SIZES`
+o'lchamidagi nusxalar (masalan 128px va 512px) yaratiladi.
+
+Tayyor WebP fayl faqat chiqim hali shu asl faylga ishora qilayotgan bo'lsa
+almashtiriladi (shartli UPDATE) - orada rasm almashtirilsa yoki chiqim
+o'chirilsa, eski natija yozilmaydi. Jarayon to'xtab qolib `pending` bo'lib
+qolgan rasmlar `encode_pending_images` buyrug'i bilan qayta ishlanadi.
+
+Fayllar kontent xeshi bo'yicha saqlanadi (storage.py): avval o'girilgan chek
+qayta yuborilsa, tayyor WebP va nusxalar qayta ishlatiladi (receipts.py).
+Fayllar bu yerda o'chirilmaydi - ular boshqa chiqimlarda ham ishlatilishi
+mumkin; havolasi qolmaganlari `gc_receipts` buyrug'i bilan o'chiriladi.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, UnidentifiedImageError
+
+from . import metrics, receipts, webp
+from .generations import bump_generation
+from .models import Expense
+
+
+logger = logging.getLogger(__name__)
+
+# Asl fayl kengaytmasi (Pillow formati bo'yicha)
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp', 'BMP': 'bmp', 'TIFF': 'tif'}
+
+_lock = threading.Lock()
+_threads = None
+_processes = None
+
+
+class InvalidImage(ValueError):
+    """Yuborilgan ma'lumot rasm emas"""
+
+
+def image_extension(fileobj):
+    """
+    Rasm formatiga mos fayl kengaytmasi
+
+    `Image.open` faqat sarlavhani o'qiydi - rasm piksellari ochilmaydi.
+    """
+    try:
+        image = webp.open_image(fileobj, max_pixels())
+    except webp.TooLarge as exc:
+        raise InvalidImage(str(exc))
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise InvalidImage
+    extension = EXTENSIONS.get(image.format)
+    if extension is None:
+        raise InvalidImage
+    return extension
+
+
+def original_name(extension):
+    """Asl fayl uchun yangi nom"""
+    return f'{uuid.uuid4()}.{extension}'
+
+
+def original_file(data):
+    """Rasm baytlarini tekshirib, asl formatdagi saqlanadigan faylga aylantirish"""
+    return ContentFile(data, name=original_name(image_extension(io.BytesIO(data))))
+
+
+def max_pixels():
+    return getattr(settings, 'IMAGE_MAX_PIXELS', webp.MAX_PIXELS)
+
+
+def backend():
+    return getattr(settings, 'IMAGE_ENCODE_BACKEND', 'process')
+
+
+def _workers():
+    return getattr(settings, 'IMAGE_ENCODE_WORKERS', 2)
+
+
+def _thread_pool():
+    global _threads
+    with _lock:
+        if _threads is None:
+            _threads = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='image-encode')
+        return _threads
+
+
+def _process_pool():
+    global _processes
+    with _lock:
+        if _processes is None:
+            # spawn: bola jarayon ota jarayonning DB ulanishlari va oqimlarini meros olmaydi
+            _processes = ProcessPoolExecutor(
+                max_workers=_workers(), mp_context=multiprocessing.get_context('spawn')
+            )
+        return _processes
+
+
+def variant_sizes():
+    return tuple(getattr(settings, 'IMAGE_VARIANT_SIZES', (128, 512)))
+
+
+def _encode(data, full=True):
+    started = time.perf_counter()
+    options = {
+        'full': full,
+        'max_dimension': getattr(settings, 'IMAGE_MAX_DIMENSION', webp.MAX_DIMENSION),
+        'max_pixels': max_pixels(),
+    }
+    if backend() == 'process':
+        result = _process_pool().submit(webp.encode, data, variant_sizes(), **options).result()
+    else:
+        result = webp.encode(data, variant_sizes(), **options)
+    metrics.observe('image_encode_duration_seconds', time.perf_counter() - started)
+    return result
+
+
+def _save_webp(storage, content):
+    """WebP faylni saqlash (nomi kontent xeshidan olinadi, storage uni hisobga ham oladi)"""
+    upload_to = Expense._meta.get_field('image').upload_to
+    return storage.save(os.path.join(upload_to, 'receipt.webp'), ContentFile(content))
+
+
+def _save_variants(storage, variants):
+    """Kichraytirilgan nusxalarni saqlash: {'128': 'expenses/ab/<sha256>.webp', ...}"""
+    return {str(size): _save_webp(storage, content) for size, content in variants.items()}
+
+
+def encode_expense_image(expense_id, original_name):
+    """
+    Chiqimning asl rasmini WebP ga o'girib, faylni va nusxalarini almashtirish
+
+    Natija: True - almashtirildi, False - rasm orada o'zgargan yoki o'girib bo'lmadi.
+    """
+    storage = Expense._meta.get_field('image').storage
+    # Shu chek avval o'girilgan bo'lsa - Pillow ishi va diskka yozish kerak emas
+    found = receipts.derived(original_name, [str(size) for size in variant_sizes()])
+    try:
+        if found is None:
+            with storage.open(original_name, 'rb') as source:
+                data = source.read()
+            encoded, variants = _encode(data)
+    except Exception:
+        logger.exception("Rasmni WebP ga o'girib bo'lmadi: %s", original_name)
+        updated = Expense.objects.filter(pk=expense_id, image=original_name).update(
+            image_status=Expense.ImageStatus.FAILED
+        )
+        if updated:
+            bump_generation('expenses')
+        return False
+
+    if found is not None:
+        name, variant_names = found
+    else:
+        name = _save_webp(storage, encoded)
+        variant_names = _save_variants(storage, variants)
+        receipts.remember_derived(original_name, name, variant_names)
+    with transaction.atomic():
+        updated = Expense.objects.filter(pk=expense_id, image=original_name).update(
+            image=name, image_variants=variant_names, image_status=Expense.ImageStatus.READY
+        )
+        if updated:
+            # UPDATE signal yubormaydi - havolalar shu yerda ko'chiriladi
+            receipts.acquire([name, *variant_names.values()])
+            receipts.release([original_name])
+    if not updated:
+        # Yangi fayllar havolasiz qoladi va `gc_receipts` da o'chiriladi
+        return False
+    bump_generation('expenses')
+    return True
+
+
+def build_variants(expense_id, name, previous=None):
+    """
+    Tayyor rasm uchun kichraytirilgan nusxalarni (qayta) yaratish
+
+    `previous` - chiqimdagi eski nusxalar; almashtirilgach ularning havolasi olib tashlanadi.
+    Natija: True - saqlandi, False - rasm orada o'zgargan.
+    """
+    storage = Expense._meta.get_field('image').storage
+    with storage.open(name, 'rb') as source:
+        data = source.read()
+    _, variants = _encode(data, full=False)
+    variant_names = _save_variants(storage, variants)
+    with transaction.atomic():
+        updated = Expense.objects.filter(pk=expense_id, image=name).update(image_variants=variant_names)
+        if updated:
+            receipts.acquire(variant_names.values())
+            receipts.release((previous or {}).values())
+    if not updated:
+        return False
+    bump_generation('expenses')
+    return True
+
+
+def variant_urls(expense, request=None):
+    """Kichraytirilgan nusxalar URL lari: {'128': url, '512': url}"""
+    if not expense.image or not expense.image_variants:
+        return {}
+    storage = expense.image.storage
+    urls = {}
+    for size, name in expense.image_variants.items():
+        url = storage.url(name)
+        urls[size] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def _run_in_background(expense_id, original_name):
+    try:
+        encode_expense_image(expense_id, original_name)
+    finally:
+        # Fon oqimining o'z DB ulanishi
+        connections.close_all()
+
+
+def schedule_encode(expense):
+    """Tranzaksiya tasdiqlangach chiqim rasmini o'girishni navbatga qo'yish"""
+    expense_id, original_name = expense.pk, expense.image.name
+
+    def submit():
+        if backend() == 'sync':
+            encode_expense_image(expense_id, original_name)
+        else:
+            _thread_pool().submit(_run_in_background, expense_id, original_name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,311 @@
+"""
+CSV fayldan chiqimlarni import qilish
+
+Fayl oqim sifatida o'qiladi (butun fayl xotiraga yuklanmaydi) va qatorlar
+`BATCH_SIZE` tadan paketlarda tekshiriladi:
+- bino, kategoriya va foydalanuvchi nomlari boshida bir marta yuklangan
+  lug'atlar orqali ID ga aylantiriladi (har bir qator uchun so'rov yo'q);
+- to'g'ri qatorlar `bulk_create` bilan yoziladi, kunlik yig'indi va bino
+  hisoblagichlari shu paket tranzaksiyasida farq (delta) bo'yicha yangilanadi.
+
+Jarayon holati `ExpenseImport` qatorida saqlanadi. Paket va `rows_processed`
+bitta tranzaksiyada yoziladi, shuning uchun uzilgan import `resume` bilan
+aynan to'xtagan joyidan davom ettiriladi.
+
+Ustunlar eksport fayli bilan bir xil (Sana, Bino, Kategoriya, Tavsif, Summa,
+Kim tomonidan) yoki inglizcha nomlar bilan (date, building, category,
+description, amount, created_by) berilishi mumkin.
+"""
+import csv
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollup
+from .generations import bump_generation
+from .models import Building, Expense, ExpenseCategory, ExpenseImport
+
+
+BATCH_SIZE = 1000
+
+# Saqlanadigan xatolar soni (qolganlari faqat sanaladi)
+MAX_STORED_ERRORS = 1000
+
+HEADER_ALIASES = {
+    'sana': 'date', 'date': 'date',
+    'bino': 'building', 'building': 'building',
+    'kategoriya': 'category', 'category': 'category',
+    'tavsif': 'description', 'description': 'description',
+    'summa': 'amount', 'amount': 'amount',
+    'kim tomonidan': 'created_by', 'created_by': 'created_by',
+}
+
+REQUIRED_COLUMNS = ('building', 'description', 'amount')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y')
+
+AMOUNT_LIMIT = Decimal('1e13')
+
+
+class ImportFileError(Exception):
+    """Faylni umuman o'qib bo'lmaydi (masalan, majburiy ustun yo'q)"""
+
+
+class ImportBusyError(Exception):
+    """Importni boshqa so'rov yoki jarayon bajarmoqda"""
+
+
+def _normalize(value):
+    return ' '.join((value or '').split()).casefold()
+
+
+class NameMaps:
+    """Nom -> ID lug'atlari (import boshida bir marta yuklanadi)"""
+
+    def __init__(self):
+        self.buildings = {}
+        self.ambiguous_buildings = set()
+        for pk, name in Building.objects.values_list('pk', 'name'):
+            key = _normalize(name)
+            if key in self.buildings:
+                self.ambiguous_buildings.add(key)
+            self.buildings[key] = pk
+        self.building_ids = set(self.buildings.values())
+
+        self.categories = {}
+        for pk, name, slug in ExpenseCategory.objects.values_list('pk', 'name', 'slug'):
+            self.categories[_normalize(name)] = pk
+            self.categories.setdefault(_normalize(slug), pk)
+
+        self.users = {_normalize(username): pk for pk, username in User.objects.values_list('pk', 'username')}
+
+    def building(self, value):
+        key = _normalize(value)
+        if key in self.ambiguous_buildings:
+            raise ValueError(f"'{value}' nomli bir nechta bino bor - ID ni kiriting")
+        if key in self.buildings:
+            return self.buildings[key]
+        if key.isdigit() and int(key) in self.building_ids:
+            return int(key)
+        raise ValueError(f"'{value}' binosi topilmadi")
+
+    def category(self, value):
+        if not _normalize(value):
+            return None
+        try:
+            return self.categories[_normalize(value)]
+        except KeyError:
+            raise ValueError(f"'{value}' kategoriyasi topilmadi")
+
+    def user(self, value, default):
+        if not _normalize(value):
+            return default
+        try:
+            return self.users[_normalize(value)]
+        except KeyError:
+            raise ValueError(f"'{value}' foydalanuvchisi topilmadi")
+
+
+def parse_date(value, today):
+    value = (value or '').strip()
+    if not value:
+        return today
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"'{value}' sana formati noto'g'ri (YYYY-MM-DD)")
+
+
+def parse_amount(value):
+    text = (value or '').replace(' ', '').replace('\xa0', '').replace(',', '.')
+    try:
+        amount = Decimal(text).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f"'{value}' summa noto'g'ri")
+    if amount <= 0 or amount >= AMOUNT_LIMIT:
+        raise ValueError(f"'{value}' summa noto'g'ri")
+    return amount
+
+
+def read_rows(stream):
+    """
+    CSV qatorlarini oqim sifatida o'qish: (qator raqami, {ustun: qiymat})
+
+    Qator raqami sarlavhadan keyingi ma'lumot qatorlari bo'yicha 1 dan boshlanadi.
+    """
+    reader = csv.reader(stream)
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise ImportFileError("Fayl bo'sh")
+    columns = [HEADER_ALIASES.get(_normalize(title).lstrip('\ufeff')) for title in header]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ImportFileError(f"Majburiy ustunlar yo'q: {', '.join(missing)}")
+
+    for number, values in enumerate(reader, start=1):
+        if not any(value.strip() for value in values):
+            yield number, None
+            continue
+        yield number, {
+            column: value for column, value in zip(columns, values) if column
+        }
+
+
+class ExpenseImporter:
+    """Bitta `ExpenseImport` jarayonini bajaruvchi klass"""
+
+    def __init__(self, job, batch_size=BATCH_SIZE, allow_created_by=True):
+        self.job = job
+        self.batch_size = batch_size
+        # False bo'lsa `created_by` ustuni e'tiborsiz qoldiriladi (oddiy foydalanuvchi
+        # faqat o'z nomidan chiqim qo'sha oladi)
+        self.allow_created_by = allow_created_by
+        self.maps = None
+        self.today = timezone.now().date()
+
+    def build_expense(self, row):
+        description = (row.get('description') or '').strip()
+        if not description:
+            raise ValueError("Tavsif bo'sh")
+        if len(description) > 500:
+            raise ValueError("Tavsif 500 belgidan uzun")
+        return Expense(
+            building_id=self.maps.building(row.get('building')),
+            category_id=self.maps.category(row.get('category')),
+            description=description,
+            amount=parse_amount(row.get('amount')),
+            date=parse_date(row.get('date'), self.today),
+            created_by_id=(
+                self.maps.user(row.get('created_by'), self.job.created_by_id)
+                if self.allow_created_by else self.job.created_by_id
+            )
+        )
+
+    def save_batch(self, batch, last_number, errors):
+        """
+        Paketni, kunlik yig'indi va bino hisoblagichlarini hamda jarayon holatini
+        bitta tranzaksiyada saqlash - jarayon istalgan joyda to'xtasa ham
+        saqlangan paketlar hisoblagichlarda to'liq aks etadi
+        """
+        with transaction.atomic():
+            if batch:
+                Expense.objects.bulk_create(batch)
+                rollup.record_created([rollup.expense_values(expense) for expense in batch])
+                bump_generation('expenses', 'buildings')
+
+            job = self.job
+            job.rows_processed = last_number
+            job.rows_created += len(batch)
+            job.error_count += len(errors)
+            room = MAX_STORED_ERRORS - len(job.errors)
+            if room > 0:
+                job.errors = job.errors + errors[:room]
+            job.save(update_fields=['rows_processed', 'rows_created', 'error_count', 'errors'])
+
+    def run(self, stream):
+        """
+        Importni bajarish (yoki to'xtagan joyidan davom ettirish)
+
+        Natija: {'created', 'errors', 'rows', 'seconds', 'rows_per_second'}
+        """
+        job = self.job
+        job.status = ExpenseImport.Status.RUNNING
+        job.started_at = job.started_at or timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+
+        started = time.monotonic()
+        created_before = job.rows_created
+        processed_before = job.rows_processed
+        try:
+            self.maps = NameMaps()
+            batch, errors = [], []
+            last_number = job.rows_processed
+            for number, row in read_rows(stream):
+                if number <= job.rows_processed:
+                    continue
+                last_number = number
+                if row is not None:
+                    try:
+                        batch.append(self.build_expense(row))
+                    except ValueError as exc:
+                        errors.append({'row': number, 'error': str(exc)})
+                if len(batch) + len(errors) >= self.batch_size:
+                    self.save_batch(batch, last_number, errors)
+                    batch, errors = [], []
+            self.save_batch(batch, last_number, errors)
+        except Exception as exc:
+            job.status = ExpenseImport.Status.FAILED
+            job.message = str(exc)
+            job.save(update_fields=['status', 'message'])
+            raise
+
+        job.status = ExpenseImport.Status.DONE
+        job.finished_at = timezone.now()
+        job.message = ''
+        job.save(update_fields=['status', 'finished_at', 'message'])
+
+        seconds = time.monotonic() - started
+        rows = job.rows_processed - processed_before
+        return {
+            'created': job.rows_created - created_before,
+            'errors': job.error_count,
+            'rows': rows,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds) if seconds else rows,
+        }
+
+
+def save_upload(uploaded_file):
+    """Yuklangan faylni `IMPORT_ROOT` ga (MEDIA_ROOT dan tashqarida) bo'laklab yozish va yo'lini qaytarish"""
+    directory = Path(getattr(settings, 'IMPORT_ROOT', settings.BASE_DIR / '.imports'))
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{uuid.uuid4().hex}.csv'
+    with open(path, 'wb') as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+    return str(path)
+
+
+def claim(job, force=False):
+    """
+    Importni atomar ravishda `RUNNING` holatiga o'tkazish
+
+    Faqat `PENDING`/`FAILED` importni olish mumkin - bir vaqtda kelgan ikkinchi so'rov
+    (yoki `--resume`) hech narsa yangilamaydi va False oladi. `force` - to'xtab qolgan
+    (jarayoni o'ldirilgan) `RUNNING` importni ham olish.
+    """
+    statuses = [ExpenseImport.Status.PENDING, ExpenseImport.Status.FAILED]
+    if force:
+        statuses.append(ExpenseImport.Status.RUNNING)
+    claimed = ExpenseImport.objects.filter(pk=job.pk, status__in=statuses).update(
+        status=ExpenseImport.Status.RUNNING
+    )
+    if claimed:
+        job.status = ExpenseImport.Status.RUNNING
+    return bool(claimed)
+
+
+def run_import(job, batch_size=BATCH_SIZE, allow_created_by=True, force=False):
+    """`job.source` faylidan importni bajarish (yoki to'xtagan joyidan davom ettirish)"""
+    if not claim(job, force=force):
+        raise ImportBusyError(f"#{job.pk} import boshqa jarayonda bajarilmoqda yoki tugallangan")
+    try:
+        stream = open(job.source, newline='', encoding='utf-8-sig')
+    except OSError as exc:
+        job.status = ExpenseImport.Status.FAILED
+        job.message = str(exc)
+        job.save(update_fields=['status', 'message'])
+        raise
+    with stream:
+        importer = ExpenseImporter(job, batch_size=batch_size, allow_created_by=allow_created_by)
+        return importer.run(stream)
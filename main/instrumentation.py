@@ -0,0 +1,189 @@
+"""
+So'rovlar bo'yicha vaqt o'lchovlari (Server-Timing)
+
+`ServerTimingMiddleware` har bir so'rov uchun quyidagilarni o'lchaydi va
+`Server-Timing` sarlavhasida qaytaradi (DEBUG shart emas):
+- `db` - ORM so'rovlari soni va ularga ketgan vaqt (execute_wrapper orqali);
+- `serialize` - serializerlarning `to_representation` vaqti;
+- `view` - view ishlash vaqti (serializatsiya va DB ham shu ichida);
+- `render` - javobni JSON ga aylantirish vaqti;
+- `total` - middleware ichidagi umumiy vaqt.
+
+Umumiy vaqt va SQL so'rovlar soni view/action bo'yicha yig'ma metrikalarga
+ham yoziladi (qarang: metrics.py).
+
+`SERVER_TIMING_LOG = True` bo'lsa, har bir so'rov uchun `main.timing`
+loggeriga JSON qator yoziladi. O'lchovlar bir necha `perf_counter()`
+chaqiruvidan iborat, shuning uchun middleware doim yoqilgan holda qolishi mumkin.
+"""
+import json
+import logging
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+
+logger = logging.getLogger('main.timing')
+
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Bitta so'rov davomidagi o'lchovlar"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.serialize_depth = 0
+        self.view_started = None
+        self.view = None
+        self.render_started = None
+        self.render = None
+        self.total = None
+        self.view_name = 'unmatched'
+
+    def __call__(self, execute, sql, params, many, context):
+        """`connection.execute_wrapper` uchun: har bir SQL so'rov vaqtini qo'shish"""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += perf_counter() - started
+            self.queries += 1
+
+    def metrics(self):
+        """(nom, millisekund, izoh) ro'yxati"""
+        items = [('db', self.db, f'{self.queries} queries')]
+        if self.serialize:
+            items.append(('serialize', self.serialize, None))
+        if self.view is not None:
+            items.append(('view', self.view, None))
+        if self.render is not None:
+            items.append(('render', self.render, None))
+        items.append(('total', self.total, None))
+        return [(name, seconds * 1000, desc) for name, seconds, desc in items]
+
+    def header(self):
+        parts = []
+        for name, millis, desc in self.metrics():
+            part = f'{name};dur={millis:.2f}'
+            if desc:
+                part += f';desc="{desc}"'
+            parts.append(part)
+        return ', '.join(parts)
+
+
+def current_timing():
+    """Joriy so'rov o'lchovlari (middleware ishlamayotgan bo'lsa None)"""
+    return _current.get()
+
+
+@contextmanager
+def measure_serialization():
+    """
+    Serializatsiya vaqtini joriy so'rov o'lchoviga qo'shish (qarang:
+    serializers.ModelSerializer)
+
+    Ichma-ich serializerlar (masalan, ro'yxatdagi har bir element) ikki marta
+    hisoblanmaydi - faqat eng tashqi chaqiruv o'lchanadi.
+    """
+    timing = _current.get()
+    if timing is None or timing.serialize_depth:
+        yield
+        return
+    timing.serialize_depth += 1
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timing.serialize += perf_counter() - started
+        timing.serialize_depth -= 1
+
+
+def view_name(request, view_func):
+    """
+    Metrikalar uchun view nomi: `ExpenseViewSet.list`, `DashboardStatisticsView`
+    yoki oddiy funksiya nomi
+    """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'unknown')
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower())
+        if action:
+            return f'{cls.__name__}.{action}'
+    return cls.__name__
+
+
+class ServerTimingMiddleware:
+    """
+    So'rov davomidagi DB, serializatsiya, view va render vaqtini
+    `Server-Timing` sarlavhasiga yozish
+
+    `SERVER_TIMING_ENABLED = False` bo'lsa, middleware umuman ulanmaydi.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVER_TIMING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.log = getattr(settings, 'SERVER_TIMING_LOG', False)
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        token = _current.set(timing)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        timing.total = perf_counter() - started
+        if timing.view is None and timing.view_started is not None:
+            timing.view = perf_counter() - timing.view_started
+
+        response['Server-Timing'] = timing.header()
+        metrics.observe('http_request_duration_seconds', timing.total, view=timing.view_name, method=request.method)
+        metrics.observe('http_request_db_queries', timing.queries, view=timing.view_name)
+        if self.log:
+            self.write_log(request, response, timing)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = _current.get()
+        timing.view_name = view_name(request, view_func)
+        timing.view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF Response shu yerdan keyin render qilinadi
+        timing = _current.get()
+        now = perf_counter()
+        if timing.view_started is not None:
+            timing.view = now - timing.view_started
+        timing.render_started = now
+        response.add_post_render_callback(lambda rendered: self._rendered(timing))
+        return response
+
+    @staticmethod
+    def _rendered(timing):
+        timing.render = perf_counter() - timing.render_started
+
+    def write_log(self, request, response, timing):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timing.queries,
+        }
+        record.update({f'{name}_ms': round(millis, 2) for name, millis, _ in timing.metrics()})
+        logger.info(json.dumps(record))
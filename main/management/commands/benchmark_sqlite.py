@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from main import sqlite
+
+
+# Django ning standart SQLite sozlamalari: rollback jurnali, DEFERRED tranzaksiya,
+# Python sqlite3 moduli kutish vaqti (5 s)
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+SCHEMA = """
+CREATE TABLE building (id INTEGER PRIMARY KEY, expenses_count INTEGER NOT NULL, spent REAL NOT NULL);
+CREATE TABLE expense (
+    id INTEGER PRIMARY KEY, building_id INTEGER NOT NULL, amount REAL NOT NULL,
+    date TEXT NOT NULL, description TEXT NOT NULL
+);
+CREATE INDEX expense_building_date ON expense (building_id, date);
+"""
+
+BUILDINGS = 20
+
+
+def _connect(path, pragmas):
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    sqlite.apply_pragmas(connection, pragmas)
+    return connection
+
+
+def _worker(path, pragmas, begin, role, seconds, seed):
+    """Bitta jarayon: `seconds` davomida yozish yoki o'qish. Natija: (amallar, qulf xatolari)"""
+    connection = _connect(path, pragmas)
+    generator = random.Random(seed)
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        building = generator.randrange(1, BUILDINGS + 1)
+        try:
+            if role == 'write':
+                # Chiqim qo'shish: o'qish, yozish va bino hisoblagichini yangilash bitta tranzaksiyada
+                connection.execute(begin)
+                connection.execute('SELECT spent FROM building WHERE id = ?', (building,)).fetchone()
+                connection.execute(
+                    "INSERT INTO expense (building_id, amount, date, description) VALUES (?, ?, date('now'), 'chek')",
+                    (building, generator.randint(1, 1000)),
+                )
+                connection.execute(
+                    'UPDATE building SET expenses_count = expenses_count + 1, spent = spent + 1 WHERE id = ?',
+                    (building,),
+                )
+                connection.execute('COMMIT')
+            else:
+                connection.execute(
+                    'SELECT date, SUM(amount), COUNT(*) FROM expense WHERE building_id = ? GROUP BY date',
+                    (building,),
+                ).fetchall()
+            done += 1
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            errors += 1
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+    connection.close()
+    return role, done, errors
+
+
+def _prepare(path, rows):
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.executescript(SCHEMA)
+    connection.executemany('INSERT INTO building VALUES (?, 0, 0)', [(i,) for i in range(1, BUILDINGS + 1)])
+    connection.execute('BEGIN')
+    connection.executemany(
+        "INSERT INTO expense (building_id, amount, date, description) VALUES (?, ?, date('now', ?), 'chek')",
+        ((i % BUILDINGS + 1, i % 1000, f'-{i % 365} days') for i in range(rows)),
+    )
+    connection.execute('COMMIT')
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "SQLite parallel yozish/o'qish benchmarki: Django standart sozlamalari hamda "
+        "WAL, SQLITE_PRAGMAS (busy_timeout va h.k.) va BEGIN IMMEDIATE bilan o'tkazuvchanlikni solishtirish"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help="Yozuvchi jarayonlar soni")
+        parser.add_argument('--readers', type=int, default=4, help="O'quvchi jarayonlar soni")
+        parser.add_argument('--seconds', type=float, default=5, help="Har bir sinov davomiyligi (soniya)")
+        parser.add_argument('--rows', type=int, default=20000, help="Boshlang'ich chiqimlar soni")
+
+    def handle(self, *args, **options):
+        scenarios = (
+            ('Standart (DELETE jurnal, BEGIN)', DEFAULT_PRAGMAS, 'BEGIN'),
+            # WAL ishlab chiqarishda `optimize_sqlite --wal` bilan bir marta yoqiladi
+            ('WAL + SQLITE_PRAGMAS, BEGIN IMMEDIATE', {'journal_mode': 'WAL', **sqlite.pragmas()}, 'BEGIN IMMEDIATE'),
+        )
+        roles = ['write'] * options['writers'] + ['read'] * options['readers']
+        self.stdout.write(
+            f"{options['writers']} yozuvchi, {options['readers']} o'quvchi, "
+            f"{options['seconds']} soniya, {options['rows']} qator"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for index, (title, pragmas, begin) in enumerate(scenarios):
+                path = os.path.join(directory, f'benchmark{index}.sqlite3')
+                _prepare(path, options['rows'])
+                with ProcessPoolExecutor(
+                    max_workers=len(roles), mp_context=multiprocessing.get_context('spawn')
+                ) as pool:
+                    futures = [
+                        pool.submit(_worker, path, pragmas, begin, role, options['seconds'], seed)
+                        for seed, role in enumerate(roles)
+                    ]
+                    results = [future.result() for future in futures]
+                totals = {'write': [0, 0], 'read': [0, 0]}
+                for role, done, errors in results:
+                    totals[role][0] += done
+                    totals[role][1] += errors
+                seconds = options['seconds']
+                self.stdout.write(self.style.SUCCESS(title))
+                self.stdout.write(
+                    f"  yozish: {totals['write'][0] / seconds:.0f} amal/soniya, "
+                    f"o'qish: {totals['read'][0] / seconds:.0f} amal/soniya, "
+                    f"'database is locked': {totals['write'][1] + totals['read'][1]} ta"
+                )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from main import images
+from main.models import Expense
+
+
+class Command(BaseCommand):
+    help = "WebP ga o'girilmay qolgan chiqim rasmlarini (pending, --failed bilan xatolarni ham) qayta ishlash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', action='store_true', help="Xato bilan tugagan rasmlarni ham qayta urinish")
+
+    def handle(self, *args, **options):
+        statuses = [Expense.ImageStatus.PENDING]
+        if options['failed']:
+            statuses.append(Expense.ImageStatus.FAILED)
+        pending = Expense.objects.filter(image_status__in=statuses).exclude(image='').values_list('pk', 'image')
+
+        done = failed = 0
+        for expense_id, name in pending.iterator():
+            if images.encode_expense_image(expense_id, name):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"{done} ta rasm WebP ga o'girildi"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} ta rasmni o'girib bo'lmadi"))
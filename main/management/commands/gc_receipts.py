@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main import receipts
+
+
+class Command(BaseCommand):
+    help = "Hech bir chiqim ishora qilmaydigan chek fayllarini o'chirish"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Havolalar sonini avval chiqimlar jadvalidan qayta hisoblash",
+        )
+        parser.add_argument(
+            '--grace', type=int, metavar='SECONDS',
+            help="Havolasi shuncha soniyadan beri yo'q fayllar o'chiriladi (standart: RECEIPT_GC_GRACE)",
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = receipts.recount()
+            self.stdout.write(f"{count} ta faylga havola qayta hisoblandi")
+        deleted = receipts.collect_garbage(options['grace'])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} ta ishlatilmayotgan fayl o'chirildi"))
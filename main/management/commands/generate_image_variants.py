@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from main import images
+from main.models import Expense
+
+
+class Command(BaseCommand):
+    help = "Mavjud chiqim rasmlari (media/expenses/) uchun kichraytirilgan WebP nusxalarini yaratish"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Nusxasi bor rasmlarni ham qayta yaratish")
+
+    def handle(self, *args, **options):
+        expenses = Expense.objects.filter(image_status=Expense.ImageStatus.READY).exclude(image='')
+        if not options['force']:
+            expenses = expenses.filter(image_variants={})
+
+        done = failed = 0
+        for expense_id, name, previous in expenses.values_list('pk', 'image', 'image_variants').iterator():
+            try:
+                if images.build_variants(expense_id, name, previous):
+                    done += 1
+            except Exception as exc:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"  #{expense_id} {name}: {exc}"))
+
+        self.stdout.write(self.style.SUCCESS(f"{done} ta rasm uchun nusxalar yaratildi"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} ta rasmni o'qib bo'lmadi"))
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from main import importer
+from main.models import ExpenseImport
+
+
+class Command(BaseCommand):
+    help = "CSV fayldan chiqimlarni ommaviy import qilish (uzilgan importni --resume bilan davom ettirish mumkin)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="CSV fayl yo'li")
+        parser.add_argument('--user', help="Chiqimlar kim nomidan yoziladi (CSV da `Kim tomonidan` bo'lmasa)")
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE, help="Bitta paketdagi qatorlar soni")
+        parser.add_argument('--resume', type=int, metavar='ID', help="Uzilgan import ID si")
+        parser.add_argument(
+            '--force', action='store_true',
+            help="--resume bilan: jarayoni o'ldirilib `Bajarilmoqda` holatida qolgan importni ham davom ettirish"
+        )
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                job = ExpenseImport.objects.get(pk=options['resume'])
+            except ExpenseImport.DoesNotExist:
+                raise CommandError(f"#{options['resume']} import topilmadi")
+            if job.status == ExpenseImport.Status.DONE:
+                raise CommandError(f"#{job.pk} import allaqachon tugallangan")
+            self.stdout.write(f"#{job.pk} import {job.rows_processed}-qatordan davom ettirilmoqda...")
+        else:
+            if not options['path']:
+                raise CommandError("CSV fayl yo'lini yoki --resume ID ni kiriting")
+            path = Path(options['path']).resolve()
+            if not path.is_file():
+                raise CommandError(f"{path} fayli topilmadi")
+            user = None
+            if options['user']:
+                user = User.objects.filter(username=options['user']).first()
+                if user is None:
+                    raise CommandError(f"'{options['user']}' foydalanuvchisi topilmadi")
+            job = ExpenseImport.objects.create(source=str(path), created_by=user)
+            self.stdout.write(f"#{job.pk} import boshlandi: {path}")
+
+        try:
+            report = importer.run_import(job, batch_size=options['batch_size'], force=options['force'])
+        except importer.ImportBusyError as exc:
+            raise CommandError(f"{exc} (jarayon to'xtab qolgan bo'lsa --force bilan qayta urinib ko'ring)")
+        except (OSError, importer.ImportFileError) as exc:
+            raise CommandError(f"#{job.pk} import to'xtadi: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} ta chiqim qo'shildi, {report['rows']} ta qator "
+            f"{report['seconds']} soniyada o'qildi ({report['rows_per_second']} qator/soniya)"
+        ))
+        if job.error_count:
+            self.stdout.write(self.style.WARNING(f"{job.error_count} ta qatorda xato:"))
+            for error in job.errors[:20]:
+                self.stdout.write(f"  {error['row']}-qator: {error['error']}")
+            if job.error_count > 20:
+                self.stdout.write(f"  ... va yana {job.error_count - 20} ta")
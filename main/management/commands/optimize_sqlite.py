@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = "SQLite statistikasini yangilash (PRAGMA optimize / ANALYZE) - masalan, kuniga bir marta cron orqali"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help="Barcha jadval va indekslar statistikasini to'liq qayta yig'ish (ANALYZE)",
+        )
+        parser.add_argument(
+            '--wal', action='store_true',
+            help="Bazani WAL jurnal rejimiga o'tkazish (fayl sarlavhasiga yoziladi, bir marta yetarli)",
+        )
+        parser.add_argument(
+            '--checkpoint', action='store_true',
+            help="WAL faylini asosiy bazaga yozib, qisqartirish (wal_checkpoint(TRUNCATE))",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Bu buyruq faqat SQLite bazasi uchun")
+        with connection.cursor() as cursor:
+            if options['wal']:
+                cursor.execute('PRAGMA journal_mode=WAL')
+            if options['analyze']:
+                cursor.execute('ANALYZE')
+                self.stdout.write("ANALYZE bajarildi")
+            # Statistikasi eskirgan jadvallar uchungina ANALYZE ishlaydi
+            cursor.execute('PRAGMA optimize')
+            if options['checkpoint']:
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                busy, log_pages, checkpointed = cursor.fetchone()
+                if busy:
+                    self.stdout.write(self.style.WARNING("WAL to'liq yozilmadi - baza band"))
+                else:
+                    self.stdout.write(f"WAL: {checkpointed} sahifa bazaga yozildi")
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode, = cursor.fetchone()
+        self.stdout.write(self.style.SUCCESS(f"SQLite optimallashtirildi (journal_mode={journal_mode})"))
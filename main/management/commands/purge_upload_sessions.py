@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main import uploads
+
+
+class Command(BaseCommand):
+    help = "Muddati o'tgan bo'laklab yuklash sessiyalari va ularning vaqtinchalik fayllarini o'chirish"
+
+    def handle(self, *args, **options):
+        count = uploads.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"{count} ta yuklash sessiyasi o'chirildi"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from main import rollup, snapshots
+from main.generations import bump_generation
+
+
+class Command(BaseCommand):
+    help = "Kunlik chiqimlar yig'indisini (ExpenseDailyRollup) bino hisoblagichlari va dashboard snapshotini noldan qayta qurish"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Kunlik yig'indi qayta qurilmoqda...")
+        created = rollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{created} ta yig'indi qatori yaratildi"))
+        
+        self.stdout.write("Bino hisoblagichlari qayta hisoblanmoqda...")
+        rollup.refresh_building_totals()
+        self.stdout.write(self.style.SUCCESS("Bino hisoblagichlari yangilandi"))
+
+        # Eski (tuzatilmagan) qiymatlar bilan tuzilgan kesh va ETag lar eskiradi
+        bump_generation('expenses', 'buildings')
+
+        snapshots.refresh_dashboard()
+        self.stdout.write(self.style.SUCCESS("Dashboard snapshoti yangilandi"))
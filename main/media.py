@@ -0,0 +1,125 @@
+"""
+Chek rasmlarini ruxsat tekshirib berish
+
+Django faqat JWT va chiqimga ruxsatni tekshiradi, fayl baytlarini esa
+oldidagi proksi uzatadi (`MEDIA_SENDFILE`):
+- `'nginx'` - `X-Accel-Redirect: <MEDIA_ACCEL_PREFIX><fayl yo'li>` sarlavhasi.
+  nginx da shu prefiks `internal` location bo'lishi kerak:
+
+      location /protected-media/ {
+          internal;
+          alias /srv/expense/media/;
+      }
+
+- `'apache'` (mod_xsendfile) yoki `'lighttpd'` - `X-Sendfile: <to'liq yo'l>`;
+- `''` (proksi yo'q, masalan runserver) - fayl Django ning o'zi orqali
+  `Range` sarlavhasini qo'llab-quvvatlagan holda uzatiladi.
+
+Fayl nomi kontent xeshidan olingani uchun (storage.py) u hech qachon
+o'zgarmaydi - brauzer uni uzoq muddat keshlashi mumkin.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+from . import images
+from .models import Expense
+
+
+READ_SIZE = 64 * 1024
+
+# Faqat bitta oraliq: "bytes=100-199", "bytes=100-", "bytes=-500"
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+def backend():
+    return getattr(settings, 'MEDIA_SENDFILE', '')
+
+
+def visible_expenses(name, owner=None):
+    """Shu faylga (rasm yoki nusxa sifatida) ishora qiluvchi chiqimlar"""
+    lookup = Q(image=name)
+    for size in images.variant_sizes():
+        lookup |= Q(**{f'image_variants__{size}': name})
+    expenses = Expense.objects.filter(lookup)
+    if owner is not None:
+        expenses = expenses.filter(created_by=owner)
+    return expenses
+
+
+def parse_range(header, size):
+    """
+    `Range` sarlavhasidan (boshlanish, oxiri) - oxiri ham kiradi
+
+    Sarlavha yo'q yoki tushunarsiz bo'lsa None (butun fayl), oraliq fayldan
+    tashqarida bo'lsa ValueError (416).
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Oxirgi N bayt
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = source.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def file_response(request, storage, name):
+    """Faylni proksi orqali yoki (proksi bo'lmasa) Django ning o'zi bilan uzatish"""
+    path = storage.path(name)
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    if backend() == 'nginx':
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + name)
+    elif backend() in ('apache', 'lighttpd'):
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        size = os.path.getsize(path)
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
@@ -0,0 +1,282 @@
+"""
+Prometheus formatidagi yig'ma metrikalar
+
+Har bir worker jarayoni metrikalarni o'z xotirasida yig'adi (qisqa
+`threading.Lock` ostida bitta lug'at yangilanadi) va vaqti-vaqti bilan
+`METRICS_DIR` papkasidagi `<pid>-<ishga tushgan vaqt>.json` fayliga yozadi
+(vaqtinchalik fayl + `os.replace`, shuning uchun o'quvchi yarim yozilgan
+faylni ko'rmaydi). Fayl nomida ishga tushgan vaqt ham bo'lgani uchun qayta
+ishlatilgan pid eski worker faylini ustidan yozmaydi.
+`/api/metrics/` so'ralganda barcha jarayonlar fayllari qo'shib chiqiladi -
+gunicorn/uvicorn workerlari soni qancha bo'lishidan qat'i nazar natija umumiy.
+To'xtagan workerlar fayllari `totals.json` ga qo'shilib, o'chiriladi -
+hisoblagichlar kamaymaydi, fayllar esa cheksiz ko'paymaydi.
+
+Metrikalar:
+- `http_request_duration_seconds` - view/action bo'yicha kechikish histogrammasi;
+- `http_request_db_queries` - so'rovdagi SQL so'rovlar soni taqsimoti;
+- `stats_cache_requests_total` - statistika keshi hit/miss hisoblagichi;
+- `image_encode_duration_seconds` - rasmni WebP ga o'girish vaqti.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import locks
+
+
+# To'xtagan workerlar qiymatlari yig'iladigan fayl
+TOTALS = 'totals.json'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# nom -> (turi, tavsif, histogramma chegaralari)
+METRICS = {
+    'http_request_duration_seconds': (
+        'histogram', "So'rovni qayta ishlash vaqti (view/action bo'yicha)", LATENCY_BUCKETS
+    ),
+    'http_request_db_queries': (
+        'histogram', "Bitta so'rovdagi SQL so'rovlar soni", QUERY_BUCKETS
+    ),
+    'stats_cache_requests_total': (
+        'counter', "Statistika keshiga murojaatlar (hit/miss)", None
+    ),
+    'auth_user_cache_total': (
+        'counter', "JWT autentifikatsiyadagi foydalanuvchi keshi (hit/miss)", None
+    ),
+    'image_encode_duration_seconds': (
+        'histogram', "Rasmni WebP formatiga o'girish vaqti", LATENCY_BUCKETS
+    ),
+}
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def metrics_dir():
+    return Path(getattr(settings, 'METRICS_DIR', settings.BASE_DIR / '.metrics'))
+
+
+class Registry:
+    """Bitta jarayon metrikalari"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        # (nom, yorliqlar) -> son (counter) yoki [bucketlar..., sum, count] (histogramma)
+        self.values = {}
+        self.last_flush = 0.0
+        self.pid = os.getpid()
+        self.started = time.time_ns() // 1000
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.maybe_flush()
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect_left(buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(buckets) + 3)
+            # Oxirgi uchtasi: +Inf bucket, sum, count
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                json.dumps([name, labels]): (list(value) if isinstance(value, list) else value)
+                for (name, labels), value in self.values.items()
+            }
+
+    def maybe_flush(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+        if time.monotonic() - self.last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        """Jarayon metrikalarini faylga yozish (boshqa oqim yozayotgan bo'lsa o'tkazib yuboriladi)"""
+        if not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            if os.getpid() != self.pid:
+                # fork dan keyin - ota jarayon qiymatlarini o'zimizniki deb yozmaymiz
+                self.reset()
+            self.last_flush = time.monotonic()
+            directory = metrics_dir()
+            directory.mkdir(parents=True, exist_ok=True)
+            _write(directory / f'{self.pid}-{self.started}.json', self.snapshot())
+        finally:
+            self.flush_lock.release()
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+        self.pid = os.getpid()
+        self.started = time.time_ns() // 1000
+
+
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    if enabled():
+        registry.inc(name, labels, amount)
+
+
+def observe(name, value, **labels):
+    if enabled():
+        registry.observe(name, labels, value)
+
+
+def _write(path, data):
+    tmp = path.with_name(f'.{path.name}.tmp')
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(merged, values):
+    for key, value in values.items():
+        current = merged.get(key)
+        if current is None:
+            merged[key] = value
+        elif isinstance(value, list):
+            merged[key] = [a + b for a, b in zip(current, value)]
+        else:
+            merged[key] = current + value
+
+
+def _alive(pid):
+    if os.name == 'nt':
+        # Windows da os.kill(pid, 0) jarayonni to'xtatadi - tekshirib bo'lmaydi
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _worker_pid(path):
+    try:
+        return int(path.stem.split('-', 1)[0])
+    except ValueError:
+        return None
+
+
+def _fold_dead(directory, totals):
+    """
+    To'xtagan workerlar fayllarini `totals` ga qo'shib o'chirish
+
+    Qo'shilgan fayl nomi `folded` ro'yxatida saqlanadi: `totals.json` yozilib,
+    fayl o'chirilmasdan jarayon to'xtasa ham u ikki marta qo'shilmaydi.
+    """
+    folded = set(totals['folded'])
+    dead = [
+        path for path in directory.glob('*.json')
+        if path.name != TOTALS and path.name not in folded
+        and _worker_pid(path) not in (None, os.getpid()) and not _alive(_worker_pid(path))
+    ]
+    if not dead and not folded:
+        return
+    if dead:
+        for path in dead:
+            values = _read(path)
+            if values is not None:
+                _merge(totals['values'], values)
+            folded.add(path.name)
+        totals['folded'] = sorted(folded)
+        _write(directory / TOTALS, totals)
+    for name in folded:
+        try:
+            os.remove(directory / name)
+        except FileNotFoundError:
+            pass
+    totals['folded'] = []
+    _write(directory / TOTALS, totals)
+
+
+def collect():
+    """Barcha jarayon fayllarini (va to'xtagan workerlar jamini) qo'shib, umumiy qiymatlarni olish"""
+    registry.flush()
+    directory = metrics_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    # Bir vaqtda so'ralgan /api/metrics/ lar to'xtagan worker faylini ikki marta qo'shmasligi uchun
+    with open(directory / '.lock', 'ab') as handle:
+        locks.lock(handle, locks.LOCK_EX)
+        try:
+            totals = _read(directory / TOTALS) or {'folded': [], 'values': {}}
+            _fold_dead(directory, totals)
+            merged = {}
+            _merge(merged, totals['values'])
+            for path in directory.glob('*.json'):
+                if path.name == TOTALS or path.name in totals['folded']:
+                    continue
+                values = _read(path)
+                if values is not None:
+                    _merge(merged, values)
+        finally:
+            locks.unlock(handle)
+    return merged
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Prometheus text formatida (0.0.4) chiqarish"""
+    series = {}
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        series.setdefault(name, []).append(([tuple(pair) for pair in labels], value))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(series.get(name, [])):
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], value[:-2]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(float(bound))
+                lines.append(f'{name}_bucket{_labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(float(value[-2]))}')
+            lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-17 06:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rollup(apps, schema_editor):
+    """Mavjud chiqimlardan kunlik yig'indini hisoblash"""
+    Expense = apps.get_model('main', 'Expense')
+    ExpenseDailyRollup = apps.get_model('main', 'ExpenseDailyRollup')
+
+    rows = (
+        Expense.objects.order_by()
+        .values('building_id', 'category_id', 'created_by_id', 'date')
+        .annotate(row_total=Sum('amount'), row_count=Count('id'))
+    )
+    ExpenseDailyRollup.objects.bulk_create(
+        [
+            ExpenseDailyRollup(
+                building_id=row['building_id'],
+                category_id=row['category_id'],
+                created_by_id=row['created_by_id'],
+                date=row['date'],
+                total=row['row_total'],
+                count=row['row_count'],
+            )
+            for row in rows
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_alter_expense_category_alter_expense_date_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Sana')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Summa')),
+                ('count', models.IntegerField(default=0, verbose_name='Chiqimlar soni')),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='main.building', verbose_name='Bino')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='main.expensecategory', verbose_name='Kategoriya')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expense_daily_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Kim tomonidan')),
+            ],
+            options={
+                'verbose_name': "Kunlik chiqimlar yig'indisi",
+                'verbose_name_plural': "Kunlik chiqimlar yig'indilari",
+                'indexes': [models.Index(fields=['date'], name='expense_rollup_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('building', 'category', 'created_by', 'date'), name='unique_expense_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-17 06:55
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def populate_counters(apps, schema_editor):
+    """Mavjud chiqimlardan bino hisoblagichlarini to'ldirish"""
+    Building = apps.get_model('main', 'Building')
+    Expense = apps.get_model('main', 'Expense')
+
+    summary = {
+        row['building_id']: row
+        for row in Expense.objects.order_by().values('building_id').annotate(
+            row_count=Count('id'), last=Max('date')
+        )
+    }
+    category_totals = defaultdict(dict)
+    for row in Expense.objects.order_by().values('building_id', 'category_id').annotate(row_total=Sum('amount')):
+        if row['row_total']:
+            key = str(row['category_id']) if row['category_id'] else 'none'
+            category_totals[row['building_id']][key] = str(Decimal(row['row_total']).quantize(Decimal('0.01')))
+
+    for building_id, row in summary.items():
+        Building.objects.filter(pk=building_id).update(
+            expenses_count=row['row_count'],
+            last_expense_date=row['last'],
+            category_totals=category_totals.get(building_id, {})
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_expense_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='building',
+            name='category_totals',
+            field=models.JSONField(blank=True, default=dict, help_text='Kategoriya ID si -> chiqimlar summasi (avtomatik yangilanadi)', verbose_name="Kategoriyalar bo'yicha summalar"),
+        ),
+        migrations.AddField(
+            model_name='building',
+            name='expenses_count',
+            field=models.PositiveIntegerField(default=0, help_text='Binoga tegishli chiqimlar soni (avtomatik yangilanadi)', verbose_name='Chiqimlar soni'),
+        ),
+        migrations.AddField(
+            model_name='building',
+            name='last_expense_date',
+            field=models.DateField(blank=True, help_text="Binoga tegishli eng so'nggi chiqim sanasi (avtomatik yangilanadi)", null=True, verbose_name='Oxirgi chiqim sanasi'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_building_expense_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Nomi')),
+                ('payload', models.JSONField(default=dict, verbose_name="Ma'lumotlar")),
+                ('generation', models.CharField(blank=True, max_length=200, verbose_name="Ma'lumotlar avlodi")),
+                ('computed_at', models.DateTimeField(verbose_name='Hisoblangan vaqt')),
+            ],
+            options={
+                'verbose_name': 'Statistika snapshoti',
+                'verbose_name_plural': 'Statistika snapshotlari',
+            },
+        ),
+    ]
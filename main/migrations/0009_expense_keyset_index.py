@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-17 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_statistics_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['-date', '-created_at', 'id'], name='expense_keyset_idx'),
+        ),
+    ]
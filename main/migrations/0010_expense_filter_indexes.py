@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-17 10:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_expense_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Avval kompozit indekslar, keyin ular qoplagan bitta ustunli FK indekslari olib tashlanadi
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['created_by', '-date', '-created_at', 'id'], name='expense_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['building', '-date', '-created_at', 'id'], name='expense_building_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['category', '-date', '-created_at', 'id'], name='expense_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['-created_at'], name='expense_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['amount'], name='expense_amount_idx'),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='building',
+            field=models.ForeignKey(db_index=False, help_text='Chiqim qaysi binoga tegishli', on_delete=django.db.models.deletion.CASCADE, related_name='expenses', to='main.building', verbose_name='Bino'),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='category',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Chiqim turi', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='expenses', to='main.expensecategory', verbose_name='Kategoriya'),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='created_by',
+            field=models.ForeignKey(db_index=False, help_text="Chiqimni kim qo'shgan", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expenses', to=settings.AUTH_USER_MODEL, verbose_name='Kim tomonidan'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-17 11:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_expense_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, verbose_name="Fayl yo'li")),
+                ('status', models.CharField(choices=[('pending', 'Kutilmoqda'), ('running', 'Bajarilmoqda'), ('done', 'Tugallangan'), ('failed', "Xato bilan to'xtagan")], default='pending', max_length=20, verbose_name='Holat')),
+                ('rows_processed', models.PositiveIntegerField(default=0, verbose_name="O'qilgan qatorlar")),
+                ('rows_created', models.PositiveIntegerField(default=0, verbose_name="Qo'shilgan chiqimlar")),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='Xato qatorlar soni')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Xatolar')),
+                ('message', models.TextField(blank=True, verbose_name='Izoh')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Boshlangan vaqt')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Tugagan vaqt')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Yaratilgan vaqt')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expense_imports', to=settings.AUTH_USER_MODEL, verbose_name='Kim tomonidan')),
+            ],
+            options={
+                'verbose_name': 'Chiqimlar importi',
+                'verbose_name_plural': 'Chiqimlar importlari',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-17 12:05
+
+from django.db import migrations, models
+
+
+def mark_existing_images(apps, schema_editor):
+    """Mavjud rasmlar allaqachon WebP ga o'girilgan holda saqlangan"""
+    Expense = apps.get_model('main', 'Expense')
+    Expense.objects.exclude(image='').exclude(image__isnull=True).update(image_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_expense_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='image_status',
+            field=models.CharField(choices=[('none', "Rasm yo'q"), ('pending', 'Ishlanmoqda'), ('ready', 'Tayyor'), ('failed', 'Xato')], default='none', help_text="Rasm WebP formatiga o'girilish holati", max_length=20, verbose_name='Rasm holati'),
+        ),
+        migrations.RunPython(mark_existing_images, migrations.RunPython.noop),
+    ]
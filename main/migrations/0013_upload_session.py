@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-17 12:40
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_expense_image_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(blank=True, max_length=255, verbose_name='Fayl nomi')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Fayl hajmi (bayt)')),
+                ('received', models.PositiveBigIntegerField(default=0, verbose_name='Qabul qilingan baytlar')),
+                ('extension', models.CharField(blank=True, max_length=10, verbose_name='Rasm kengaytmasi')),
+                ('status', models.CharField(choices=[('uploading', 'Yuklanmoqda'), ('complete', 'Tugallangan'), ('failed', 'Xato')], default='uploading', max_length=20, verbose_name='Holat')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Yaratilgan vaqt')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Yangilangan vaqt')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='Kim tomonidan')),
+            ],
+            options={
+                'verbose_name': 'Yuklash sessiyasi',
+                'verbose_name_plural': 'Yuklash sessiyalari',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, help_text="Kichraytirilgan WebP nusxalar: {o'lcham: fayl yo'li}", verbose_name='Rasm nusxalari'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-17 13:45
+
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_expense_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expense',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=main.storage.receipt_storage, upload_to='expenses/', verbose_name='Rasm'),
+        ),
+        migrations.CreateModel(
+            name='ReceiptBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name="Fayl yo'li")),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='Hajmi (bayt)')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Havolalar soni')),
+                ('derived', models.JSONField(blank=True, default=dict, verbose_name="O'girilgan fayllar")),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Yaratilgan vaqt')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Yangilangan vaqt')),
+            ],
+            options={
+                'verbose_name': 'Chek fayli',
+                'verbose_name_plural': 'Chek fayllari',
+                'indexes': [models.Index(fields=['refcount', 'updated_at'], name='receiptblob_gc_idx')],
+            },
+        ),
+    ]
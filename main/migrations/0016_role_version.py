@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-17 14:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0015_receipt_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoleVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='role_version', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Foydalanuvchi')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Versiya')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Yangilangan vaqt')),
+            ],
+            options={
+                'verbose_name': 'Rol versiyasi',
+                'verbose_name_plural': 'Rol versiyalari',
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-17 15:05
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+KEY_FIELDS = ('building_id', 'category_id', 'created_by_id', 'date')
+
+
+def merge_duplicates(apps, schema_editor):
+    """Bir kalitdagi (NULL qiymatli) takroriy qatorlarni bittaga birlashtirish"""
+    ExpenseDailyRollup = apps.get_model('main', 'ExpenseDailyRollup')
+
+    duplicates = (
+        ExpenseDailyRollup.objects.order_by()
+        .values(*KEY_FIELDS)
+        .annotate(rows=Count('id'), first=Min('id'), row_total=Sum('total'), row_count=Sum('count'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        lookup = {field: row[field] for field in KEY_FIELDS}
+        ExpenseDailyRollup.objects.filter(**lookup).exclude(pk=row['first']).delete()
+        ExpenseDailyRollup.objects.filter(pk=row['first']).update(total=row['row_total'], count=row['row_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_role_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='expensedailyrollup',
+            name='unique_expense_daily_rollup',
+        ),
+        migrations.AddConstraint(
+            model_name='expensedailyrollup',
+            constraint=models.UniqueConstraint(models.F('building'), django.db.models.functions.comparison.Coalesce('category', 0, output_field=models.IntegerField()), django.db.models.functions.comparison.Coalesce('created_by', 0, output_field=models.IntegerField()), models.F('date'), name='unique_expense_daily_rollup'),
+        ),
+    ]
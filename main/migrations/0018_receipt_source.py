@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-17 15:40
+
+import os
+import re
+
+from django.db import migrations, models
+
+
+DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+
+def copy_derived(apps, schema_editor):
+    """Asl fayl qatoridagi `derived` ni asl fayl xeshi bo'yicha alohida jadvalga ko'chirish"""
+    ReceiptBlob = apps.get_model('main', 'ReceiptBlob')
+    ReceiptSource = apps.get_model('main', 'ReceiptSource')
+    for name, derived in ReceiptBlob.objects.exclude(derived={}).values_list('name', 'derived').iterator():
+        digest = os.path.splitext(os.path.basename(name))[0]
+        if not DIGEST.match(digest) or not derived.get(''):
+            continue
+        variants = {key: value for key, value in derived.items() if key}
+        ReceiptSource.objects.update_or_create(
+            digest=digest, defaults={'image': derived[''], 'variants': variants}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_expense_rollup_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='Asl fayl xeshi (SHA-256)')),
+                ('image', models.CharField(max_length=255, verbose_name='WebP fayl')),
+                ('variants', models.JSONField(blank=True, default=dict, verbose_name='Nusxalar')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Yangilangan vaqt')),
+            ],
+            options={
+                'verbose_name': 'Asl chek',
+                'verbose_name_plural': 'Asl cheklar',
+            },
+        ),
+        migrations.RunPython(copy_derived, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='receiptblob',
+            name='derived',
+        ),
+    ]
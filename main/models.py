@@ -1,7 +1,13 @@
+import uuid
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from .storage import receipt_storage
+
 
 class Building(models.Model):
     """
@@ -41,6 +47,23 @@ class Building(models.Model):
         verbose_name="Sarflangan mablag'",
         help_text="Hozirga qadar sarflangan mablag' (so'm)"
     )
+    expenses_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Chiqimlar soni",
+        help_text="Binoga tegishli chiqimlar soni (avtomatik yangilanadi)"
+    )
+    last_expense_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Oxirgi chiqim sanasi",
+        help_text="Binoga tegishli eng so'nggi chiqim sanasi (avtomatik yangilanadi)"
+    )
+    category_totals = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Kategoriyalar bo'yicha summalar",
+        help_text="Kategoriya ID si -> chiqimlar summasi (avtomatik yangilanadi)"
+    )
     start_date = models.DateField(
         null=True, 
         blank=True,
@@ -79,6 +102,11 @@ class Building(models.Model):
     def remaining_budget(self):
         """Qolgan mablag'ni hisoblash"""
         return self.budget - self.spent_amount
+    
+    @property
+    def expenses_total(self):
+        """Binoga tegishli chiqimlar summasi (kategoriyalar bo'yicha summalardan)"""
+        return sum((Decimal(value) for value in self.category_totals.values()), Decimal('0'))
 
 
 class ExpenseCategory(models.Model):
@@ -150,13 +178,20 @@ class Expense(models.Model):
         TRANSPORT = 'transport', 'Transport'
         EQUIPMENT = 'equipment', 'Uskuna'
         OTHER = 'other', 'Boshqa'
+
+    class ImageStatus(models.TextChoices):
+        NONE = 'none', "Rasm yo'q"
+        PENDING = 'pending', 'Ishlanmoqda'
+        READY = 'ready', 'Tayyor'
+        FAILED = 'failed', 'Xato'
     
     building = models.ForeignKey(
         Building,
         on_delete=models.CASCADE,
         related_name='expenses',
         verbose_name="Bino",
-        help_text="Chiqim qaysi binoga tegishli"
+        help_text="Chiqim qaysi binoga tegishli",
+        db_index=False  # expense_building_date_idx bilan qoplangan
     )
     category = models.ForeignKey(
         ExpenseCategory,
@@ -165,7 +200,8 @@ class Expense(models.Model):
         verbose_name="Kategoriya",
         help_text="Chiqim turi",
         null=True,  # Vaqtincha null - migration uchun
-        blank=True
+        blank=True,
+        db_index=False  # expense_category_date_idx bilan qoplangan
     )
     # Eski kategoriya maydoni - migration uchun
     legacy_category = models.CharField(
@@ -198,14 +234,29 @@ class Expense(models.Model):
         null=True,
         related_name='expenses',
         verbose_name="Kim tomonidan",
-        help_text="Chiqimni kim qo'shgan"
+        help_text="Chiqimni kim qo'shgan",
+        db_index=False  # expense_owner_date_idx bilan qoplangan
     )
     image = models.ImageField(
         upload_to='expenses/', 
+        storage=receipt_storage,
         null=True, 
         blank=True, 
         verbose_name="Rasm"
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Rasm nusxalari",
+        help_text="Kichraytirilgan WebP nusxalar: {o'lcham: fayl yo'li}"
+    )
+    image_status = models.CharField(
+        max_length=20,
+        choices=ImageStatus.choices,
+        default=ImageStatus.NONE,
+        verbose_name="Rasm holati",
+        help_text="Rasm WebP formatiga o'girilish holati"
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Yaratilgan vaqt"
@@ -219,6 +270,256 @@ class Expense(models.Model):
         verbose_name = "Chiqim"
         verbose_name_plural = "Chiqimlar"
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Kursorli sahifalash tartibi: (-date, -created_at, id)
+            models.Index(fields=['-date', '-created_at', 'id'], name='expense_keyset_idx'),
+            # Ro'yxat filtrlari (foydalanuvchi / bino / kategoriya) + shu tartib
+            models.Index(fields=['created_by', '-date', '-created_at', 'id'], name='expense_owner_date_idx'),
+            models.Index(fields=['building', '-date', '-created_at', 'id'], name='expense_building_date_idx'),
+            models.Index(fields=['category', '-date', '-created_at', 'id'], name='expense_category_date_idx'),
+            # Dashboard: so'nggi qo'shilgan chiqimlar
+            models.Index(fields=['-created_at'], name='expense_created_at_idx'),
+            # Statistika: eng katta / eng kichik chiqim
+            models.Index(fields=['amount'], name='expense_amount_idx'),
+        ]
     
     def __str__(self):
         return f"{self.description} - {self.amount} so'm"
+
+
+class ExpenseDailyRollup(models.Model):
+    """
+    Kunlik chiqimlar yig'indisi (bino x kategoriya x foydalanuvchi x kun)
+
+    Statistika endpointlari xom chiqimlar jadvalini qayta-qayta skanerlamasligi
+    uchun saqlanadigan jadval. Signallar orqali har bir chiqim yozilganda
+    yangilanadi, `rebuild_expense_rollup` buyrug'i bilan noldan qayta quriladi.
+    """
+    building = models.ForeignKey(
+        Building,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups',
+        verbose_name="Bino"
+    )
+    category = models.ForeignKey(
+        ExpenseCategory,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups',
+        null=True,
+        blank=True,
+        verbose_name="Kategoriya"
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='expense_daily_rollups',
+        null=True,
+        blank=True,
+        verbose_name="Kim tomonidan"
+    )
+    date = models.DateField(verbose_name="Sana")
+    total = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=0,
+        verbose_name="Summa"
+    )
+    count = models.IntegerField(default=0, verbose_name="Chiqimlar soni")
+
+    class Meta:
+        verbose_name = "Kunlik chiqimlar yig'indisi"
+        verbose_name_plural = "Kunlik chiqimlar yig'indilari"
+        constraints = [
+            # NULL qiymatlar bir-biridan farqli hisoblanadi - kalitda ular 0 ga almashtiriladi
+            models.UniqueConstraint(
+                'building',
+                Coalesce('category', 0, output_field=models.IntegerField()),
+                Coalesce('created_by', 0, output_field=models.IntegerField()),
+                'date',
+                name='unique_expense_daily_rollup'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='expense_rollup_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.total} so'm ({self.count} ta)"
+
+
+class StatisticsSnapshot(models.Model):
+    """
+    Oldindan hisoblangan statistika javobi (masalan, dashboard)
+
+    Javob tayyor JSON ko'rinishida saqlanadi, shuning uchun endpoint bitta
+    qatorni o'qiydi. `generation` - hisoblash paytidagi ma'lumotlar avlodi
+    tokenlari; ular almashsa, snapshot eskirgan hisoblanadi.
+    """
+    name = models.CharField(max_length=50, unique=True, verbose_name="Nomi")
+    payload = models.JSONField(default=dict, verbose_name="Ma'lumotlar")
+    generation = models.CharField(max_length=200, blank=True, verbose_name="Ma'lumotlar avlodi")
+    computed_at = models.DateTimeField(verbose_name="Hisoblangan vaqt")
+
+    class Meta:
+        verbose_name = "Statistika snapshoti"
+        verbose_name_plural = "Statistika snapshotlari"
+
+    def __str__(self):
+        return f"{self.name} ({self.computed_at:%Y-%m-%d %H:%M:%S})"
+
+
+class ExpenseImport(models.Model):
+    """
+    CSV fayldan chiqimlarni import qilish jarayoni
+
+    Har bir paket saqlanganda `rows_processed` shu paket bilan bitta
+    tranzaksiyada yangilanadi - jarayon uzilsa, keyingi ishga tushirishda
+    aynan shu qatordan davom etiladi (qatorlar ikki marta yozilmaydi).
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Kutilmoqda'
+        RUNNING = 'running', 'Bajarilmoqda'
+        DONE = 'done', 'Tugallangan'
+        FAILED = 'failed', 'Xato bilan to\'xtagan'
+
+    source = models.CharField(max_length=500, verbose_name="Fayl yo'li")
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name="Holat"
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='expense_imports',
+        verbose_name="Kim tomonidan"
+    )
+    rows_processed = models.PositiveIntegerField(default=0, verbose_name="O'qilgan qatorlar")
+    rows_created = models.PositiveIntegerField(default=0, verbose_name="Qo'shilgan chiqimlar")
+    error_count = models.PositiveIntegerField(default=0, verbose_name="Xato qatorlar soni")
+    errors = models.JSONField(default=list, blank=True, verbose_name="Xatolar")
+    message = models.TextField(blank=True, verbose_name="Izoh")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Boshlangan vaqt")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Tugagan vaqt")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Yaratilgan vaqt")
+
+    class Meta:
+        verbose_name = "Chiqimlar importi"
+        verbose_name_plural = "Chiqimlar importlari"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.get_status_display()})"
+
+
+class UploadSession(models.Model):
+    """
+    Bo'laklab (chunked) yuklanayotgan fayl
+
+    Katta chek rasmlari yomon mobil aloqada bir nechta so'rov bilan yuklanadi:
+    `received` - serverda saqlangan baytlar soni, uzilishdan keyin mijoz shu
+    joydan davom etadi. Yuklash tugagach chiqimga `upload` ID si orqali biriktiriladi.
+    """
+
+    class Status(models.TextChoices):
+        UPLOADING = 'uploading', 'Yuklanmoqda'
+        COMPLETE = 'complete', 'Tugallangan'
+        FAILED = 'failed', 'Xato'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name="Kim tomonidan"
+    )
+    filename = models.CharField(max_length=255, blank=True, verbose_name="Fayl nomi")
+    size = models.PositiveBigIntegerField(verbose_name="Fayl hajmi (bayt)")
+    received = models.PositiveBigIntegerField(default=0, verbose_name="Qabul qilingan baytlar")
+    extension = models.CharField(max_length=10, blank=True, verbose_name="Rasm kengaytmasi")
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.UPLOADING,
+        verbose_name="Holat"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Yaratilgan vaqt")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Yangilangan vaqt")
+
+    class Meta:
+        verbose_name = "Yuklash sessiyasi"
+        verbose_name_plural = "Yuklash sessiyalari"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename or self.pk} ({self.received}/{self.size})"
+
+
+class ReceiptBlob(models.Model):
+    """
+    Kontent bo'yicha saqlangan chek fayli va unga havolalar soni (qarang: receipts.py)
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name="Fayl yo'li")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Hajmi (bayt)")
+    refcount = models.PositiveIntegerField(default=0, verbose_name="Havolalar soni")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Yaratilgan vaqt")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Yangilangan vaqt")
+
+    class Meta:
+        verbose_name = "Chek fayli"
+        verbose_name_plural = "Chek fayllari"
+        indexes = [
+            # gc_receipts: havolasi qolmagan eski fayllar
+            models.Index(fields=['refcount', 'updated_at'], name='receiptblob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+
+class ReceiptSource(models.Model):
+    """
+    Asl chek (kontent xeshi bo'yicha) va undan olingan WebP hamda nusxalar
+
+    Asl fayldan mustaqil: asl fayl `gc_receipts` da o'chirilgandan keyin ham
+    qoladi, shuning uchun xuddi shu chek qayta yuborilsa u qayta o'girilmaydi.
+    O'girilgan fayllar o'chirilganda qator ham o'chiriladi (qarang: receipts.py).
+    """
+    digest = models.CharField(max_length=64, unique=True, verbose_name="Asl fayl xeshi (SHA-256)")
+    image = models.CharField(max_length=255, verbose_name="WebP fayl")
+    variants = models.JSONField(default=dict, blank=True, verbose_name="Nusxalar")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Yangilangan vaqt")
+
+    class Meta:
+        verbose_name = "Asl chek"
+        verbose_name_plural = "Asl cheklar"
+
+    def __str__(self):
+        return f"{self.digest[:12]} -> {self.image}"
+
+
+class RoleVersion(models.Model):
+    """
+    Foydalanuvchi roli versiyasi
+
+    Access tokenda rol va shu versiya (`rv`) saqlanadi. Rol, ceoadmin holati
+    yoki faollik o'zgarsa versiya oshiriladi va eski tokenlar rad etiladi
+    (qarang: tokens.py).
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='role_version',
+        verbose_name="Foydalanuvchi"
+    )
+    version = models.PositiveIntegerField(default=0, verbose_name="Versiya")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Yangilangan vaqt")
+
+    class Meta:
+        verbose_name = "Rol versiyasi"
+        verbose_name_plural = "Rol versiyalari"
+
+    def __str__(self):
+        return f"{self.user_id}: {self.version}"
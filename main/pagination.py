@@ -0,0 +1,197 @@
+"""
+Sahifalash (pagination) klasslari
+
+`KeysetPagination` - kursor (keyset) bo'yicha sahifalash. Keyingi sahifa
+oldingi sahifaning oxirgi qatori qiymatlaridan (masalan, sana, yaratilgan
+vaqt, ID) boshlab olinadi: `COUNT(*)` va `OFFSET` ishlatilmaydi, shuning uchun
+5000-sahifa ham birinchi sahifa kabi tez ochiladi. Tartib maydonlari bo'yicha
+kompozit indeks bo'lishi kerak.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Kompozit kalit bo'yicha kursorli sahifalash
+
+    `ordering` oxirgi maydoni noyob bo'lishi kerak (odatda 'id'), aks holda
+    bir xil qiymatli qatorlar sahifalar orasida tushib qolishi mumkin.
+    """
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = "Noto'g'ri kursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        values, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self._flip(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, self.reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': "Sahifa kursori (`next` / `previous` havolalaridan olinadi)",
+            'schema': {'type': 'string'},
+        }]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    # Kursor
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def _fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _after(self, values, reverse):
+        """
+        Kursordan keyingi qatorlar sharti:
+        (a < x) OR (a = x AND b < y) OR (a = x AND b = y AND c > z) ...
+
+        Birinchi maydon uchun qo'shimcha `a <= x` sharti indeksdan to'g'ridan-to'g'ri
+        kursor joyidan o'qishni boshlash imkonini beradi (OR sharti buni qilmaydi).
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        first = self.ordering[0]
+        descending = first.startswith('-') != reverse
+        seek = {f"{first.lstrip('-')}__{'lte' if descending else 'gte'}": values[0]}
+        return Q(**seek) & condition
+
+    def _link(self, row, reverse):
+        payload = {
+            'v': [self.model._meta.get_field(name).value_to_string(row) for name in self._fields()],
+        }
+        if reverse:
+            payload['r'] = 1
+        cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """Kursordan tartib maydonlari qiymatlarini olish: (values, reverse)"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            raw = payload['v']
+            if len(raw) != len(self.ordering):
+                raise ValueError
+            values = [
+                self.model._meta.get_field(name).to_python(value)
+                for name, value in zip(self._fields(), raw)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(payload.get('r'))
+
+
+class ExpenseKeysetPagination(KeysetPagination):
+    """Chiqimlar uchun kursorli sahifalash (`expense_keyset_idx` indeksi bilan)"""
+    ordering = ('-date', '-created_at', 'id')
+
+
+class ExpensePagination(PageNumberPagination):
+    """
+    Chiqimlar ro'yxati sahifalash
+
+    Odatiy holatda avvalgidek sahifa raqami (`?page=N`, `count` bilan) ishlatiladi.
+    `?pagination=cursor` yoki `?cursor=...` berilsa, kursorli sahifalashga o'tiladi.
+    """
+    mode_query_param = 'pagination'
+    keyset_class = ExpenseKeysetPagination
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or bool(request.query_params.get(self.keyset_class.cursor_query_param))
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "`cursor` - kursorli sahifalash (count siz, chuqur sahifalarda ham tez)",
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+        ] + self.keyset_class().get_schema_operation_parameters(view)
@@ -1,5 +1,22 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from rest_framework import permissions
 
+from . import tokens
+
+
+def request_role(request):
+    """
+    So'rov egasining roli va ceoadmin ekanligi
+
+    JWT bilan kelgan so'rovda - tokendagi ma'lumotlardan (bazaga murojaatsiz),
+    boshqa autentifikatsiyada (sessiya, testlar) - foydalanuvchi obyektidan.
+    """
+    if tokens.has_role_claims(request.auth):
+        return request.auth[tokens.ROLE_CLAIM], request.auth[tokens.CEO_CLAIM]
+    user = request.user
+    return tokens.user_role(user), user.username == tokens.CEO_ADMIN_USERNAME
+
 
 class IsAdmin(permissions.BasePermission):
     """
@@ -13,7 +30,7 @@ class IsAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        return request.user.groups.filter(name='Admin').exists() or request.user.is_superuser
+        return request_role(request)[0] == 'Admin'
 
 
 class IsAdminOrAccountant(permissions.BasePermission):
@@ -29,11 +46,8 @@ class IsAdminOrAccountant(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
         
-        # Superuser har doim ruxsatga ega
-        if request.user.is_superuser:
-            return True
-        
-        return request.user.groups.filter(name__in=['Admin', 'Accountant']).exists()
+        # Superuser rolida Admin (qarang: tokens.user_role)
+        return request_role(request)[0] in ('Admin', 'Accountant')
 
 
 class IsAdminOrAccountantOrReadOnly(permissions.BasePermission):
@@ -53,12 +67,8 @@ class IsAdminOrAccountantOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         
-        # Superuser har doim ruxsatga ega
-        if request.user.is_superuser:
-            return True
-        
-        # Yozish amallari faqat Admin va Accountant uchun
-        return request.user.groups.filter(name__in=['Admin', 'Accountant']).exists()
+        # Yozish amallari faqat Admin va Accountant uchun (superuser - Admin)
+        return request_role(request)[0] in ('Admin', 'Accountant')
 
 
 class CanManageUsers(permissions.BasePermission):
@@ -78,4 +88,22 @@ class CanManageUsers(permissions.BasePermission):
             return False
         
         # Faqat ceoadmin barcha amallarga ruxsatga ega
-        return request.user.username == self.CEO_ADMIN_USERNAME
+        return request_role(request)[1]
+
+
+class CanViewMetrics(permissions.BasePermission):
+    """
+    Metrikalarni ko'rish uchun ruxsat
+
+    `METRICS_TOKEN` sozlangan bo'lsa, `X-Metrics-Token` sarlavhasida shu tokenni
+    yuborgan mijoz (masalan, Prometheus) kira oladi. Aks holda faqat ceoadmin.
+    """
+    message = "Metrikalar faqat asosiy admin (ceoadmin) yoki metrika tokeni bilan ko'rinadi."
+
+    CEO_ADMIN_USERNAME = 'ceoadmin'
+
+    def has_permission(self, request, view):
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        if token and constant_time_compare(request.headers.get('X-Metrics-Token', ''), token):
+            return True
+        return request.user.is_authenticated and request_role(request)[1]
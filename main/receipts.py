@@ -0,0 +1,160 @@
+"""
+Chek fayllari havolalarini hisoblash va eskirganlarini o'chirish
+
+Kontent bo'yicha saqlashda (storage.py) bir faylga bir nechta chiqim ishora
+qilishi mumkin. Har bir fayl `ReceiptBlob` qatorida havolalar soni
+(`refcount`) bilan hisobga olinadi: chiqim rasmi o'rnatilganda soni oshadi,
+rasm almashtirilsa yoki chiqim o'chirilsa kamayadi. Nolga tushgan fayllar
+`gc_receipts` buyrug'i bilan o'chiriladi - hozirgina yozilgan va hali
+chiqimga biriktirilmagan fayl o'chib ketmasligi uchun `RECEIPT_GC_GRACE`
+muddati kutiladi.
+
+Fayl saqlash (`hold`) va o'chirish (`collect_garbage`) bir xil qatorni
+qulflab bajariladi: mavjud fayl qayta ishlatilayotganda GC uni o'chira
+olmaydi, GC endigina o'chirgan fayl esa qayta yoziladi.
+
+Asl chek xeshi bo'yicha undan olingan WebP va nusxalar nomlari
+`ReceiptSource` da saqlanadi: bir xil chek qayta yuborilsa, u qayta
+o'girilmaydi (asl fayl o'chirilgan bo'lsa ham).
+"""
+import os
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Expense, ReceiptBlob, ReceiptSource
+from .storage import receipt_storage
+
+
+DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+
+def expense_files(image, variants):
+    """Chiqim ishora qiladigan barcha fayllar: rasm va uning nusxalari"""
+    names = [str(image or '')]
+    names.extend((variants or {}).values())
+    return [name for name in names if name]
+
+
+def register(names):
+    """Storage ga yozilgan fayllarni hisobga olish (havolalar soni o'zgarmaydi)"""
+    storage = receipt_storage()
+    for name in names:
+        ReceiptBlob.objects.get_or_create(name=name, defaults={'size': storage.size(name)})
+
+
+def hold(name, write=None, storage=None):
+    """
+    Faylni `collect_garbage` dan himoyalash: qator qulf ostida olinadi (yo'q
+    bo'lsa yaratiladi) va `updated_at` yangilanadi
+
+    Fayl diskda bo'lmasa (GC uni endigina o'chirgan) `write()` bilan qayta
+    yoziladi; `write` berilmagan bo'lsa False qaytariladi.
+    """
+    storage = storage or receipt_storage()
+    with transaction.atomic():
+        pk = ReceiptBlob.objects.select_for_update().filter(name=name).values_list('pk', flat=True).first()
+        if not storage.exists(name):
+            if write is None:
+                return False
+            write()
+        if pk is None:
+            ReceiptBlob.objects.get_or_create(name=name, defaults={'size': storage.size(name)})
+        else:
+            ReceiptBlob.objects.filter(pk=pk).update(updated_at=timezone.now())
+    return True
+
+
+def acquire(names):
+    """Fayllarga yangi havola (chiqim ularga ishora qila boshladi)"""
+    names = [name for name in names if name]
+    register(names)
+    for name in names:
+        ReceiptBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, updated_at=timezone.now())
+
+
+def release(names):
+    """Fayllardan havola olib tashlandi; fayl `gc_receipts` da o'chiriladi"""
+    for name in names:
+        if name:
+            ReceiptBlob.objects.filter(name=name, refcount__gt=0).update(
+                refcount=F('refcount') - 1, updated_at=timezone.now()
+            )
+
+
+def source_digest(original):
+    """Asl fayl kontent xeshi (nomidan); eski (uuid nomli) fayllar uchun None"""
+    digest = os.path.splitext(os.path.basename(original))[0]
+    return digest if DIGEST.match(digest) else None
+
+
+def remember_derived(original, name, variants):
+    """Asl chekdan olingan WebP va nusxalar nomlarini uning xeshi bo'yicha saqlash"""
+    digest = source_digest(original)
+    if digest:
+        ReceiptSource.objects.update_or_create(digest=digest, defaults={'image': name, 'variants': variants})
+
+
+def derived(original, variant_keys):
+    """
+    Shu asl chekdan avval yaratilgan WebP va nusxalar
+
+    Topilgan fayllar `hold` bilan GC dan himoyalanadi. Natija: (rasm nomi,
+    {o'lcham: nom}) yoki biror fayl topilmasa None.
+    """
+    digest = source_digest(original)
+    found = ReceiptSource.objects.filter(digest=digest).values('image', 'variants').first() if digest else None
+    if not found or not set(variant_keys) <= set(found['variants']):
+        return None
+    variants = {key: found['variants'][key] for key in variant_keys}
+    if not all(hold(name) for name in [found['image'], *variants.values()]):
+        return None
+    return found['image'], variants
+
+
+def collect_garbage(grace=None):
+    """Havolasi qolmagan fayllarni o'chirish. Natija: o'chirilgan fayllar soni"""
+    if grace is None:
+        grace = getattr(settings, 'RECEIPT_GC_GRACE', 60 * 60)
+    storage = receipt_storage()
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    deleted = 0
+    candidates = ReceiptBlob.objects.filter(refcount=0, updated_at__lt=cutoff).values_list('pk', 'name')
+    for pk, name in candidates.iterator():
+        # Qator qulflanadi: orada havola olingan yoki fayl qayta ishlatilgan (`hold`) bo'lsa o'chirilmaydi
+        with transaction.atomic():
+            blob = ReceiptBlob.objects.select_for_update().filter(pk=pk, refcount=0, updated_at__lt=cutoff)
+            if blob.values_list('pk', flat=True).first() is None:
+                continue
+            storage.delete(name)
+            blob.delete()
+        deleted += 1
+    # O'girilgan fayli qolmagan asl cheklar
+    ReceiptSource.objects.exclude(image__in=ReceiptBlob.objects.values('name')).delete()
+    return deleted
+
+
+def recount():
+    """
+    Havolalar sonini chiqimlar jadvalidan noldan hisoblash
+
+    Kontent bo'yicha saqlashdan oldingi (uuid nomli) fayllar ham ro'yxatga olinadi.
+    Natija: havolasi bor fayllar soni.
+    """
+    counts = Counter()
+    rows = Expense.objects.exclude(image='').exclude(image__isnull=True).values_list('image', 'image_variants')
+    for image, variants in rows.iterator():
+        counts.update(expense_files(image, variants))
+
+    storage = receipt_storage()
+    existing = [name for name in counts if storage.exists(name)]
+    register(existing)
+    ReceiptBlob.objects.exclude(name__in=existing).update(refcount=0)
+    for name in existing:
+        ReceiptBlob.objects.filter(name=name).update(refcount=counts[name])
+    return len(existing)
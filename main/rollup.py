@@ -0,0 +1,293 @@
+"""
+Chiqimlar bo'yicha saqlanadigan yig'indilarni yuritish
+
+- Kunlik yig'indi (ExpenseDailyRollup): har bir chiqim (bino, kategoriya,
+  foydalanuvchi, sana) kaliti bo'yicha bitta qatorga yig'iladi.
+- Bino hisoblagichlari: `spent_amount`, `expenses_count`, `last_expense_date`
+  va `category_totals`.
+
+Chiqim yozilganda yoki o'chirilganda faqat tegishli qatorlar farq (delta)
+bo'yicha o'zgartiriladi.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Count, Max, Subquery
+
+from .models import Building, Expense, ExpenseDailyRollup
+
+
+# Yig'indi kalitini tashkil etuvchi maydonlar
+KEY_FIELDS = ('building_id', 'category_id', 'created_by_id', 'date')
+
+# bulk_create uchun paket hajmi
+BATCH_SIZE = 1000
+
+CENT = Decimal('0.01')
+
+
+def expense_values(expense):
+    """
+    Chiqimning yig'indiga ta'sir qiluvchi qiymatlarini olish
+
+    Saqlanmagan obyektda `date` datetime yoki `amount` string bo'lishi mumkin,
+    shuning uchun qiymatlar model maydonlari orqali normallashtiriladi.
+    """
+    return {
+        'building_id': expense.building_id,
+        'category_id': expense.category_id,
+        'created_by_id': expense.created_by_id,
+        'date': Expense._meta.get_field('date').to_python(expense.date),
+        'amount': Expense._meta.get_field('amount').to_python(expense.amount),
+    }
+
+
+def stored_values(pk, *fields):
+    """Bazadagi (o'zgartirishdan oldingi) chiqim qiymatlarini olish (`fields` - qo'shimcha maydonlar)"""
+    return Expense.objects.filter(pk=pk).values(*KEY_FIELDS, 'amount', *fields).first()
+
+
+def _key(values):
+    return tuple(values[field] for field in KEY_FIELDS)
+
+
+def apply_delta(key, amount, count):
+    """
+    Bitta kalit bo'yicha summa va sonni o'zgartirish (qator bo'lmasa yaratiladi)
+
+    Kalit bo'yicha faqat bitta qator yangilanadi: `Subquery` birinchi qatorni
+    tanlaydi, noyoblik cheklovi (NULL qiymatlar 0 deb olinadi) esa ikkinchisi
+    paydo bo'lishiga yo'l qo'ymaydi.
+    """
+    lookup = dict(zip(KEY_FIELDS, key))
+    first = ExpenseDailyRollup.objects.filter(**lookup).order_by('pk').values('pk')[:1]
+    row = ExpenseDailyRollup.objects.filter(pk=Subquery(first))
+    updated = row.update(total=F('total') + amount, count=F('count') + count)
+    if not updated and count > 0:
+        try:
+            with transaction.atomic():
+                ExpenseDailyRollup.objects.create(total=amount, count=count, **lookup)
+        except IntegrityError:
+            # Parallel so'rov qatorni birinchi yaratib qo'ygan
+            row.update(total=F('total') + amount, count=F('count') + count)
+    elif count < 0:
+        row.filter(count__lte=0).delete()
+
+
+def detach(field, pk):
+    """
+    Foydalanuvchi yoki kategoriya o'chirilishidan oldin uning qatorlarini
+    NULL kalitga ko'chirish (`field` - 'created_by_id' yoki 'category_id')
+
+    Aks holda SET_NULL bir kalitga tushadigan bir nechta qator hosil qiladi.
+    """
+    rows = ExpenseDailyRollup.objects.filter(**{field: pk})
+    moved = list(rows.values(*KEY_FIELDS, 'total', 'count'))
+    rows.delete()
+    for values in moved:
+        values[field] = None
+        apply_delta(_key(values), values['total'], values['count'])
+
+
+def record_change(previous, current):
+    """
+    Chiqim o'zgarishini yig'indiga yozish
+
+    `previous` - o'zgarishdan oldingi qiymatlar (yangi chiqim uchun None),
+    `current` - o'zgarishdan keyingi qiymatlar (o'chirilgan chiqim uchun None).
+    """
+    if previous and current and _key(previous) == _key(current):
+        delta = current['amount'] - previous['amount']
+        if delta:
+            apply_delta(_key(current), delta, 0)
+        return
+    if previous:
+        apply_delta(_key(previous), -previous['amount'], -1)
+    if current:
+        apply_delta(_key(current), current['amount'], 1)
+
+
+def _money(value):
+    """Summani `category_totals` uchun 2 xonali kasrli satrga aylantirish"""
+    return str(Decimal(value).quantize(CENT))
+
+
+def category_key(category_id):
+    """`Building.category_totals` dagi kalit (kategoriyasiz chiqimlar uchun 'none')"""
+    return str(category_id) if category_id else 'none'
+
+
+def collect_building_change(changes, values, sign):
+    """
+    Chiqim qiymatlarini bino o'zgarishlari to'plamiga qo'shish
+
+    `sign` = 1 qo'shilgan chiqim uchun, -1 olib tashlangan chiqim uchun.
+    Bir nechta chiqim (masalan, ommaviy qo'shish) bitta to'plamga yig'ilib,
+    har bir bino bir marta yangilanadi.
+    """
+    change = changes.setdefault(values['building_id'], {
+        'amount': Decimal('0'),
+        'count': 0,
+        'categories': defaultdict(Decimal),
+        'added_dates': set(),
+        'removed_dates': set(),
+    })
+    amount = sign * values['amount']
+    change['amount'] += amount
+    change['count'] += sign
+    change['categories'][category_key(values['category_id'])] += amount
+    if sign > 0:
+        change['added_dates'].add(values['date'])
+    else:
+        change['removed_dates'].add(values['date'])
+    return changes
+
+
+def apply_building_change(building_id, change):
+    """
+    Bitta binoning hisoblagichlarini o'zgarish bo'yicha yangilash
+
+    `spent_amount` va `expenses_count` F() ifodalari bilan o'zgartiriladi,
+    `category_totals` esa bino qatori qulflangan holda o'qib-yoziladi.
+    Oxirgi chiqim sanasi olib tashlansa, u kunlik yig'indidan qayta topiladi.
+    """
+    with transaction.atomic():
+        row = (
+            Building.objects.select_for_update()
+            .filter(pk=building_id)
+            .values('category_totals', 'last_expense_date')
+            .first()
+        )
+        if row is None:
+            return
+
+        totals = dict(row['category_totals'] or {})
+        for key, delta in change['categories'].items():
+            if not delta:
+                continue
+            value = Decimal(totals.get(key, '0')) + delta
+            if value:
+                totals[key] = _money(value)
+            else:
+                totals.pop(key, None)
+
+        last_date = row['last_expense_date']
+        if last_date in change['removed_dates']:
+            last_date = (
+                ExpenseDailyRollup.objects.filter(building_id=building_id)
+                .aggregate(last=Max('date'))['last']
+            )
+        else:
+            last_date = max(filter(None, [last_date, *change['added_dates']]), default=None)
+
+        Building.objects.filter(pk=building_id).update(
+            spent_amount=F('spent_amount') + change['amount'],
+            expenses_count=F('expenses_count') + change['count'],
+            category_totals=totals,
+            last_expense_date=last_date
+        )
+
+
+def update_building_totals(previous, current):
+    """
+    Chiqim o'zgarishi bo'yicha bino hisoblagichlarini yangilash
+
+    Chiqim boshqa binoga ko'chirilsa, eski bino ham tuzatiladi.
+    """
+    if previous and current and all(
+        previous[field] == current[field] for field in ('building_id', 'category_id', 'date', 'amount')
+    ):
+        return
+    changes = {}
+    if previous:
+        collect_building_change(changes, previous, -1)
+    if current:
+        collect_building_change(changes, current, 1)
+    for building_id, change in changes.items():
+        apply_building_change(building_id, change)
+
+
+def record_created(values_list):
+    """
+    Ommaviy qo'shilgan chiqimlarni yig'indi va bino hisoblagichlariga yozish
+
+    `bulk_create` signal yubormaydi, shuning uchun chaqiruvchi shu funksiyani
+    ishlatadi. Har bir yig'indi kaliti va har bir bino faqat bir marta yangilanadi.
+    """
+    record_created_rollup(values_list)
+    changes = {}
+    for values in values_list:
+        collect_building_change(changes, values, 1)
+    for building_id, change in changes.items():
+        apply_building_change(building_id, change)
+
+
+def record_created_rollup(values_list):
+    """Ommaviy qo'shilgan chiqimlarni faqat kunlik yig'indiga yozish (har bir kalit bir marta)"""
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for values in values_list:
+        delta = deltas[_key(values)]
+        delta[0] += values['amount']
+        delta[1] += 1
+    for key, (amount, count) in deltas.items():
+        apply_delta(key, amount, count)
+
+
+def refresh_building_totals(building_ids=None):
+    """
+    Bino hisoblagichlarini kunlik yig'indidan noldan hisoblash
+
+    `building_ids` berilmasa, barcha binolar qayta hisoblanadi.
+    """
+    buildings = Building.objects.all()
+    rows = ExpenseDailyRollup.objects.all()
+    if building_ids is not None:
+        buildings = buildings.filter(pk__in=building_ids)
+        rows = rows.filter(building_id__in=building_ids)
+
+    summary = {
+        row['building_id']: row
+        for row in rows.order_by().values('building_id').annotate(
+            row_total=Sum('total'), row_count=Sum('count'), last=Max('date')
+        )
+    }
+    category_totals = defaultdict(dict)
+    for row in rows.order_by().values('building_id', 'category_id').annotate(row_total=Sum('total')):
+        if row['row_total']:
+            category_totals[row['building_id']][category_key(row['category_id'])] = _money(row['row_total'])
+
+    for building_id in buildings.values_list('pk', flat=True):
+        row = summary.get(building_id, {})
+        Building.objects.filter(pk=building_id).update(
+            spent_amount=row.get('row_total') or 0,
+            expenses_count=row.get('row_count') or 0,
+            last_expense_date=row.get('last'),
+            category_totals=category_totals.get(building_id, {})
+        )
+
+
+def rebuild():
+    """Yig'indini chiqimlar jadvalidan noldan qayta qurish"""
+    rows = (
+        Expense.objects.order_by()
+        .values(*KEY_FIELDS)
+        .annotate(row_total=Sum('amount'), row_count=Count('id'))
+    )
+    with transaction.atomic():
+        ExpenseDailyRollup.objects.all().delete()
+        batch = []
+        created = 0
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(ExpenseDailyRollup(
+                total=row['row_total'],
+                count=row['row_count'],
+                **{field: row[field] for field in KEY_FIELDS}
+            ))
+            if len(batch) >= BATCH_SIZE:
+                ExpenseDailyRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        ExpenseDailyRollup.objects.bulk_create(batch)
+        created += len(batch)
+    return created
@@ -1,10 +1,24 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User, Group
 from drf_spectacular.utils import extend_schema_field
-from .models import Building, Expense, ExpenseCategory
+from .models import Building, Expense, ExpenseCategory, ExpenseImport, UploadSession
+from .instrumentation import measure_serialization
 
 
-class UserSerializer(serializers.ModelSerializer):
+class ModelSerializer(serializers.ModelSerializer):
+    """
+    Barcha model serializerlari uchun umumiy asos
+
+    `to_representation` vaqti joriy so'rovning Server-Timing o'lchoviga
+    (`serialize`) qo'shiladi - har bir serializerda alohida o'lchash shart emas.
+    """
+
+    def to_representation(self, instance):
+        with measure_serialization():
+            return super().to_representation(instance)
+
+
+class UserSerializer(ModelSerializer):
     """
     Foydalanuvchi serializeri
     
@@ -20,13 +34,14 @@ class UserSerializer(serializers.ModelSerializer):
     @extend_schema_field(serializers.CharField())
     def get_role(self, obj):
         """Foydalanuvchi rolini olish"""
-        groups = obj.groups.all()
-        if groups.exists():
-            return groups.first().name
+        # `.first()` yangi so'rov yuboradi - oldindan yuklangan guruhlardan tanlaymiz
+        groups = sorted(obj.groups.all(), key=lambda group: group.pk)
+        if groups:
+            return groups[0].name
         return 'Viewer'
 
 
-class UserCreateSerializer(serializers.ModelSerializer):
+class UserCreateSerializer(ModelSerializer):
     """
     Yangi foydalanuvchi yaratish serializeri
     """
@@ -69,7 +84,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return user
 
 
-class ExpenseCategorySerializer(serializers.ModelSerializer):
+class ExpenseCategorySerializer(ModelSerializer):
     """
     Chiqim kategoriyasi serializeri
     """
@@ -78,7 +93,7 @@ class ExpenseCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'icon', 'color', 'order', 'is_active']
 
 
-class BuildingListSerializer(serializers.ModelSerializer):
+class BuildingListSerializer(ModelSerializer):
     """
     Binolar ro'yxati serializeri
     
@@ -90,7 +105,6 @@ class BuildingListSerializer(serializers.ModelSerializer):
         read_only=True,
         help_text="Qolgan mablag' (so'm)"
     )
-    expenses_count = serializers.SerializerMethodField(help_text="Chiqimlar soni")
     status_display = serializers.CharField(
         source='get_status_display', 
         read_only=True,
@@ -102,16 +116,12 @@ class BuildingListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'status', 'status_display', 'budget', 
             'spent_amount', 'remaining_budget', 'start_date', 
-            'end_date', 'expenses_count', 'created_at'
+            'end_date', 'expenses_count', 'last_expense_date', 'created_at'
         ]
-    
-    @extend_schema_field(serializers.IntegerField())
-    def get_expenses_count(self, obj):
-        """Binoga tegishli chiqimlar soni"""
-        return obj.expenses.count()
+        read_only_fields = ['expenses_count', 'last_expense_date']
 
 
-class BuildingDetailSerializer(serializers.ModelSerializer):
+class BuildingDetailSerializer(ModelSerializer):
     """
     Bino tafsilotlari serializeri
     
@@ -132,10 +142,13 @@ class BuildingDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Building
         fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = [
+            'created_at', 'updated_at',
+            'expenses_count', 'last_expense_date', 'category_totals'
+        ]
 
 
-class BuildingCreateUpdateSerializer(serializers.ModelSerializer):
+class BuildingCreateUpdateSerializer(ModelSerializer):
     """
     Bino yaratish/yangilash serializeri
     """
@@ -146,19 +159,27 @@ class BuildingCreateUpdateSerializer(serializers.ModelSerializer):
 
 
 import base64
-import uuid
-from django.core.files.base import ContentFile
-from PIL import Image
-import io
+import binascii
+from . import images, uploads
 
 class Base64WebPImageField(serializers.ImageField):
     """
-    Base64 formatidagi rasmni qabul qilib, uni WebP formatga o'tkazib saqlovchi shaxsiy maydon.
+    Rasmni base64 satr yoki multipart fayl sifatida qabul qiluvchi shaxsiy maydon.
+
+    So'rov ichida faqat rasm tekshiriladi va asl fayl saqlanadi,
+    WebP ga o'girish esa fonda bajariladi (qarang: images.py).
     """
     def to_internal_value(self, data):
-        # Agar data rasm bo'lsa (URL emas), uni qaytaramiz
+        # Multipart fayl (FILE_UPLOAD_HANDLERS orqali vaqtinchalik faylga yozilgan)
         if hasattr(data, 'name'):
-            return super().to_internal_value(data)
+            data = super().to_internal_value(data)
+            if data.image.width * data.image.height > images.max_pixels():
+                raise serializers.ValidationError(f"Rasm juda katta: {data.image.width}x{data.image.height}")
+            try:
+                data.name = images.original_name(images.EXTENSIONS[data.image.format])
+            except KeyError:
+                self.fail('invalid_image')
+            return data
             
         # Agar data string bo'lsa (base64)
         if isinstance(data, str):
@@ -168,30 +189,33 @@ class Base64WebPImageField(serializers.ImageField):
             
             try:
                 decoded_file = base64.b64decode(data)
-            except TypeError:
+            except (TypeError, binascii.Error):
                 self.fail('invalid_image')
             
-            # Fayl nomini generatsiya qilish
-            file_name = str(uuid.uuid4()) + ".webp"
-            
-            # Rasmni ochish va WebP ga o'tkazish
             try:
-                image = Image.open(io.BytesIO(decoded_file))
-                
-                # Agar rasmda alpha kanal bo'lsa (RGBA), uni saqlab qolish
-                # RGB ga o'tkazish shart emas, chunki WebP transparency ni qo'llab-quvvatlaydi
-                
-                output = io.BytesIO()
-                image.save(output, format='WEBP', quality=80)
-                output.seek(0)
-                
-                data = ContentFile(output.read(), name=file_name)
-            except Exception:
+                data = images.original_file(decoded_file)
+            except images.InvalidImage as exc:
+                if str(exc):
+                    raise serializers.ValidationError(str(exc))
                 self.fail('invalid_image')
 
         return super().to_internal_value(data)
 
 
+@extend_schema_field({'type': 'object', 'additionalProperties': {'type': 'string', 'format': 'uri'}})
+class ImageVariantsField(serializers.Field):
+    """
+    Rasmning kichraytirilgan nusxalari URL lari: {"128": "...", "512": "..."}
+    """
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, expense):
+        return images.variant_urls(expense, self.context.get('request'))
+
+
 class ExpenseStatisticsSerializer(serializers.Serializer):
     """
     Chiqimlar statistikasi serializeri
@@ -219,7 +243,7 @@ class ExpenseStatisticsSerializer(serializers.Serializer):
     )
 
 
-class ExpenseListSerializer(serializers.ModelSerializer):
+class ExpenseListSerializer(ModelSerializer):
     """
     Chiqimlar ro'yxati serializeri
     """
@@ -253,18 +277,19 @@ class ExpenseListSerializer(serializers.ModelSerializer):
         read_only=True,
         help_text="Kim tomonidan qo'shilgan"
     )
+    image_variants = ImageVariantsField(help_text="Kichik rasmlar (ro'yxat uchun) URL lari")
     
     class Meta:
         model = Expense
         fields = [
             'id', 'building', 'building_name',
             'category', 'category_display', 'category_slug', 'category_icon', 'category_color',
-            'description', 'amount', 'date', 'image', 
+            'description', 'amount', 'date', 'image', 'image_variants', 'image_status',
             'created_by', 'created_by_name', 'created_at'
         ]
 
 
-class ExpenseDetailSerializer(serializers.ModelSerializer):
+class ExpenseDetailSerializer(ModelSerializer):
     """
     Chiqim tafsilotlari serializeri
     """
@@ -278,18 +303,25 @@ class ExpenseDetailSerializer(serializers.ModelSerializer):
         read_only=True,
         help_text="Kategoriya (o'zbek tilida)"
     )
+    image_variants = ImageVariantsField(help_text="Kichraytirilgan rasmlar URL lari")
     
     class Meta:
         model = Expense
         fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at', 'created_by']
+        read_only_fields = ['created_at', 'updated_at', 'created_by', 'image_status']
 
 
-class ExpenseCreateUpdateSerializer(serializers.ModelSerializer):
+class ExpenseCreateUpdateSerializer(ModelSerializer):
     """
     Chiqim yaratish/yangilash serializeri
     """
     image = Base64WebPImageField(required=False, allow_null=True)
+    upload = serializers.PrimaryKeyRelatedField(
+        queryset=UploadSession.objects.filter(status=UploadSession.Status.COMPLETE),
+        required=False,
+        write_only=True,
+        help_text="Bo'laklab yuklangan rasm (/api/uploads/) ID si - `image` o'rniga"
+    )
     date = serializers.DateField(
         required=False, 
         allow_null=True,
@@ -298,7 +330,17 @@ class ExpenseCreateUpdateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Expense
-        fields = ['building', 'category', 'description', 'amount', 'date', 'image']
+        fields = ['building', 'category', 'description', 'amount', 'date', 'image', 'upload']
+
+    def validate_upload(self, value):
+        if value.created_by_id != self.context['request'].user.pk:
+            raise serializers.ValidationError("Yuklash sessiyasi topilmadi")
+        return value
+
+    def validate(self, attrs):
+        if attrs.get('upload') and attrs.get('image'):
+            raise serializers.ValidationError("`image` va `upload` dan faqat bittasini yuboring")
+        return attrs
     
     def create(self, validated_data):
         # Agar sana kiritilmagan bo'lsa, bugungi sanani qo'yish
@@ -306,5 +348,70 @@ class ExpenseCreateUpdateSerializer(serializers.ModelSerializer):
             from django.utils import timezone
             validated_data['date'] = timezone.now().date()
         validated_data['created_by'] = self.context['request'].user
-        return super().create(validated_data)
+        upload = self.set_image_status(validated_data)
+        expense = super().create(validated_data)
+        self.image_saved(expense, upload)
+        return expense
+
+    def update(self, instance, validated_data):
+        upload = self.set_image_status(validated_data)
+        expense = super().update(instance, validated_data)
+        self.image_saved(expense, upload)
+        return expense
+
+    @staticmethod
+    def set_image_status(validated_data):
+        """Natija: biriktirilayotgan yuklash sessiyasi va uning fayli (bo'lmasa None)"""
+        upload = None
+        session = validated_data.pop('upload', None)
+        if session is not None:
+            upload = (session, uploads.open_completed(session))
+            validated_data['image'] = upload[1]
+        if 'image' in validated_data:
+            # Yangi rasm saqlangach WebP ga o'girish navbatga qo'yiladi
+            if validated_data['image']:
+                validated_data['image_status'] = Expense.ImageStatus.PENDING
+            else:
+                validated_data['image_status'] = Expense.ImageStatus.NONE
+            # Nusxalar o'girish tugagach yangi rasmdan yaratiladi
+            validated_data['image_variants'] = {}
+        return upload
+
+    @staticmethod
+    def image_saved(expense, upload):
+        if upload is not None:
+            uploads.attached(*upload)
+        if expense.image_status == Expense.ImageStatus.PENDING and expense.image:
+            images.schedule_encode(expense)
+
+
+class ExpenseImportSerializer(ModelSerializer):
+    """
+    CSV import jarayoni holati
+    """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = ExpenseImport
+        fields = [
+            'id', 'status', 'status_display', 'rows_processed', 'rows_created',
+            'error_count', 'errors', 'message', 'started_at', 'finished_at', 'created_at'
+        ]
+        read_only_fields = fields
+
+
+class UploadSessionSerializer(ModelSerializer):
+    """
+    Bo'laklab yuklash sessiyasi
+    """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'received', 'status', 'status_display', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'received', 'status', 'created_at', 'updated_at']
 
+    def validate_size(self, value):
+        if value <= 0 or value > uploads.max_size():
+            raise serializers.ValidationError(f"Fayl hajmi 1 dan {uploads.max_size()} baytgacha bo'lishi kerak")
+        return value
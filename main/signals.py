@@ -1,19 +1,146 @@
-from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.db.models import Sum
-from .models import Expense
+from .models import Building, Expense, ExpenseCategory
+from . import receipts, rollup, snapshots, tokens
+from .generations import DATA_GENERATIONS, bump_generation, generations_bumped
+
+
+@receiver(pre_save, sender=Expense)
+def remember_previous_expense(sender, instance, **kwargs):
+    """
+    Chiqim o'zgartirilishidan oldin uning bazadagi qiymatlarini eslab qolish
+    """
+    instance._previous_values = None
+    if not instance._state.adding and instance.pk:
+        # Rasm maydonlari shu so'rovning o'zida olinadi (havolalar soni uchun)
+        instance._previous_values = rollup.stored_values(instance.pk, 'image', 'image_variants')
+
 
 @receiver(post_save, sender=Expense)
+def apply_expense_save(sender, instance, **kwargs):
+    """
+    Chiqim qo'shilganda yoki o'zgartirilganda kunlik yig'indi va
+    bino hisoblagichlarini (sarflangan mablag', chiqimlar soni va h.k.) yangilash
+    """
+    previous = getattr(instance, '_previous_values', None)
+    current = rollup.expense_values(instance)
+    rollup.record_change(previous, current)
+    rollup.update_building_totals(previous, current)
+    update_fields = kwargs.get('update_fields')
+    if not update_fields or {'image', 'image_variants'} & set(update_fields):
+        move_receipt_references(previous, instance)
+    instance._previous_values = None
+
+
+def move_receipt_references(previous, instance):
+    """Rasm almashtirilgan bo'lsa, yangi fayllarga havola qo'shib, eskilaridan olib tashlash"""
+    old = receipts.expense_files(previous['image'], previous['image_variants']) if previous else []
+    new = receipts.expense_files(instance.image.name, instance.image_variants)
+    receipts.acquire([name for name in new if name not in old])
+    receipts.release([name for name in old if name not in new])
+
+
 @receiver(post_delete, sender=Expense)
-def update_building_spent_amount(sender, instance, **kwargs):
-    """
-    Chiqim qo'shilganda, o'zgartirilganda yoki o'chirilganda
-    binoning sarflangan mablag'ini qayta hisoblash
-    """
-    building = instance.building
-    # Barcha chiqimlar yig'indisini hisoblash
-    total_expenses = building.expenses.aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Binoga yozish
-    building.spent_amount = total_expenses
-    building.save()
+def apply_expense_delete(sender, instance, **kwargs):
+    """
+    Chiqim o'chirilganda kunlik yig'indi va bino hisoblagichlarini yangilash
+    """
+    previous = rollup.expense_values(instance)
+    rollup.record_change(previous, None)
+    rollup.update_building_totals(previous, None)
+    # Fayllar darhol o'chirilmaydi - ular boshqa chiqimlarda ham bo'lishi mumkin
+    receipts.release(receipts.expense_files(instance.image.name, instance.image_variants))
+
+
+@receiver(pre_delete, sender=User)
+def detach_user_rollups(sender, instance, **kwargs):
+    """
+    Foydalanuvchi o'chirilsa uning chiqimlari `created_by=NULL` bo'ladi -
+    kunlik yig'indi qatorlari ham NULL kalitdagi qatorga qo'shiladi
+    """
+    rollup.detach('created_by_id', instance.pk)
+    bump_generation('expenses')
+
+
+@receiver(pre_delete, sender=ExpenseCategory)
+def detach_category_rollups(sender, instance, **kwargs):
+    """Kategoriya o'chirilsa uning kunlik yig'indi qatorlari NULL kalitga ko'chiriladi"""
+    rollup.detach('category_id', instance.pk)
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def bump_expenses_generation(sender, instance, **kwargs):
+    """Chiqimlarga bog'liq keshlarni eskirgan deb belgilash"""
+    bump_generation('expenses')
+
+
+@receiver(post_save, sender=Building)
+@receiver(post_delete, sender=Building)
+def bump_buildings_generation(sender, instance, **kwargs):
+    """Binolarga bog'liq keshlarni eskirgan deb belgilash"""
+    bump_generation('buildings')
+
+
+@receiver(post_save, sender=ExpenseCategory)
+@receiver(post_delete, sender=ExpenseCategory)
+def bump_categories_generation(sender, instance, **kwargs):
+    """Kategoriyalarga bog'liq keshlarni eskirgan deb belgilash"""
+    bump_generation('categories')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(m2m_changed, sender=User.groups.through)
+def bump_users_generation(sender, instance, **kwargs):
+    """Foydalanuvchilar va rollarga bog'liq keshlarni eskirgan deb belgilash"""
+    bump_generation('users')
+
+
+@receiver(generations_bumped)
+def schedule_dashboard_refresh(sender, names, **kwargs):
+    """Statistikaga ta'sir qiluvchi yozuvdan keyin dashboard snapshotini yangilash"""
+    if set(names) & set(DATA_GENERATIONS):
+        snapshots.schedule_refresh()
+
+
+# Tokendagi rol ma'lumotlariga ta'sir qiluvchi maydonlar (qarang: tokens.py)
+ROLE_FIELDS = ('username', 'is_superuser', 'is_active')
+
+
+@receiver(pre_save, sender=User)
+def bump_role_version_on_user_change(sender, instance, **kwargs):
+    """ceoadmin holati, superuser yoki faollik o'zgarsa eski tokenlarni bekor qilish"""
+    if instance._state.adding or not instance.pk:
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not set(ROLE_FIELDS) & set(update_fields):
+        # Masalan last_login yoki parol - rolga ta'sir qilmaydi
+        return
+    stored = User.objects.filter(pk=instance.pk).values(*ROLE_FIELDS).first()
+    if stored and any(stored[field] != getattr(instance, field) for field in ROLE_FIELDS):
+        tokens.bump_role_version(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def bump_role_version_on_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Foydalanuvchi guruhi (roli) o'zgarsa eski tokenlarni bekor qilish"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # Guruh tomonidan tozalash: a'zolar hali ro'yxatda
+        user_ids = list(instance.user_set.values_list('pk', flat=True))
+    else:
+        user_ids = pk_set or []
+    for user_id in user_ids:
+        tokens.bump_role_version(user_id)
+
+
+@receiver(pre_delete, sender=Group)
+def bump_role_version_on_group_delete(sender, instance, **kwargs):
+    """Guruh o'chirilsa a'zolari rolini yo'qotadi (m2m_changed yuborilmaydi)"""
+    for user_id in instance.user_set.values_list('pk', flat=True):
+        tokens.bump_role_version(user_id)
@@ -0,0 +1,135 @@
+"""
+Oldindan hisoblangan statistika snapshotlari
+
+Dashboard javobi `StatisticsSnapshot` jadvalida tayyor JSON holatida
+saqlanadi va endpoint faqat bitta qatorni o'qiydi. Snapshot yozuv
+tomonida yangilanadi: chiqim, bino yoki kategoriya o'zgarib, ma'lumotlar
+avlodi tokenlari almashganda (qarang: generations.py) tranzaksiya
+tasdiqlangach qayta hisoblash rejalashtiriladi (`DASHBOARD_SNAPSHOT_BACKEND`):
+- `'thread'` - fon oqimida, `DASHBOARD_SNAPSHOT_DELAY` soniyadan keyin;
+  shu oraliqdagi barcha yozuvlar bitta hisoblashga birlashadi (debounce);
+- `'sync'` - tasdiqlangan zahoti (testlar va boshqaruv buyruqlari uchun).
+
+O'qish hech qachon snapshotni o'zi qayta hisoblamaydi (faqat u umuman
+bo'lmasa): eskirgan snapshot qaytariladi va fon yangilanishi rejalashtiriladi
+(masalan, yozgan jarayon yangilashdan oldin to'xtagan bo'lsa).
+"""
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import stats
+from .caching import get_or_compute
+from .generations import DATA_GENERATIONS, get_generations
+from .models import StatisticsSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD = 'dashboard'
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def backend():
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_BACKEND', 'thread')
+
+
+def current_generation():
+    return ':'.join(get_generations(DATA_GENERATIONS))
+
+
+def _to_json(payload):
+    """Javobni DRF render qiladigan ko'rinishga keltirish (Decimal -> float, sana -> ISO)"""
+    return json.loads(json.dumps(payload, cls=JSONEncoder))
+
+
+def refresh_dashboard(generation=None):
+    """Dashboard snapshotini qayta hisoblab saqlash"""
+    if generation is None:
+        generation = current_generation()
+    payload = _to_json(stats.dashboard_statistics())
+    StatisticsSnapshot.objects.update_or_create(
+        name=DASHBOARD,
+        defaults={
+            'payload': payload,
+            'generation': generation,
+            'computed_at': timezone.now()
+        }
+    )
+    return payload
+
+
+def refresh_dashboard_shared(generation=None):
+    """Joriy avlod uchun snapshotni yangilash - parallel jarayonlar uni bir marta hisoblaydi"""
+    if generation is None:
+        generation = current_generation()
+    return get_or_compute(
+        'snapshot:' + DASHBOARD + ':' + generation,
+        lambda: refresh_dashboard(generation)
+    )
+
+
+def _run_in_background():
+    global _timer
+    with _timer_lock:
+        # Hisoblash paytidagi yozuvlar yangi yangilanishni rejalashtiradi
+        _timer = None
+    try:
+        refresh_dashboard_shared()
+    except Exception:
+        logger.exception("Dashboard snapshotini yangilab bo'lmadi")
+    finally:
+        # Fon oqimining o'z DB ulanishi
+        connections.close_all()
+
+
+def _schedule_background():
+    """Fon yangilanishini rejalashtirish (allaqachon rejalashtirilgan bo'lsa - shu yetarli)"""
+    global _timer
+    with _timer_lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(getattr(settings, 'DASHBOARD_SNAPSHOT_DELAY', 1.0), _run_in_background)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _refresh_after_write():
+    if backend() == 'sync':
+        refresh_dashboard_shared()
+    else:
+        _schedule_background()
+
+
+def schedule_refresh():
+    """Tranzaksiya tasdiqlangach snapshotni yangilash (xato yozuv so'rovini buzmaydi)"""
+    transaction.on_commit(_refresh_after_write, robust=True)
+
+
+def dashboard():
+    """
+    Dashboard ma'lumotlarini snapshotdan olish
+
+    Natija: (ma'lumotlar, avlod tokenlari) - ETag javob tanasi aynan qaysi
+    avlod bilan hisoblangan bo'lsa, shundan tuziladi (eskirgan snapshot
+    yangi validator ostida yuborilmasligi uchun).
+    """
+    snapshot = (
+        StatisticsSnapshot.objects.filter(name=DASHBOARD)
+        .values('payload', 'generation')
+        .first()
+    )
+    if snapshot is None:
+        # Birinchi so'rov - parallel so'rovlar snapshotni faqat bir marta hisoblaydi
+        generation = current_generation()
+        return refresh_dashboard_shared(generation), tuple(generation.split(':'))
+    if snapshot['generation'] != current_generation() and backend() != 'sync':
+        _schedule_background()
+    return snapshot['payload'], tuple(snapshot['generation'].split(':'))
@@ -0,0 +1,62 @@
+"""
+SQLite ulanishini sozlash (PRAGMA)
+
+Har bir yangi ulanishda (`connection_created` signali) `SQLITE_PRAGMAS`
+sozlamasidagi qiymatlar o'rnatiladi:
+- `synchronous=NORMAL` - WAL rejimida xavfsiz, har bir tranzaksiyada fsync yo'q.
+  Baza WAL rejimida bo'lmasa (rollback jurnali) NORMAL elektr uzilganda bazani
+  buzishi mumkin, shuning uchun bunday ulanishda `FULL` o'rnatiladi;
+- `busy_timeout` - baza band bo'lsa darhol "database is locked" o'rniga kutish (ms);
+- `mmap_size` - faylni xotiraga akslantirib o'qish (bayt);
+- `cache_size` - sahifalar keshi (manfiy qiymat - KiB);
+- `temp_store=MEMORY` - vaqtinchalik jadvallar va indekslar xotirada.
+
+`journal_mode=WAL` (o'quvchilar yozuvchini kutmaydi va aksincha) ulanish
+sozlamasi emas - u baza fayli sarlavhasiga yoziladi va saqlanib qoladi.
+Shuning uchun u har bir ulanishda emas, faqat bir marta
+`optimize_sqlite --wal` buyrug'i bilan yoqiladi (undan oldin ochilgan
+ulanishlar qayta ulanguncha `FULL` da qoladi).
+
+Yozuvchilar bir-birini "database is locked" bilan to'xtatmasligi uchun
+tranzaksiyalar `BEGIN IMMEDIATE` bilan boshlanadi (`DATABASES` dagi
+`transaction_mode`): yozish qulfi tranzaksiya boshida olinadi va
+`busy_timeout` davomida kutiladi.
+"""
+import re
+
+from django.conf import settings
+
+
+# PRAGMA qiymati parametr sifatida berilmaydi - faqat oddiy nom va qiymatlar
+_IDENTIFIER = re.compile(r'^[A-Za-z_]+$')
+_VALUE = re.compile(r'^-?\w+$')
+
+
+def pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def apply_pragmas(cursor, values):
+    """PRAGMA larni o'rnatish (`cursor` - Django yoki sqlite3 kursori)"""
+    for name, value in values.items():
+        if not _IDENTIFIER.match(name) or not _VALUE.match(str(value)):
+            raise ValueError(f"Noto'g'ri PRAGMA: {name}={value}")
+        cursor.execute(f'PRAGMA {name}={value}')
+
+
+def durable_pragmas(cursor, values):
+    """`synchronous=NORMAL` faqat WAL rejimida qoladi, aks holda `FULL` ga almashtiriladi"""
+    if str(values.get('synchronous', '')).upper() != 'NORMAL':
+        return values
+    cursor.execute('PRAGMA journal_mode')
+    if cursor.fetchone()[0].lower() == 'wal':
+        return values
+    return {**values, 'synchronous': 'FULL'}
+
+
+def configure_connection(sender, connection, **kwargs):
+    """`connection_created` signali: SQLite ulanishiga PRAGMA larni qo'llash"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, durable_pragmas(cursor, pragmas()))
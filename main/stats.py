@@ -0,0 +1,424 @@
+"""
+Statistika hisoblash moduli
+
+Barcha statistika endpointlari (chiqimlar statistikasi, bino statistikasi,
+oylik/haftalik hisobot va dashboard) shu modul orqali hisoblanadi.
+Har bir kesim (kategoriya, bino, foydalanuvchi, kun/hafta/oy) kunlik yig'indi
+jadvalidan bitta guruhlangan so'rov bilan olinadi, shuning uchun so'rovlar soni
+kategoriyalar, binolar yoki chiqimlar soniga bog'liq emas.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Sum, Count, Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import Building, Expense, ExpenseCategory, ExpenseDailyRollup
+
+
+# CEO Admin username
+CEO_ADMIN_USERNAME = 'ceoadmin'
+
+# Vaqt oynalari
+DAILY_WINDOW = timedelta(days=30)
+WEEKLY_WINDOW = timedelta(weeks=8)
+MONTHLY_WINDOW = timedelta(days=365)
+
+
+class ExpenseFilter:
+    """
+    Chiqimlar filtri spetsifikatsiyasi
+
+    So'rov parametrlaridan (date_from, date_to, building, category, created_by)
+    bir marta o'qiladi va queryset yoki Q obyektiga aylantiriladi.
+    `owner` berilsa, faqat shu foydalanuvchining chiqimlari olinadi.
+    """
+
+    def __init__(self, date_from=None, date_to=None, building=None,
+                 category=None, created_by=None, owner=None):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.building = building
+        self.category = category
+        self.created_by = created_by
+        self.owner = owner
+
+    @classmethod
+    def from_request(cls, request, **overrides):
+        """So'rov parametrlaridan filtr yaratish"""
+        params = request.query_params
+        is_ceo = request.user.username == CEO_ADMIN_USERNAME
+        values = {
+            'date_from': params.get('date_from') or None,
+            'date_to': params.get('date_to') or None,
+            'building': params.get('building') or None,
+            'category': params.get('category') or None,
+            # created_by filtri faqat ceoadmin uchun
+            'created_by': (params.get('created_by') or None) if is_ceo else None,
+        }
+        values.update(overrides)
+        return cls(**values)
+
+    def q(self, prefix=''):
+        """Filtrni Q obyektiga aylantirish (bog'langan modellar uchun prefix bilan)"""
+        conditions = {}
+        if self.date_from:
+            conditions[f'{prefix}date__gte'] = self.date_from
+        if self.date_to:
+            conditions[f'{prefix}date__lte'] = self.date_to
+        if self.building:
+            conditions[f'{prefix}building_id'] = self.building
+        if self.category:
+            conditions[f'{prefix}category_id'] = self.category
+        if self.created_by:
+            conditions[f'{prefix}created_by_id'] = self.created_by
+        if self.owner is not None:
+            conditions[f'{prefix}created_by'] = self.owner
+        return Q(**conditions)
+
+    def apply(self, queryset):
+        """Filtrni querysetga qo'llash"""
+        return queryset.filter(self.q())
+
+    @property
+    def is_empty(self):
+        """Hech qanday filtr berilmaganmi"""
+        return not self.q()
+
+
+def overall_totals():
+    """
+    Barcha chiqimlar summasi va soni
+
+    Bino hisoblagichlaridan (`expenses_count`, `category_totals`) olinadi -
+    binolar jadvali kichik, chiqimlar yoki kunlik yig'indi jadvalini
+    to'liq skanerlash shart emas.
+    """
+    total, count = Decimal('0'), 0
+    for expenses_count, category_totals in Building.objects.values_list('expenses_count', 'category_totals'):
+        count += expenses_count
+        total += sum((Decimal(value) for value in category_totals.values()), Decimal('0'))
+    return total, count
+
+
+class ExpenseStatistics:
+    """
+    Filtrlangan chiqimlar bo'yicha barcha kesimlarni hisoblovchi klass
+
+    Summa va sonlar kunlik yig'indi jadvalidan (ExpenseDailyRollup) olinadi,
+    xom chiqimlar jadvaliga faqat eng katta/kichik chiqim va so'nggi chiqimlar
+    uchun murojaat qilinadi. Har bir metod bitta so'rov bajaradi; kunlik,
+    haftalik va oylik kesimlar bitta kunlik guruhlangan so'rovdan yig'iladi.
+    """
+
+    def __init__(self, spec=None, today=None):
+        self.spec = spec or ExpenseFilter()
+        self.today = today or timezone.now().date()
+
+    @cached_property
+    def expenses(self):
+        """Filtrlangan xom chiqimlar"""
+        return self.spec.apply(Expense.objects.all())
+
+    @cached_property
+    def rollups(self):
+        """Filtrlangan kunlik yig'indi qatorlari"""
+        return self.spec.apply(ExpenseDailyRollup.objects.all())
+
+    def totals(self, extremes=True):
+        """Umumiy summa, soni, o'rtacha, eng katta va eng kichik chiqim"""
+        if self.spec.is_empty:
+            total, count = overall_totals()
+        else:
+            stats = self.rollups.aggregate(total=Sum('total'), count=Sum('count'))
+            total = stats['total'] or 0
+            count = stats['count'] or 0
+        result = {
+            'total': total,
+            'count': count,
+            'avg': round(total / count, 2) if count else 0,
+            'max': 0,
+            'min': 0,
+        }
+        if extremes and count:
+            # MAX va MIN alohida so'rovlar: har biri indeksdan bitta qatorni o'qiydi,
+            # birgalikdagi aggregate esa butun jadvalni skanerlaydi
+            amounts = self.expenses.order_by().values_list('amount', flat=True)
+            result['max'] = amounts.order_by('-amount').first() or 0
+            result['min'] = amounts.order_by('amount').first() or 0
+        return result
+
+    def by_category(self):
+        """Kategoriyalar bo'yicha summa (chiqimi bo'lmagan kategoriyalar ham 0 bilan)"""
+        condition = self.spec.q('daily_rollups__')
+        categories = ExpenseCategory.objects.annotate(
+            total=Sum('daily_rollups__total', filter=condition if condition else None)
+        ).order_by('order', 'name').values_list('name', 'total')
+        return {name: float(total or 0) for name, total in categories}
+
+    def by_building(self, limit=None):
+        """Binolar bo'yicha summa va soni (kamayish tartibida)"""
+        rows = (
+            self.rollups.values('building__name', 'building_id')
+            .annotate(total=Sum('total'), count=Sum('count'))
+            .order_by('-total')
+        )
+        return list(rows[:limit] if limit else rows)
+
+    def by_user(self, limit=None):
+        """Foydalanuvchilar bo'yicha summa va soni (kamayish tartibida)"""
+        rows = (
+            self.rollups.values('created_by__username', 'created_by_id')
+            .annotate(total=Sum('total'), count=Sum('count'))
+            .order_by('-total')
+        )
+        return list(rows[:limit] if limit else rows)
+
+    def days(self, since=None):
+        """Kunlik summalar (sana bo'yicha o'sish tartibida)"""
+        rows = self.rollups
+        if since:
+            rows = rows.filter(date__gte=since)
+        return list(
+            rows.values('date')
+            .annotate(total=Sum('total'), count=Sum('count'))
+            .order_by('date')
+        )
+
+    @cached_property
+    def _days(self):
+        """So'nggi 12 oy uchun kunlik summalar - boshqa vaqt kesimlari shundan yig'iladi"""
+        return self.days(since=self.today - MONTHLY_WINDOW)
+
+    def _bucket(self, since, key, label):
+        buckets = {}
+        for row in self._days:
+            if row['date'] < since:
+                continue
+            bucket = buckets.setdefault(key(row['date']), {'total': 0, 'count': 0})
+            bucket['total'] += row['total'] or 0
+            bucket['count'] += row['count']
+        return [
+            {label: period, 'total': values['total'], 'count': values['count']}
+            for period, values in sorted(buckets.items())
+        ]
+
+    def daily(self):
+        """Kunlik chiqimlar (so'nggi 30 kun)"""
+        since = self.today - DAILY_WINDOW
+        return [dict(row) for row in self._days if row['date'] >= since]
+
+    def weekly(self):
+        """Haftalik chiqimlar (so'nggi 8 hafta, hafta dushanbadan boshlanadi)"""
+        return self._bucket(self.today - WEEKLY_WINDOW, week_start, 'week')
+
+    def monthly(self):
+        """Oylik chiqimlar (so'nggi 12 oy)"""
+        return self._bucket(
+            self.today - MONTHLY_WINDOW,
+            lambda day: day.replace(day=1),
+            'month'
+        )
+
+    def recent(self, limit=10):
+        """So'nggi chiqimlar"""
+        return list(
+            self.expenses.order_by('-date', '-created_at')[:limit].values(
+                'id', 'description', 'amount', 'date',
+                'category__name', 'category__icon', 'category__color',
+                'created_by__username'
+            )
+        )
+
+
+def week_start(day):
+    """Hafta boshi (dushanba)"""
+    return day - timedelta(days=day.weekday())
+
+
+def expense_statistics(spec, include_users=False):
+    """`/api/expenses/statistics/` uchun ma'lumotlar"""
+    stats = ExpenseStatistics(spec)
+    totals = stats.totals()
+    return {
+        'total_expenses': float(totals['total']),
+        'expenses_count': totals['count'],
+        'average_expense': float(totals['avg']),
+        'max_expense': float(totals['max']),
+        'min_expense': float(totals['min']),
+        'expenses_by_category': stats.by_category(),
+        'expenses_by_building': stats.by_building(limit=10),
+        'top_users': stats.by_user(limit=10) if include_users else [],
+        'daily_expenses': stats.daily(),
+        'weekly_expenses': stats.weekly(),
+        'monthly_expenses': stats.monthly()
+    }
+
+
+def building_statistics(building, spec, include_users=False):
+    """`/api/buildings/{id}/statistics/` uchun ma'lumotlar"""
+    stats = ExpenseStatistics(spec)
+    totals = stats.totals()
+
+    monthly_data = [
+        {
+            'month': item['month'].strftime('%Y-%m'),
+            'month_name': item['month'].strftime('%B %Y'),
+            'total': float(item['total'] or 0)
+        }
+        for item in stats.monthly()
+    ]
+
+    recent_expenses = [
+        {
+            'id': exp['id'],
+            'description': exp['description'],
+            'amount': float(exp['amount']),
+            'date': exp['date'].isoformat() if exp['date'] else None,
+            'category': exp['category__name'] or 'Boshqa',
+            'category_icon': exp['category__icon'] or 'MoreHorizontal',
+            'category_color': exp['category__color'] or 'text-slate-400 bg-slate-500/20 border-slate-500/30',
+            'created_by': exp['created_by__username'] or 'Noma\'lum'
+        }
+        for exp in stats.recent(limit=10)
+    ]
+
+    return {
+        'building_name': building.name,
+        'building_status': building.status,
+        'building_description': building.description,
+        'start_date': building.start_date.isoformat() if building.start_date else None,
+        'budget': float(building.budget),
+        'spent_amount': float(building.spent_amount),
+        'remaining_budget': float(building.remaining_budget),
+        'total_expenses': float(totals['total']),
+        'expenses_count': totals['count'],
+        'average_expense': float(totals['avg']),
+        'max_expense': float(totals['max']),
+        'expenses_by_category': stats.by_category(),
+        'top_users': stats.by_user(limit=10) if include_users else [],
+        'daily_expenses': stats.daily(),
+        'monthly_expenses': monthly_data,
+        'recent_expenses': recent_expenses
+    }
+
+
+def building_comparison():
+    """`/api/statistics/buildings/` uchun ma'lumotlar"""
+    # Hisoblagichlar binoning o'zida saqlanadi - chiqimlar jadvaliga murojaat yo'q
+    buildings = Building.objects.order_by('-budget')
+
+    comparison_data = []
+    for building in buildings:
+        budget = float(building.budget)
+        spent = float(building.spent_amount)
+        remaining = budget - spent
+        usage_percent = (spent / budget * 100) if budget > 0 else 0
+
+        comparison_data.append({
+            'id': building.id,
+            'name': building.name,
+            'status': building.status,
+            'status_display': building.get_status_display(),
+            'budget': budget,
+            'spent_amount': spent,
+            'remaining_budget': remaining,
+            'usage_percent': round(usage_percent, 2),
+            'expenses_count': building.expenses_count,
+            'expenses_total': float(building.expenses_total)
+        })
+
+    return {
+        'buildings': comparison_data,
+        'total_count': len(comparison_data)
+    }
+
+
+def monthly_report(start_date, end_date):
+    """`/api/statistics/monthly/` uchun ma'lumotlar"""
+    stats = ExpenseStatistics(ExpenseFilter(date_from=start_date, date_to=end_date))
+    totals = stats.totals(extremes=False)
+    return {
+        'total_amount': float(totals['total']),
+        'count': totals['count'],
+        'by_category': stats.by_category(),
+        'by_building': stats.by_building(),
+        'daily': [
+            {'day': row['date'], 'total': row['total'], 'count': row['count']}
+            for row in stats.days()
+        ]
+    }
+
+
+def weekly_report(weeks):
+    """`/api/statistics/weekly/` uchun haftalik ma'lumotlar"""
+    today = timezone.now().date()
+    since = today - timedelta(weeks=weeks)
+    stats = ExpenseStatistics(ExpenseFilter(date_from=since), today=today)
+    buckets = {}
+    for row in stats.days():
+        week = week_start(row['date'])
+        bucket = buckets.setdefault(week, {'week': week, 'total': 0, 'count': 0})
+        bucket['total'] += row['total'] or 0
+        bucket['count'] += row['count']
+    return [buckets[week] for week in sorted(buckets)]
+
+
+def dashboard_statistics():
+    """`/api/statistics/dashboard/` uchun ma'lumotlar"""
+    building_stats = Building.objects.aggregate(
+        total_buildings=Count('id'),
+        total_budget=Sum('budget'),
+        total_spent=Sum('spent_amount')
+    )
+    total_expenses, _ = overall_totals()
+
+    # Binolar holati bo'yicha - bitta guruhlangan so'rov
+    status_counts = dict(
+        Building.objects.order_by().values('status')
+        .annotate(count=Count('id')).values_list('status', 'count')
+    )
+    buildings_by_status = {
+        label: status_counts.get(value, 0)
+        for value, label in Building.Status.choices
+    }
+
+    # Top 5 binolar (xarajat bo'yicha)
+    top_buildings = list(
+        Building.objects.annotate(
+            expenses_total=Sum('daily_rollups__total')
+        ).order_by('-expenses_total')[:5].values(
+            'id', 'name', 'status', 'budget', 'spent_amount', 'expenses_total'
+        )
+    )
+
+    # So'nggi 5 ta chiqim
+    recent_expenses = list(
+        Expense.objects.order_by('-created_at')[:5].values(
+            'id', 'description', 'amount', 'category__name', 'date', 'building__name'
+        )
+    )
+    # category__name ni category ga o'zgartirish (frontend uchun)
+    for expense in recent_expenses:
+        expense['category'] = expense.pop('category__name', 'Boshqa')
+
+    total_budget = building_stats['total_budget'] or 0
+    total_spent = building_stats['total_spent'] or 0
+    return {
+        # Umumiy ko'rsatkichlar
+        'total_buildings': building_stats['total_buildings'],
+        'total_expenses': float(total_expenses),
+        'total_budget': float(total_budget),
+        'total_spent': float(total_spent),
+        'remaining_budget': float(total_budget - total_spent),
+
+        # Holat bo'yicha
+        'buildings_by_status': buildings_by_status,
+
+        # Top binolar
+        'top_buildings_by_expenses': top_buildings,
+
+        # So'nggi faoliyat
+        'recent_expenses': recent_expenses
+    }
@@ -0,0 +1,77 @@
+"""
+Chek rasmlari uchun kontent bo'yicha (content-addressed) saqlash
+
+Fayl nomi uning SHA-256 xeshidan olinadi: `expenses/ab/abcdef...webp`.
+Bir xil fayl (masalan, qayta yuborilgan chek) ikkinchi marta diskka
+yozilmaydi - mavjud nom qaytariladi. Mavjudlik `receipts.hold` ichida
+tekshiriladi, shuning uchun `gc_receipts` shu paytda faylni o'chirib
+yubora olmaydi. Havolalar soni va eskirgan fayllarni o'chirish: receipts.py.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+
+
+def file_hash(content):
+    """Fayl obyekti SHA-256 xeshi (o'qishdan keyin boshiga qaytariladi)"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentHashStorage(FileSystemStorage):
+    """
+    Fayllarni kontent xeshi bo'yicha nomlovchi storage
+
+    `save('expenses/chek.jpg', content)` -> `expenses/ab/<sha256>.jpg`.
+    Shu nomli fayl allaqachon bo'lsa, baytlar qayta yozilmaydi. Saqlangan
+    fayl `ReceiptBlob` da ro'yxatga olinadi.
+    """
+
+    @staticmethod
+    def hashed_name(name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return '/'.join(part for part in (directory, digest[:2], f'{digest}{extension}') if part)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        # receipts -> models -> storage
+        from .receipts import hold
+
+        name = self.hashed_name(name, file_hash(content))
+        hold(name, lambda: self._save(name, content), storage=self)
+        return name
+
+    def _save(self, name, content):
+        # Vaqtinchalik faylga yozib, atomik almashtirish: parallel so'rov ayni shu
+        # faylni yozsa ham o'quvchi yarim yozilgan faylni ko'rmaydi (kontent bir xil)
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                for chunk in content.chunks():
+                    target.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp, self.file_permissions_mode)
+            os.replace(tmp, full_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return name
+
+
+def receipt_storage():
+    """`Expense.image` maydoni uchun storage (`STORAGES['receipts']`)"""
+    return storages['receipts']
@@ -1,3 +1,2087 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import zipfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image, ImageDraw
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import (
+    authentication, caching, export, images, importer, metrics, receipts, rollup, snapshots, sqlite, uploads, webp
+)
+from .models import (
+    Building, Expense, ExpenseCategory, ExpenseDailyRollup, ExpenseImport, ReceiptBlob, ReceiptSource,
+    RoleVersion, StatisticsSnapshot, UploadSession,
+)
+from .generations import bump_generation, get_generations
+from .stats import ExpenseFilter, ExpenseStatistics
+
+
+# Testlarda har bir test toza, jarayon ichidagi keshdan foydalanadi
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(
+    CACHES=TEST_CACHES, METRICS_ENABLED=False, IMAGE_ENCODE_BACKEND='sync', DASHBOARD_SNAPSHOT_BACKEND='sync'
+)
+class BaseAPITestCase(TestCase):
+    """Umumiy test ma'lumotlari: rollar, foydalanuvchilar, kategoriyalar va binolar"""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin_group = Group.objects.create(name='Admin')
+        accountant_group = Group.objects.create(name='Accountant')
+        cls.ceo = User.objects.create_user('ceoadmin', password='test12345')
+        cls.ceo.groups.add(admin_group)
+        cls.accountant = User.objects.create_user('buxgalter1', password='test12345')
+        cls.accountant.groups.add(accountant_group)
+        cls.today = timezone.now().date()
+
+    def setUp(self):
+        cache.clear()
+        authentication.user_cache.clear()
+        self.client = APIClient()
+
+    def create_categories(self, count):
+        return [
+            ExpenseCategory.objects.create(name=f'Kategoriya {i}', slug=f'cat-{i}', order=i)
+            for i in range(count)
+        ]
+
+    def create_buildings(self, count):
+        return [
+            Building.objects.create(name=f'Bino {i}', budget=Decimal('1000000'))
+            for i in range(count)
+        ]
+
+    def create_expenses(self, buildings, categories, per_building, user=None):
+        expenses = []
+        for b_index, building in enumerate(buildings):
+            for i in range(per_building):
+                expenses.append(Expense.objects.create(
+                    building=building,
+                    category=categories[(b_index + i) % len(categories)],
+                    description=f'Chiqim {i}',
+                    amount=Decimal(100 * (i + 1)),
+                    date=self.today - timedelta(days=i * 3),
+                    created_by=user or self.ceo
+                ))
+        return expenses
+
+
+class StatisticsTests(BaseAPITestCase):
+
+    def stats_query_count(self, url, user):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.json()
+
+    def test_breakdowns_match_raw_rows(self):
+        buildings = self.create_buildings(3)
+        categories = self.create_categories(4)
+        expenses = self.create_expenses(buildings, categories, per_building=20)
+
+        stats = ExpenseStatistics(ExpenseFilter())
+        totals = stats.totals()
+        self.assertEqual(totals['total'], sum(e.amount for e in expenses))
+        self.assertEqual(totals['count'], len(expenses))
+
+        by_category = stats.by_category()
+        self.assertEqual(
+            list(by_category), list(ExpenseCategory.objects.values_list('name', flat=True))
+        )
+        for category in categories:
+            expected = sum(e.amount for e in expenses if e.category_id == category.pk)
+            self.assertEqual(by_category[category.name], float(expected))
+
+        daily_since = self.today - timedelta(days=30)
+        self.assertEqual(
+            sum(row['count'] for row in stats.daily()),
+            len([e for e in expenses if e.date >= daily_since])
+        )
+        weekly_since = self.today - timedelta(weeks=8)
+        weekly = stats.weekly()
+        self.assertTrue(all(row['week'].weekday() == 0 for row in weekly))
+        self.assertEqual(
+            sum(row['total'] for row in weekly),
+            sum(e.amount for e in expenses if e.date >= weekly_since)
+        )
+        self.assertEqual(sum(row['count'] for row in stats.monthly()), len(expenses))
+
+    def test_filter_spec(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(2)
+        expenses = self.create_expenses(buildings, categories, per_building=5)
+
+        spec = ExpenseFilter(building=buildings[0].pk, category=categories[1].pk)
+        expected = [
+            e for e in expenses
+            if e.building_id == buildings[0].pk and e.category_id == categories[1].pk
+        ]
+        totals = ExpenseStatistics(spec).totals()
+        self.assertEqual(totals['count'], len(expected))
+        self.assertEqual(totals['total'], sum(e.amount for e in expected))
+
+    def test_query_count_independent_of_categories_and_buildings(self):
+        urls = [
+            '/api/expenses/statistics/',
+            f'/api/statistics/monthly/?year={self.today.year}&month={self.today.month}',
+            '/api/statistics/weekly/',
+        ]
+        categories = self.create_categories(2)
+        buildings = self.create_buildings(2)
+        self.create_expenses(buildings, categories, per_building=3)
+        before = [self.stats_query_count(url, self.ceo)[0] for url in urls]
+        building_before = self.stats_query_count(
+            f'/api/buildings/{buildings[0].pk}/statistics/', self.ceo
+        )[0]
+
+        categories += [
+            ExpenseCategory.objects.create(name=f'Yangi {i}', slug=f'new-{i}') for i in range(8)
+        ]
+        buildings += self.create_buildings(8)
+        self.create_expenses(buildings, categories, per_building=3)
+        after = [self.stats_query_count(url, self.ceo)[0] for url in urls]
+        building_after = self.stats_query_count(
+            f'/api/buildings/{buildings[0].pk}/statistics/', self.ceo
+        )[0]
+
+        self.assertEqual(before, after)
+        self.assertEqual(building_before, building_after)
+
+    def test_monthly_report(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(2)
+        expenses = self.create_expenses(buildings, categories, per_building=4)
+        _, data = self.stats_query_count(
+            f'/api/statistics/monthly/?year={self.today.year}&month={self.today.month}',
+            self.ceo
+        )
+        in_month = [
+            e for e in expenses
+            if e.date.year == self.today.year and e.date.month == self.today.month
+        ]
+        self.assertEqual(data['expenses']['count'], len(in_month))
+        self.assertEqual(data['expenses']['total_amount'], float(sum(e.amount for e in in_month)))
+        self.assertEqual(sum(row['count'] for row in data['expenses']['daily']), len(in_month))
+
+    def test_top_users_only_for_ceoadmin(self):
+        buildings = self.create_buildings(1)
+        categories = self.create_categories(1)
+        self.create_expenses(buildings, categories, per_building=2)
+        _, data = self.stats_query_count('/api/expenses/statistics/', self.ceo)
+        self.assertEqual(len(data['top_users']), 1)
+        _, data = self.stats_query_count('/api/expenses/statistics/', self.accountant)
+        self.assertEqual(data['top_users'], [])
+
+
+class ExpenseRollupTests(BaseAPITestCase):
+
+    def rollup_state(self):
+        return sorted(
+            ExpenseDailyRollup.objects.values_list(
+                'building_id', 'category_id', 'created_by_id', 'date', 'total', 'count'
+            )
+        )
+
+    def assertRollupMatchesExpenses(self):
+        state = self.rollup_state()
+        rollup.rebuild()
+        self.assertEqual(state, self.rollup_state())
+
+    def test_create_update_move_and_delete(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(2)
+        expenses = self.create_expenses(buildings, categories, per_building=4)
+        self.assertRollupMatchesExpenses()
+
+        expense = Expense.objects.get(pk=expenses[0].pk)
+        expense.amount = Decimal('12345.67')
+        expense.save()
+        self.assertRollupMatchesExpenses()
+
+        expense.building = buildings[1]
+        expense.category = categories[1]
+        expense.date = self.today - timedelta(days=100)
+        expense.save()
+        self.assertRollupMatchesExpenses()
+
+        expense.delete()
+        Expense.objects.get(pk=expenses[1].pk).delete()
+        self.assertRollupMatchesExpenses()
+        self.assertFalse(ExpenseDailyRollup.objects.filter(count__lte=0).exists())
+
+    def test_default_date_and_string_amount(self):
+        building = self.create_buildings(1)[0]
+        Expense.objects.create(building=building, description='Sement', amount='150.50')
+        row = ExpenseDailyRollup.objects.get()
+        self.assertEqual(row.date, self.today)
+        self.assertEqual(row.total, Decimal('150.50'))
+        self.assertRollupMatchesExpenses()
+
+    def test_deleted_users_share_one_row(self):
+        building = self.create_buildings(1)[0]
+        users = [User.objects.create(username=f'ishchi{i}') for i in range(2)]
+        first = Expense.objects.create(
+            building=building, description='Sement', amount=Decimal('10'), created_by=users[0]
+        )
+        Expense.objects.create(building=building, description='Qum', amount=Decimal('20'), created_by=users[1])
+        for user in users:
+            user.delete()
+        self.assertEqual(ExpenseDailyRollup.objects.count(), 1)
+
+        first.refresh_from_db()
+        first.amount = Decimal('15')
+        first.save()
+        building.refresh_from_db()
+        row = ExpenseDailyRollup.objects.get()
+        self.assertEqual((row.created_by_id, row.total, row.count), (None, Decimal('35'), 2))
+        self.assertEqual(building.spent_amount, row.total)
+        self.assertRollupMatchesExpenses()
+
+        # NULL kalit bo'yicha ham ikkinchi qator yaratib bo'lmaydi
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ExpenseDailyRollup.objects.create(building=building, date=row.date, total=1, count=1)
+
+    def test_rebuild_command(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(3)
+        self.create_expenses(buildings, categories, per_building=5)
+        expected = self.rollup_state()
+        ExpenseDailyRollup.objects.all().delete()
+        before = get_generations(('expenses', 'buildings'))
+        call_command('rebuild_expense_rollup', stdout=StringIO())
+        self.assertEqual(expected, self.rollup_state())
+        # Keshlangan statistika va ETag lar eskiradi
+        after = get_generations(('expenses', 'buildings'))
+        self.assertTrue(all(old != new for old, new in zip(before, after)))
+
+
+class BuildingSpentAmountTests(BaseAPITestCase):
+
+    def test_delta_on_create_update_move_and_delete(self):
+        first, second = self.create_buildings(2)
+        categories = self.create_categories(1)
+        expenses = self.create_expenses([first], categories, per_building=3)
+        first.refresh_from_db()
+        self.assertEqual(first.spent_amount, Decimal('600'))
+
+        expense = Expense.objects.get(pk=expenses[0].pk)
+        expense.amount = Decimal('150')
+        expense.save()
+        first.refresh_from_db()
+        self.assertEqual(first.spent_amount, Decimal('650'))
+
+        # Boshqa binoga ko'chirilganda eski bino ham tuzatiladi
+        expense.building = second
+        expense.save()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.spent_amount, Decimal('500'))
+        self.assertEqual(second.spent_amount, Decimal('150'))
+
+        expense.delete()
+        second.refresh_from_db()
+        self.assertEqual(second.spent_amount, Decimal('0'))
+
+    def test_only_spent_amount_is_written(self):
+        building = self.create_buildings(1)[0]
+        category = self.create_categories(1)[0]
+        # Bino parallel ravishda tahrirlanadi - chiqim signali uni qayta yozmasligi kerak
+        Building.objects.filter(pk=building.pk).update(name='Yangi nom')
+        Expense.objects.create(
+            building=building, category=category, description='Sement', amount=Decimal('10')
+        )
+        building.refresh_from_db()
+        self.assertEqual(building.name, 'Yangi nom')
+        self.assertEqual(building.spent_amount, Decimal('10'))
+
+
+@override_settings(CACHES=TEST_CACHES, METRICS_ENABLED=False, DASHBOARD_SNAPSHOT_BACKEND='sync')
+class ConcurrentSpentAmountTests(TransactionTestCase):
+    """Parallel yozuvchilar bilan sarflangan mablag' to'g'riligi"""
+
+    writers = 8
+    per_writer = 15
+
+    def write_expenses(self, building_id, category_id, offset, errors):
+        try:
+            for i in range(self.per_writer):
+                # SQLite bir vaqtda faqat bitta yozuvchiga ruxsat beradi - band bo'lsa qayta urinamiz
+                for attempt in range(200):
+                    try:
+                        with transaction.atomic():
+                            Expense.objects.create(
+                                building_id=building_id,
+                                category_id=category_id,
+                                description=f'Parallel {offset}-{i}',
+                                amount=Decimal(offset * 100 + i + 1)
+                            )
+                        break
+                    except OperationalError:
+                        time.sleep(0.005)
+                else:
+                    raise RuntimeError('Yozib bo\'lmadi')
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connections.close_all()
+
+    def test_parallel_inserts(self):
+        building = Building.objects.create(name='Parallel bino')
+        category = ExpenseCategory.objects.create(name='Parallel', slug='parallel')
+        errors = []
+        threads = [
+            threading.Thread(
+                target=self.write_expenses, args=(building.pk, category.pk, n, errors)
+            )
+            for n in range(self.writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        building.refresh_from_db()
+        expected = sum(
+            Decimal(n * 100 + i + 1)
+            for n in range(self.writers) for i in range(self.per_writer)
+        )
+        self.assertEqual(Expense.objects.count(), self.writers * self.per_writer)
+        self.assertEqual(building.spent_amount, expected)
+        self.assertEqual(
+            ExpenseDailyRollup.objects.aggregate(total=Sum('total'))['total'], expected
+        )
+
+
+class BuildingCountersTests(BaseAPITestCase):
+
+    def counters(self, building):
+        building.refresh_from_db()
+        return building.expenses_count, building.last_expense_date, building.category_totals
+
+    def test_counters_follow_expense_writes(self):
+        first, second = self.create_buildings(2)
+        cat_a, cat_b = self.create_categories(2)
+        old = Expense.objects.create(
+            building=first, category=cat_a, description='Eski', amount=Decimal('100'),
+            date=self.today - timedelta(days=10)
+        )
+        new = Expense.objects.create(
+            building=first, category=cat_b, description='Yangi', amount=Decimal('250.50'),
+            date=self.today
+        )
+        self.assertEqual(
+            self.counters(first),
+            (2, self.today, {str(cat_a.pk): '100.00', str(cat_b.pk): '250.50'})
+        )
+        self.assertEqual(first.expenses_total, Decimal('350.50'))
+
+        # Oxirgi chiqim boshqa binoga ko'chirilsa, sana qayta hisoblanadi
+        new.building = second
+        new.save()
+        self.assertEqual(
+            self.counters(first),
+            (1, self.today - timedelta(days=10), {str(cat_a.pk): '100.00'})
+        )
+        self.assertEqual(self.counters(second), (1, self.today, {str(cat_b.pk): '250.50'}))
+
+        old.delete()
+        self.assertEqual(self.counters(first), (0, None, {}))
+
+    def test_refresh_matches_incremental(self):
+        buildings = self.create_buildings(3)
+        categories = self.create_categories(2)
+        self.create_expenses(buildings, categories, per_building=4)
+        Expense.objects.filter(building=buildings[0]).first().delete()
+        expected = [self.counters(b) for b in buildings]
+        Building.objects.update(expenses_count=0, last_expense_date=None, category_totals={})
+        rollup.refresh_building_totals()
+        self.assertEqual(expected, [self.counters(b) for b in buildings])
+
+    def test_list_and_comparison_do_not_touch_expenses(self):
+        buildings = self.create_buildings(3)
+        categories = self.create_categories(2)
+        self.create_expenses(buildings, categories, per_building=2)
+        self.client.force_authenticate(self.ceo)
+        for url in ['/api/buildings/', '/api/statistics/buildings/']:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(
+                [q['sql'] for q in ctx.captured_queries if 'main_expense"' in q['sql']]
+            )
+        data = response.json()['buildings']
+        self.assertEqual(
+            {row['id']: row['expenses_count'] for row in data},
+            {b.pk: 2 for b in buildings}
+        )
+
+
+class StatsCacheTests(BaseAPITestCase):
+
+    def get(self, url, user=None):
+        self.client.force_authenticate(user or self.ceo)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Bitta binoni olish (404 va ruxsat tekshiruvi) keshdan tashqarida qoladi
+        stats_queries = [
+            q['sql'] for q in ctx.captured_queries
+            if ('main_expense' in q['sql'] or 'main_building' in q['sql'])
+            and 'LIMIT 21' not in q['sql']
+        ]
+        return stats_queries, response.json()
+
+    def test_repeated_request_served_from_cache(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(2)
+        self.create_expenses(buildings, categories, per_building=3)
+        for url in [
+            '/api/expenses/statistics/',
+            '/api/statistics/dashboard/',
+            '/api/statistics/buildings/',
+            f'/api/buildings/{buildings[0].pk}/statistics/',
+        ]:
+            queries, first = self.get(url)
+            self.assertTrue(queries)
+            queries, second = self.get(url)
+            self.assertEqual(queries, [])
+            self.assertEqual(first, second)
+
+    def test_key_depends_on_params_and_role(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(1)
+        self.create_expenses(buildings, categories, per_building=2)
+        _, ceo_data = self.get('/api/expenses/statistics/')
+        _, user_data = self.get('/api/expenses/statistics/', self.accountant)
+        self.assertEqual(len(ceo_data['top_users']), 1)
+        self.assertEqual(user_data['top_users'], [])
+
+        # Parametrlar tartibi va bo'sh qiymatlar kalitga ta'sir qilmaydi
+        self.get(f'/api/expenses/statistics/?building={buildings[0].pk}&category=')
+        queries, data = self.get(f'/api/expenses/statistics/?date_from=&building={buildings[0].pk}')
+        self.assertEqual(queries, [])
+        self.assertEqual(data['expenses_count'], 2)
+
+    def test_writes_invalidate_cached_statistics(self):
+        building, = self.create_buildings(1)
+        category, = self.create_categories(1)
+        self.create_expenses([building], [category], per_building=2)
+        _, data = self.get('/api/statistics/buildings/')
+        self.assertEqual(data['buildings'][0]['expenses_count'], 2)
+
+        expense = Expense.objects.create(
+            building=building, category=category, description='Yangi', amount=Decimal('5')
+        )
+        _, data = self.get('/api/statistics/buildings/')
+        self.assertEqual(data['buildings'][0]['expenses_count'], 3)
+
+        expense.delete()
+        _, data = self.get('/api/statistics/buildings/')
+        self.assertEqual(data['buildings'][0]['expenses_count'], 2)
+
+        building.name = 'Qayta nomlangan'
+        building.save()
+        _, data = self.get('/api/statistics/buildings/')
+        self.assertEqual(data['buildings'][0]['name'], 'Qayta nomlangan')
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'value': 42}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(caching.get_or_compute('stats:test', compute)))
+            for _ in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        started.wait(5)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 42}] * 6)
+
+    @skipUnless(hasattr(os, 'fork'), "fork kerak")
+    def test_concurrent_processes_compute_once_with_file_cache(self):
+        """FileBasedCache da `add` atomar emas - jarayonlar fayl qulfi bilan kelishadi"""
+        with tempfile.TemporaryDirectory() as directory:
+            calls = os.path.join(directory, 'calls')
+            file_cache = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(directory, 'cache'),
+            }}
+
+            def compute():
+                with open(calls, 'a') as handle:
+                    handle.write('1\n')
+                time.sleep(0.3)
+                return {'value': 42}
+
+            def worker(start, results):
+                start.wait(5)
+                results.put(caching.get_or_compute('stats:test', compute))
+
+            context = multiprocessing.get_context('fork')
+            start = context.Event()
+            results = context.Queue()
+            with override_settings(CACHES=file_cache):
+                processes = [context.Process(target=worker, args=(start, results)) for _ in range(6)]
+                for process in processes:
+                    process.start()
+                start.set()
+                values = [results.get(timeout=10) for _ in processes]
+                for process in processes:
+                    process.join(5)
+
+            with open(calls) as handle:
+                self.assertEqual(len(handle.readlines()), 1)
+            self.assertEqual(values, [{'value': 42}] * 6)
+
+
+class DashboardSnapshotTests(BaseAPITestCase):
+
+    def get_dashboard(self):
+        self.client.force_authenticate(self.ceo)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/statistics/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.json()
+
+    def test_fresh_snapshot_is_single_row_read(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(2)
+        self.create_expenses(buildings, categories, per_building=3)
+        _, first = self.get_dashboard()
+        self.assertEqual(StatisticsSnapshot.objects.count(), 1)
+
+        queries, second = self.get_dashboard()
+        self.assertEqual(queries, 1)
+        self.assertEqual(first, second)
+
+        # Jadval o'sganda ham o'qish bitta so'rov bo'lib qoladi
+        self.create_expenses(self.create_buildings(5), categories, per_building=10)
+        self.get_dashboard()
+        queries, _ = self.get_dashboard()
+        self.assertEqual(queries, 1)
+
+    def test_writes_refresh_snapshot(self):
+        building, = self.create_buildings(1)
+        category, = self.create_categories(1)
+        _, data = self.get_dashboard()
+        self.assertEqual(data['total_expenses'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(
+                building=building, category=category, description='Sement', amount=Decimal('150.25')
+            )
+        # Snapshot yozuvdan keyin yangilangan - o'qish faqat bitta qatorni oladi
+        queries, data = self.get_dashboard()
+        self.assertEqual(queries, 1)
+        self.assertEqual(data['total_expenses'], 150.25)
+        self.assertEqual(data['recent_expenses'][0]['description'], 'Sement')
+        self.assertEqual(data['top_buildings_by_expenses'][0]['expenses_total'], 150.25)
+
+        building.name = 'Yangi nom'
+        with self.captureOnCommitCallbacks(execute=True):
+            building.save()
+        _, data = self.get_dashboard()
+        self.assertEqual(data['top_buildings_by_expenses'][0]['name'], 'Yangi nom')
+
+    def test_payload_matches_live_statistics(self):
+        buildings = self.create_buildings(3)
+        categories = self.create_categories(2)
+        self.create_expenses(buildings, categories, per_building=4)
+        _, data = self.get_dashboard()
+        self.assertEqual(data, snapshots._to_json(snapshots.stats.dashboard_statistics()))
+
+    @override_settings(DASHBOARD_SNAPSHOT_BACKEND='thread', DASHBOARD_SNAPSHOT_DELAY=60)
+    def test_stale_snapshot_read_does_not_recompute(self):
+        building, = self.create_buildings(1)
+        category, = self.create_categories(1)
+        self.get_dashboard()
+        with mock.patch.object(snapshots, '_schedule_background') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                Expense.objects.create(
+                    building=building, category=category, description='Sement', amount=Decimal('10')
+                )
+            self.assertEqual(schedule.call_count, 1)
+
+            # Fon yangilanishi hali bajarilmagan - eski snapshot qaytariladi
+            queries, data = self.get_dashboard()
+            self.assertEqual(queries, 1)
+            self.assertEqual(data['total_expenses'], 0)
+            self.assertEqual(schedule.call_count, 2)
+
+        snapshots.refresh_dashboard_shared()
+        _, data = self.get_dashboard()
+        self.assertEqual(data['total_expenses'], 10)
+
+    @override_settings(DASHBOARD_SNAPSHOT_BACKEND='thread', DASHBOARD_SNAPSHOT_DELAY=60)
+    def test_stale_snapshot_keeps_its_own_etag(self):
+        building, = self.create_buildings(1)
+        category, = self.create_categories(1)
+        self.client.force_authenticate(self.ceo)
+        first = self.client.get('/api/statistics/dashboard/')
+        with mock.patch.object(snapshots, '_schedule_background'):
+            Expense.objects.create(
+                building=building, category=category, description='Sement', amount=Decimal('50')
+            )
+            # Eski tana eski validator bilan - mijozdagi nusxa bilan bir xil
+            stale = self.client.get('/api/statistics/dashboard/', headers={'If-None-Match': first['ETag']})
+            self.assertEqual(stale.status_code, 304)
+
+        snapshots.refresh_dashboard_shared()
+        fresh = self.client.get('/api/statistics/dashboard/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.json()['total_expenses'], 50)
+        self.assertNotEqual(fresh['ETag'], first['ETag'])
+        response = self.client.get('/api/statistics/dashboard/', headers={'If-None-Match': fresh['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(DASHBOARD_SNAPSHOT_BACKEND='thread', DASHBOARD_SNAPSHOT_DELAY=60)
+    def test_background_refresh_is_debounced(self):
+        self.addCleanup(setattr, snapshots, '_timer', None)
+        with mock.patch('threading.Timer') as timer:
+            for _ in range(3):
+                snapshots._refresh_after_write()
+        self.assertEqual(timer.call_count, 1)
+        self.assertEqual(timer.return_value.start.call_count, 1)
+
+
+class ConditionalGetTests(BaseAPITestCase):
+
+    def get(self, url, user=None, **headers):
+        self.client.force_authenticate(user or self.ceo)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, headers=headers)
+        return response, len(ctx)
+
+    def test_unchanged_list_returns_304(self):
+        buildings = self.create_buildings(2)
+        self.create_categories(2)
+        for url in [
+            '/api/buildings/',
+            '/api/expense-categories/',
+            '/api/users/',
+            '/api/expenses/',
+            '/api/expenses/statistics/',
+            '/api/statistics/dashboard/',
+            '/api/statistics/buildings/',
+            '/api/statistics/weekly/',
+            f'/api/statistics/monthly/?year={self.today.year}&month={self.today.month}',
+            f'/api/buildings/{buildings[0].pk}/statistics/',
+        ]:
+            response, _ = self.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn('Last-Modified', response)
+            self.assertIn('no-cache', response['Cache-Control'])
+
+            response, queries = self.get(url, If_None_Match=response['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b'')
+            # Ro'yxat uchun bitta aggregate so'rov (bino statistikasida binoni olish ham)
+            self.assertLessEqual(queries, 2, url)
+
+    def test_writes_change_etag(self):
+        building, = self.create_buildings(1)
+        category, = self.create_categories(1)
+        first, _ = self.get('/api/buildings/')
+
+        # Chiqim binoning updated_at maydonini o'zgartirmaydi, lekin expenses_count o'zgaradi
+        Expense.objects.create(
+            building=building, category=category, description='Sement', amount=Decimal('10'),
+            created_by=self.accountant
+        )
+        response, _ = self.get('/api/buildings/', If_None_Match=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['expenses_count'], 1)
+
+        # Ro'yxatdagi `created_by_name` foydalanuvchi nomi o'zgarganda yangilanadi
+        first, _ = self.get('/api/expenses/', self.accountant)
+        self.accountant.username = 'kassir'
+        self.accountant.save()
+        response, _ = self.get('/api/expenses/', self.accountant, If_None_Match=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['created_by_name'], 'kassir')
+
+        first, _ = self.get('/api/users/')
+        self.accountant.groups.clear()
+        response, _ = self.get('/api/users/', If_None_Match=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        self.create_buildings(1)
+        first, _ = self.get('/api/buildings/')
+        response, _ = self.get('/api/buildings/', If_Modified_Since=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_params_and_user(self):
+        self.create_buildings(2)
+        first, _ = self.get('/api/buildings/')
+        response, _ = self.get('/api/buildings/?status=active', If_None_Match=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        response, _ = self.get('/api/buildings/', self.accountant, If_None_Match=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+class ExpensePaginationTests(BaseAPITestCase):
+
+    def walk(self, url):
+        """Kursorli havolalar bo'yicha barcha sahifalarni aylanib chiqish"""
+        self.client.force_authenticate(self.ceo)
+        ids, pages = [], []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertNotIn('count', data)
+            pages.append(data)
+            ids += [row['id'] for row in data['results']]
+            page_sql = [q['sql'] for q in ctx.captured_queries if 'FROM "main_expense"' in q['sql']]
+            self.assertFalse([sql for sql in page_sql if 'COUNT(' in sql or 'OFFSET' in sql])
+            url = data['next']
+        return ids, pages
+
+    def test_cursor_walk_matches_ordering(self):
+        buildings = self.create_buildings(3)
+        categories = self.create_categories(2)
+        self.create_expenses(buildings, categories, per_building=20)
+        # Bir xil sana va vaqtli chiqimlar ham tushib qolmasligi kerak
+        Expense.objects.filter(building=buildings[0]).update(
+            date=self.today, created_at=timezone.now()
+        )
+        expected = list(
+            Expense.objects.order_by('-date', '-created_at', 'id').values_list('id', flat=True)
+        )
+
+        ids, pages = self.walk('/api/expenses/?pagination=cursor')
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+        # Orqaga yurish oldingi sahifani aynan qaytaradi
+        self.client.force_authenticate(self.ceo)
+        previous = self.client.get(pages[2]['previous']).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+
+    def test_cursor_respects_filters_and_page_number_default(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(1)
+        self.create_expenses(buildings, categories, per_building=25)
+        ids, _ = self.walk(f'/api/expenses/?pagination=cursor&building={buildings[1].pk}')
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(
+            set(ids), set(Expense.objects.filter(building=buildings[1]).values_list('id', flat=True))
+        )
+
+        self.client.force_authenticate(self.ceo)
+        data = self.client.get('/api/expenses/?page=2').json()
+        self.assertEqual(data['count'], 50)
+        self.assertEqual(len(data['results']), 20)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.ceo)
+        response = self.client.get('/api/expenses/?cursor=bad')
+        self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN faqat SQLite da")
+class QueryPlanTests(BaseAPITestCase):
+    """
+    Endpointlar so'rovlarining EXPLAIN QUERY PLAN natijasini tekshirish
+
+    Chiqimlar va kunlik yig'indi jadvallari o'sib boradi - ular bo'yicha
+    indekssiz to'liq skanerlash (`SCAN main_expense`) bo'lmasligi kerak.
+    Binolar va kategoriyalar kabi kichik jadvallarni skanerlashga ruxsat beriladi.
+    """
+    large_tables = ('main_expense', 'main_expensedailyrollup')
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.buildings = [
+            Building.objects.create(name=f'Bino {i}', budget=Decimal('1000000')) for i in range(3)
+        ]
+        cls.categories = [
+            ExpenseCategory.objects.create(name=f'Kategoriya {i}', slug=f'cat-{i}', order=i)
+            for i in range(3)
+        ]
+        for i in range(60):
+            Expense.objects.create(
+                building=cls.buildings[i % 3],
+                category=cls.categories[i % 3],
+                description=f'Chiqim {i}',
+                amount=Decimal(100 + i),
+                date=cls.today - timedelta(days=i),
+                created_by=cls.ceo if i % 2 else cls.accountant
+            )
+
+    def plans(self, url, user):
+        """Katta jadvallarga tegishli EXPLAIN QUERY PLAN qatorlari"""
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        rows = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or not any(t in sql for t in self.large_tables):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                for row in cursor.fetchall():
+                    match = re.match(r'(SCAN|SEARCH) (\w+)', row[-1])
+                    if match and match.group(2) in self.large_tables:
+                        rows.append(row[-1])
+        return rows
+
+    def test_endpoints_use_indexes(self):
+        building = self.buildings[0].pk
+        category = self.categories[1].pk
+        date_from = (self.today - timedelta(days=20)).isoformat()
+        date_to = self.today.isoformat()
+        # Filtrlangan so'rovlar: kutilgan indeks bo'yicha qidiruv (SEARCH) bo'lishi va
+        # chiqimlar jadvalini (indeks bo'yicha ham) to'liq aylanib chiqmasligi kerak
+        seeks = {
+            f'/api/expenses/?building={building}': {'expense_building_date_idx'},
+            f'/api/expenses/?category={category}': {'expense_category_date_idx'},
+            f'/api/expenses/?date_from={date_from}&date_to={date_to}': {
+                'expense_keyset_idx', 'expense_owner_date_idx'
+            },
+            f'/api/expenses/?created_by={self.accountant.pk}': {'expense_owner_date_idx'},
+            f'/api/expenses/statistics/?building={building}&date_from={date_from}': {'expense_building_date_idx'},
+            f'/api/expenses/statistics/?category={category}': {'expense_category_date_idx'},
+            f'/api/buildings/{building}/statistics/': {'expense_building_date_idx'},
+            '/api/statistics/weekly/': {'expense_rollup_date_idx'},
+            f'/api/statistics/monthly/?year={self.today.year}&month={self.today.month}': {
+                'expense_rollup_date_idx'
+            },
+        }
+        # Filtrsiz ro'yxat va statistikada tartiblangan indeks bo'ylab o'qishga
+        # (`SCAN ... USING INDEX` + LIMIT) ruxsat bor, indekssiz skanerlashga - yo'q
+        urls = [
+            '/api/expenses/',
+            '/api/expenses/?pagination=cursor',
+            '/api/expenses/statistics/',
+            '/api/statistics/dashboard/',
+            '/api/statistics/buildings/',
+            *seeks,
+        ]
+        for user in (self.ceo, self.accountant):
+            for url in urls:
+                cache.clear()
+                StatisticsSnapshot.objects.all().delete()
+                with self.subTest(url=url, user=user.username):
+                    plans = self.plans(url, user)
+                    self.assertEqual([plan for plan in plans if re.match(r'SCAN \w+$', plan)], [])
+                    if url not in seeks:
+                        continue
+                    self.assertEqual([plan for plan in plans if plan.startswith('SCAN main_expense ')], [])
+                    searches = {
+                        match.group(1) for match in (
+                            re.match(r'SEARCH \w+ USING (?:COVERING )?INDEX (\w+)', plan) for plan in plans
+                        ) if match
+                    }
+                    self.assertTrue(searches & seeks[url], plans)
+
+
+class ServerTimingTests(BaseAPITestCase):
+
+    def metrics(self, response):
+        result = {}
+        for part in response['Server-Timing'].split(', '):
+            name, *params = part.split(';')
+            result[name] = dict(param.split('=', 1) for param in params)
+        return result
+
+    def test_header_reports_queries_and_phases(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(1)
+        self.create_expenses(buildings, categories, per_building=3)
+        self.client.force_authenticate(self.ceo)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/expenses/')
+        self.assertEqual(response.status_code, 200)
+
+        metrics = self.metrics(response)
+        self.assertEqual(metrics['db']['desc'], f'"{len(ctx)} queries"')
+        for name in ('db', 'serialize', 'view', 'render', 'total'):
+            self.assertGreaterEqual(float(metrics[name]['dur']), 0, name)
+        self.assertLessEqual(float(metrics['view']['dur']), float(metrics['total']['dur']))
+
+    def test_all_model_serializers_are_timed(self):
+        from rest_framework.serializers import ModelSerializer
+        from . import serializers
+        model_serializers = [
+            value for value in vars(serializers).values()
+            if isinstance(value, type) and issubclass(value, ModelSerializer)
+        ]
+        self.assertGreater(len(model_serializers), 1)
+        for serializer in model_serializers:
+            self.assertTrue(issubclass(serializer, serializers.ModelSerializer), serializer.__name__)
+
+    @override_settings(SERVER_TIMING_LOG=True)
+    def test_structured_log_line(self):
+        self.client.force_authenticate(self.ceo)
+        with self.assertLogs('main.timing', level='INFO') as logs:
+            self.client.get('/api/expense-categories/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], '/api/expense-categories/')
+        self.assertEqual(record['status'], 200)
+        self.assertIn('db_ms', record)
+        self.assertIn('total_ms', record)
+
+    @override_settings(SERVER_TIMING_ENABLED=False)
+    def test_can_be_disabled(self):
+        self.client.force_authenticate(self.ceo)
+        response = self.client.get('/api/expense-categories/')
+        self.assertNotIn('Server-Timing', response)
+
+
+class MetricsTests(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.metrics_dir.cleanup)
+        override = override_settings(
+            METRICS_ENABLED=True, METRICS_DIR=self.metrics_dir.name, METRICS_TOKEN='secret'
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        metrics.registry.reset()
+
+    def scrape(self, **headers):
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/metrics/', headers=headers)
+        return response
+
+    def sample(self, text, line_prefix):
+        for line in text.splitlines():
+            if line.startswith(line_prefix + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return None
+
+    def test_requests_recorded_per_view(self):
+        self.client.force_authenticate(self.ceo)
+        for _ in range(3):
+            self.client.get('/api/expenses/')
+        self.client.get('/api/statistics/dashboard/')
+        self.client.get('/api/expenses/statistics/')
+        self.client.get('/api/expenses/statistics/')
+
+        text = self.scrape(X_Metrics_Token='secret').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertEqual(self.sample(
+            text, 'http_request_duration_seconds_count{method="GET",view="ExpenseViewSet.list"}'
+        ), 3)
+        self.assertEqual(self.sample(
+            text, 'http_request_duration_seconds_bucket{method="GET",view="ExpenseViewSet.list",le="+Inf"}'
+        ), 3)
+        self.assertEqual(self.sample(
+            text, 'http_request_db_queries_count{view="DashboardStatisticsView"}'
+        ), 1)
+        self.assertEqual(self.sample(text, 'stats_cache_requests_total{result="hit"}'), 1)
+
+    def test_auth_user_cache_recorded(self):
+        response = self.client.post('/api/token/', {'username': 'buxgalter1', 'password': 'test12345'}, format='json')
+        auth = {'HTTP_AUTHORIZATION': f"Bearer {response.json()['access']}"}
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/expense-categories/', **auth).status_code, 200)
+
+        text = self.scrape(X_Metrics_Token='secret').content.decode()
+        self.assertIn('# TYPE auth_user_cache_total counter', text)
+        self.assertEqual(self.sample(text, 'auth_user_cache_total{result="miss"}'), 1)
+        self.assertEqual(self.sample(text, 'auth_user_cache_total{result="hit"}'), 1)
+
+    def test_merges_worker_files(self):
+        # Boshqa worker jarayoni yozib qo'ygan fayl
+        key = json.dumps(['stats_cache_requests_total', [['result', 'miss']]])
+        with open(f'{self.metrics_dir.name}/99999.json', 'w') as f:
+            json.dump({key: 5}, f)
+        metrics.inc('stats_cache_requests_total', result='miss')
+        text = metrics.render()
+        self.assertEqual(self.sample(text, 'stats_cache_requests_total{result="miss"}'), 6)
+
+    def test_dead_worker_files_folded_into_totals(self):
+        directory = self.metrics_dir.name
+        key = json.dumps(['stats_cache_requests_total', [['result', 'miss']]])
+        # To'xtagan worker (pid endi mavjud emas)
+        finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+        finished.wait()
+        with open(f'{directory}/{finished.pid}-1.json', 'w') as f:
+            json.dump({key: 5}, f)
+        # Xuddi shu pid bilan qayta ishga tushgan (boshqa vaqtda) jarayon fayli ustidan yozilmaydi
+        with open(f'{directory}/{os.getpid()}-1.json', 'w') as f:
+            json.dump({key: 2}, f)
+        metrics.inc('stats_cache_requests_total', result='miss')
+
+        for _ in range(2):
+            self.assertEqual(self.sample(metrics.render(), 'stats_cache_requests_total{result="miss"}'), 8)
+        self.assertFalse(os.path.exists(f'{directory}/{finished.pid}-1.json'))
+        with open(f'{directory}/{metrics.TOTALS}') as f:
+            self.assertEqual(json.load(f), {'folded': [], 'values': {key: 5}})
+
+    def test_access(self):
+        self.assertEqual(self.scrape().status_code, 401)
+        self.assertEqual(self.scrape(X_Metrics_Token='wrong').status_code, 401)
+        self.assertEqual(self.scrape(X_Metrics_Token='secret').status_code, 200)
+        self.client.force_authenticate(self.accountant)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.client.force_authenticate(self.ceo)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+class BulkExpenseTests(BaseAPITestCase):
+
+    def post(self, payload, user=None):
+        self.client.force_authenticate(user or self.accountant)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/expenses/bulk/', payload, format='json')
+        return response, ctx
+
+    def test_valid_rows_saved_and_errors_reported(self):
+        first, second = self.create_buildings(2)
+        category, = self.create_categories(1)
+        payload = [
+            {'building': first.pk, 'category': category.pk, 'description': 'Sement', 'amount': '100.50'},
+            {'building': 99999, 'description': "Yo'q bino", 'amount': '10'},
+            {'building': second.pk, 'description': 'Ish haqi', 'amount': '200', 'date': '2024-01-15'},
+            {'building': first.pk, 'category': 99999, 'description': "Yo'q kategoriya", 'amount': '10'},
+            {'building': first.pk, 'description': '', 'amount': 'abc'},
+            {'building': first.pk, 'category': category.pk, 'description': 'Qum', 'amount': '50'},
+        ]
+        response, _ = self.post(payload)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual([row['description'] for row in data['created']], ['Sement', 'Ish haqi', 'Qum'])
+        self.assertEqual([error['index'] for error in data['errors']], [1, 3, 4])
+        self.assertIn('building', data['errors'][0]['errors'])
+        self.assertIn('category', data['errors'][1]['errors'])
+        self.assertEqual(set(data['errors'][2]['errors']), {'description', 'amount'})
+
+        self.assertEqual(Expense.objects.count(), 3)
+        self.assertTrue(all(e.created_by == self.accountant for e in Expense.objects.all()))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.spent_amount, Decimal('150.50'))
+        self.assertEqual(first.expenses_count, 2)
+        self.assertEqual(first.category_totals, {str(category.pk): '150.50'})
+        self.assertEqual(second.last_expense_date, timezone.datetime(2024, 1, 15).date())
+        self.assertEqual(
+            ExpenseDailyRollup.objects.aggregate(total=Sum('total'))['total'], Decimal('350.50')
+        )
+
+    def test_query_count_does_not_grow_with_rows(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(2)
+
+        def payload(count):
+            return [
+                {
+                    'building': buildings[i % 2].pk,
+                    'category': categories[i % 2].pk,
+                    'description': f'Chiqim {i}',
+                    'amount': str(i + 1),
+                }
+                for i in range(count)
+            ]
+
+        # Birinchi so'rov yig'indi qatorlarini yaratadi, keyingilari faqat yangilaydi
+        self.post(payload(2))
+        _, small = self.post(payload(4))
+        _, large = self.post(payload(40))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Expense.objects.count(), 46)
+
+    def test_invalid_payloads(self):
+        building, = self.create_buildings(1)
+        response, _ = self.post({'building': building.pk})
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.post([{'building': 99999, 'description': 'x', 'amount': '1'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Expense.objects.count(), 0)
+
+
+class ExpenseExportTests(BaseAPITestCase):
+
+    def download(self, url, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_uses_list_filters_and_scope(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(1)
+        self.create_expenses(buildings, categories, per_building=3, user=self.accountant)
+        self.create_expenses(buildings[:1], categories, per_building=2)
+
+        response, content = self.download('/api/expenses/export/', self.ceo)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows[0][0], 'ID')
+        expected = list(
+            Expense.objects.order_by('-date', '-created_at', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual([int(row[0]) for row in rows[1:]], expected)
+
+        # Buxgalter faqat o'z chiqimlarini, filtr bilan
+        _, content = self.download(f'/api/expenses/export/?building={buildings[1].pk}', self.accountant)
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))[1:]
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(row[6] == self.accountant.username for row in rows))
+
+    def test_xlsx_streams_valid_workbook(self):
+        buildings = self.create_buildings(1)
+        categories = self.create_categories(1)
+        self.create_expenses(buildings, categories, per_building=5)
+        Expense.objects.filter(pk=Expense.objects.first().pk).update(description='A & <B>\x01')
+
+        response, content = self.download('/api/expenses/export/?file_format=xlsx', self.ceo)
+        self.assertTrue(response['Content-Type'].startswith('application/vnd.openxmlformats'))
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 6)
+        self.assertIn('A &amp; &lt;B&gt;', sheet)
+        self.assertNotIn('\x01', sheet)
+
+    def test_rows_read_in_chunks(self):
+        buildings = self.create_buildings(1)
+        categories = self.create_categories(1)
+        self.create_expenses(buildings, categories, per_building=5)
+        rows = export.export_rows(Expense.objects.all())
+        # Generator - qatorlar so'ralganda o'qiladi
+        with CaptureQueriesContext(connection) as ctx:
+            first = next(rows)
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(len(first), len(export.COLUMNS))
+
+    def test_unknown_format(self):
+        self.client.force_authenticate(self.ceo)
+        response = self.client.get('/api/expenses/export/?file_format=pdf')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExpenseImportTests(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        self.import_root = os.path.join(media.name, 'imports')
+        override = override_settings(MEDIA_ROOT=os.path.join(media.name, 'media'), IMPORT_ROOT=self.import_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write_csv(self, rows, header=('Sana', 'Bino', 'Kategoriya', 'Tavsif', 'Summa', 'Kim tomonidan')):
+        handle = tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', dir=self.media_root, delete=False, encoding='utf-8-sig', newline=''
+        )
+        with handle:
+            writer = csv.writer(handle)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return handle.name
+
+    def assert_counters_match_refresh(self, building):
+        building.refresh_from_db()
+        counters = (building.spent_amount, building.expenses_count, building.category_totals)
+        rollup.refresh_building_totals([building.pk])
+        building.refresh_from_db()
+        self.assertEqual(counters, (building.spent_amount, building.expenses_count, building.category_totals))
+
+    def test_endpoint_imports_rows_and_reports_errors(self):
+        first, second = self.create_buildings(2)
+        category, = self.create_categories(1)
+        path = self.write_csv([
+            ['2024-01-15', 'bino 0', category.name, 'Sement', '100.50', 'ceoadmin'],
+            ['15.01.2024', 'Yo\'q bino', '', 'Xato', '10', ''],
+            ['', str(second.pk), category.slug, 'Ish haqi', '2 000', ''],
+            ['2024-01-16', first.name, 'Noma\'lum', 'Xato', '10', ''],
+            [],
+            ['bugun', first.name, '', '', '-5', ''],
+        ])
+        self.client.force_authenticate(self.accountant)
+        with open(path, 'rb') as upload:
+            response = self.client.post('/api/expenses/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual((data['rows_processed'], data['rows_created'], data['error_count']), (6, 2, 3))
+        self.assertEqual([error['row'] for error in data['errors']], [2, 4, 6])
+        self.assertEqual(data['report']['rows'], 6)
+        # Yuklangan CSV MEDIA_ROOT ga emas, yopiq IMPORT_ROOT ga yoziladi
+        source = ExpenseImport.objects.get(pk=data['id']).source
+        self.assertEqual(os.path.dirname(source), self.import_root)
+        self.assertFalse(os.path.exists(settings.MEDIA_ROOT))
+
+        # Oddiy foydalanuvchi uchun `Kim tomonidan` ustuni hisobga olinmaydi
+        self.assertEqual(set(Expense.objects.values_list('created_by', flat=True)), {self.accountant.pk})
+        self.assertEqual(
+            sorted(Expense.objects.values_list('amount', flat=True)), [Decimal('100.50'), Decimal('2000.00')]
+        )
+        for building in (first, second):
+            self.assert_counters_match_refresh(building)
+        self.assertEqual(
+            ExpenseDailyRollup.objects.aggregate(total=Sum('total'))['total'], Decimal('2100.50')
+        )
+
+    def test_resume_after_failure_does_not_duplicate(self):
+        building, = self.create_buildings(1)
+        rows = [['2024-01-01', building.name, '', f'Chiqim {i}', '10', ''] for i in range(7)]
+        path = self.write_csv(rows)
+        job = ExpenseImport.objects.create(source=path, created_by=self.ceo)
+
+        def broken_stream():
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                for number, line in enumerate(stream):
+                    if number == 6:
+                        raise OSError('disk xatosi')
+                    yield line
+
+        with self.assertRaises(OSError):
+            importer.ExpenseImporter(job, batch_size=2).run(broken_stream())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExpenseImport.Status.FAILED)
+        # Faqat to'liq saqlangan paketlar hisobga olinadi
+        self.assertEqual((job.rows_processed, job.rows_created), (4, 4))
+        self.assertEqual(Expense.objects.count(), 4)
+        self.assert_counters_match_refresh(building)
+
+        report = importer.run_import(job, batch_size=2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExpenseImport.Status.DONE)
+        self.assertEqual(report['created'], 3)
+        self.assertEqual(job.rows_created, 7)
+        self.assertEqual(
+            sorted(Expense.objects.values_list('description', flat=True)), [f'Chiqim {i}' for i in range(7)]
+        )
+        building.refresh_from_db()
+        self.assertEqual((building.spent_amount, building.expenses_count), (Decimal('70.00'), 7))
+
+    def test_running_import_is_not_resumed_twice(self):
+        building, = self.create_buildings(1)
+        rows = [['2024-01-01', building.name, '', f'Chiqim {i}', '10', ''] for i in range(3)]
+        job = ExpenseImport.objects.create(source=self.write_csv(rows), created_by=self.accountant)
+        # Birinchi so'rov importni oldi, ikkinchisi (bir vaqtda kelgan) ololmaydi
+        self.assertTrue(importer.claim(job))
+        self.assertFalse(importer.claim(ExpenseImport.objects.get(pk=job.pk)))
+
+        self.client.force_authenticate(self.accountant)
+        response = self.client.post('/api/expenses/import/', {'import_id': job.pk}, format='multipart')
+        self.assertEqual(response.status_code, 409)
+        with self.assertRaisesMessage(CommandError, '--force'):
+            call_command('import_expenses', '--resume', str(job.pk), stdout=StringIO())
+        self.assertFalse(Expense.objects.exists())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed), (ExpenseImport.Status.RUNNING, 0))
+
+        # Jarayoni o'ldirilgan importni operator --force bilan davom ettiradi
+        call_command('import_expenses', '--resume', str(job.pk), '--force', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_created), (ExpenseImport.Status.DONE, 3))
+
+    def test_hard_stop_keeps_building_counters(self):
+        building, = self.create_buildings(1)
+        rows = [['2024-01-01', building.name, '', f'Chiqim {i}', '10', ''] for i in range(7)]
+        job = ExpenseImport.objects.create(source=self.write_csv(rows), created_by=self.ceo)
+
+        def killed_stream():
+            # Jarayon to'xtatildi (SIGTERM/SIGKILL) - `except Exception` ham ishlamaydi
+            with open(job.source, encoding='utf-8-sig', newline='') as stream:
+                for number, line in enumerate(stream):
+                    if number == 6:
+                        raise SystemExit(1)
+                    yield line
+
+        with mock.patch.object(importer, 'bump_generation') as bump, self.assertRaises(SystemExit):
+            importer.ExpenseImporter(job, batch_size=2).run(killed_stream())
+        self.assertEqual(bump.call_count, 2)
+        building.refresh_from_db()
+        self.assertEqual((building.spent_amount, building.expenses_count), (Decimal('40.00'), 4))
+        self.assert_counters_match_refresh(building)
+
+    def test_command_imports_exported_file(self):
+        buildings = self.create_buildings(2)
+        categories = self.create_categories(2)
+        self.create_expenses(buildings, categories, per_building=3, user=self.accountant)
+        path = self.write_csv([])
+        with open(path, 'w', encoding='utf-8', newline='') as handle:
+            handle.writelines(export.stream_csv(export.export_rows(Expense.objects.all())))
+        Expense.objects.all().delete()
+
+        out = StringIO()
+        call_command('import_expenses', path, '--user', 'ceoadmin', '--batch-size', '4', stdout=out)
+        self.assertIn("6 ta chiqim qo'shildi", out.getvalue())
+        self.assertIn('qator/soniya', out.getvalue())
+        job = ExpenseImport.objects.get()
+        self.assertEqual((job.status, job.rows_created, job.error_count), (ExpenseImport.Status.DONE, 6, 0))
+        # Eksportdagi `Kim tomonidan` ustuni saqlanadi
+        self.assertEqual(set(Expense.objects.values_list('created_by', flat=True)), {self.accountant.pk})
+        for building in buildings:
+            self.assert_counters_match_refresh(building)
+
+
+class ExpenseImageTests(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.building, = self.create_buildings(1)
+
+    def png_base64(self, size=(64, 48)):
+        output = io.BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(output, format='PNG')
+        return 'data:image/png;base64,' + base64.b64encode(output.getvalue()).decode()
+
+    def create_expense(self, image):
+        self.client.force_authenticate(self.ceo)
+        return self.client.post('/api/expenses/', {
+            'building': self.building.pk, 'description': 'Chek', 'amount': '100', 'image': image
+        }, format='json')
+
+    def test_encoded_after_commit_not_in_request(self):
+        with mock.patch.object(webp, 'encode', wraps=webp.encode) as encode:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.create_expense(self.png_base64())
+            self.assertEqual(response.status_code, 201)
+            # So'rov ichida faqat asl fayl saqlanadi
+            encode.assert_not_called()
+            expense = Expense.objects.get()
+            self.assertEqual(expense.image_status, Expense.ImageStatus.PENDING)
+            self.assertTrue(expense.image.name.endswith('.png'))
+            original = expense.image.name
+
+            for callback in callbacks:
+                callback()
+            encode.assert_called_once()
+
+        expense.refresh_from_db()
+        self.assertEqual(expense.image_status, Expense.ImageStatus.READY)
+        self.assertTrue(expense.image.name.endswith('.webp'))
+        # Asl fayl havolasiz qoldi va `gc_receipts` da o'chiriladi
+        self.assertEqual(ReceiptBlob.objects.get(name=original).refcount, 0)
+        self.assertEqual(receipts.collect_garbage(grace=0), 1)
+        self.assertFalse(expense.image.storage.exists(original))
+        with Image.open(expense.image.path) as image:
+            self.assertEqual((image.format, image.size, image.mode), ('WEBP', (64, 48), 'RGBA'))
+
+        response = self.client.get(f'/api/expenses/?building={self.building.pk}')
+        self.assertEqual(response.json()['results'][0]['image_status'], 'ready')
+
+    def test_variants_generated_and_listed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_expense(self.png_base64(size=(800, 600)))
+        expense = Expense.objects.get()
+        self.assertEqual(set(expense.image_variants), {'128', '512'})
+        for size, dimensions in (('128', (128, 96)), ('512', (512, 384))):
+            with expense.image.storage.open(expense.image_variants[size]) as handle, Image.open(handle) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', dimensions))
+
+        for url in ('/api/expenses/', f'/api/expenses/{expense.pk}/'):
+            data = self.client.get(url).json()
+            data = data['results'][0] if 'results' in data else data
+            self.assertEqual(set(data['image_variants']), {'128', '512'})
+            self.assertTrue(data['image_variants']['128'].startswith('http://testserver/'))
+            self.assertTrue(data['image_variants']['128'].endswith('.webp'))
+
+        # Rasm olib tashlansa nusxalar ham ko'rinmaydi
+        self.client.patch(f'/api/expenses/{expense.pk}/', {'image': None}, format='json')
+        self.assertEqual(self.client.get(f'/api/expenses/{expense.pk}/').json()['image_variants'], {})
+
+    def test_backfill_command(self):
+        storage = Expense._meta.get_field('image').storage
+        output = io.BytesIO()
+        Image.new('RGB', (300, 200), (10, 120, 200)).save(output, format='WEBP')
+        name = storage.save('expenses/eski.webp', ContentFile(output.getvalue()))
+        expense = Expense.objects.create(
+            building=self.building, description='Eski chek', amount=Decimal('10'),
+            image=name, image_status=Expense.ImageStatus.READY, created_by=self.ceo
+        )
+
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('1 ta rasm uchun nusxalar yaratildi', out.getvalue())
+        expense.refresh_from_db()
+        self.assertEqual(expense.image.name, name)
+        self.assertEqual(set(expense.image_variants), {'128', '512'})
+        self.assertTrue(all(storage.exists(path) for path in expense.image_variants.values()))
+
+        # Qayta ishga tushirilganda faqat nusxasi yo'q rasmlar
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('0 ta rasm', out.getvalue())
+
+    def test_exif_orientation_applied_and_metadata_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # 90 gradusga burilgan
+        exif[0x010F] = 'Telefon'
+        output = io.BytesIO()
+        Image.new('RGB', (40, 20), (0, 90, 0)).save(output, format='JPEG', exif=exif.tobytes())
+        image = 'data:image/jpeg;base64,' + base64.b64encode(output.getvalue()).decode()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_expense(image)
+        expense = Expense.objects.get()
+        with Image.open(expense.image.path) as stored:
+            self.assertEqual(stored.size, (20, 40))
+            self.assertNotIn('exif', stored.info)
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_pixel_cap(self):
+        response = self.create_expense(self.png_base64(size=(64, 48)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('juda katta', response.json()['image'][0])
+
+        output = io.BytesIO()
+        Image.new('RGB', (64, 48)).save(output, format='PNG')
+        output.name = 'katta.png'
+        response = self.client.post('/api/expenses/', {
+            'building': self.building.pk, 'description': 'Chek', 'amount': '100', 'image': output
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Expense.objects.exists())
+
+    @skipUnless(os.path.exists('/proc/self/status'), "VmHWM faqat Linux da")
+    def test_peak_memory_per_upload_within_budget(self):
+        """24 MP JPEG: to'liq dekodlash ~96 MB, o'girish esa byudjet ichida"""
+        budget_kb = 64 * 1024
+        photo = Image.new('RGB', (6000, 4000), (200, 180, 160))
+        draw = ImageDraw.Draw(photo)
+        for x in range(0, 6000, 300):
+            draw.rectangle([x, 0, x + 150, 4000], fill=(x % 255, 50, 100))
+        path = os.path.join(self.media_root, 'photo.jpg')
+        photo.save(path, format='JPEG', quality=90)
+        del photo, draw
+
+        # Har bir o'lchov alohida jarayonda. VmHWM - jarayonning eng yuqori RSS qiymati
+        # (ru_maxrss dan farqli, ota jarayon qiymatini meros olmaydi)
+        script = (
+            'import io, re, sys\n'
+            'from PIL import Image\n'
+            'from main import webp\n'
+            'def peak():\n'
+            '    return int(re.search(r"VmHWM:\\s+(\\d+)", open("/proc/self/status").read()).group(1))\n'
+            'data = open(sys.argv[1], "rb").read()\n'
+            'before = peak()\n'
+            'if sys.argv[2] == "decode":\n'
+            '    Image.open(io.BytesIO(data)).load()\n'
+            'else:\n'
+            '    webp.encode(data, (128, 512))\n'
+            'print(peak() - before)\n'
+        )
+
+        def peak_kb(mode):
+            result = subprocess.run(
+                [sys.executable, '-c', script, path, mode],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            )
+            return int(result.stdout)
+
+        # O'lchov ishonchli: to'liq o'lchamli bitmap byudjetdan oshadi
+        self.assertGreater(peak_kb('decode'), budget_kb)
+        self.assertLess(peak_kb('encode'), budget_kb)
+
+    def test_replaced_image_is_not_overwritten(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_expense(self.png_base64(size=(800, 600)))
+        expense = Expense.objects.get()
+        original = expense.image.name
+        # O'girish tugashidan oldin rasm olib tashlandi
+        self.client.patch(f'/api/expenses/{expense.pk}/', {'image': None}, format='json')
+        for callback in callbacks:
+            callback()
+
+        expense.refresh_from_db()
+        self.assertEqual((expense.image.name, expense.image_status), ('', Expense.ImageStatus.NONE))
+        # Kech qolgan natija hech qaysi chiqimga yozilmadi - barcha fayllar havolasiz
+        self.assertTrue(ReceiptBlob.objects.filter(name=original).exists())
+        self.assertFalse(ReceiptBlob.objects.filter(refcount__gt=0).exists())
+        # Asl rasm, WebP va ikki nusxa
+        self.assertEqual(receipts.collect_garbage(grace=0), 4)
+        storage = Expense._meta.get_field('image').storage
+        self.assertFalse(storage.exists(original))
+
+    def test_duplicate_receipt_stored_and_encoded_once(self):
+        image = self.png_base64(size=(800, 600))
+        with mock.patch.object(webp, 'encode', wraps=webp.encode) as encode:
+            for _ in range(2):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.assertEqual(self.create_expense(image).status_code, 201)
+            encode.assert_called_once()
+
+        first, second = Expense.objects.order_by('pk')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants, second.image_variants)
+        self.assertEqual(second.image_status, Expense.ImageStatus.READY)
+        self.assertRegex(first.image.name, r'^expenses/[0-9a-f]{2}/[0-9a-f]{64}\.webp$')
+        for name in receipts.expense_files(first.image, first.image_variants):
+            self.assertEqual(ReceiptBlob.objects.get(name=name).refcount, 2)
+
+        # Bittasi o'chirilsa fayllar qoladi, ikkinchisi ham o'chirilsa - GC o'chiradi
+        storage = first.image.storage
+        first.delete()
+        self.assertEqual(receipts.collect_garbage(grace=0), 1)  # asl PNG
+        self.assertTrue(storage.exists(second.image.name))
+        self.client.delete(f'/api/expenses/{second.pk}/')
+        # Yangi havolasiz fayllar muhlat tugamaguncha o'chirilmaydi
+        self.assertEqual(receipts.collect_garbage(), 0)
+        out = StringIO()
+        call_command('gc_receipts', '--grace', '0', stdout=out)
+        self.assertIn("3 ta ishlatilmayotgan fayl o'chirildi", out.getvalue())
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(ReceiptBlob.objects.exists())
+
+    def test_derived_files_outlive_original(self):
+        image = self.png_base64(size=(800, 600))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_expense(image)
+        first = Expense.objects.get()
+        # Asl PNG havolasiz qoldi va o'chirildi - o'girilgan fayllar esa ishlatilmoqda
+        self.assertEqual(receipts.collect_garbage(grace=0), 1)
+        self.assertTrue(ReceiptSource.objects.filter(image=first.image.name).exists())
+
+        with mock.patch.object(webp, 'encode', wraps=webp.encode) as encode:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.create_expense(image).status_code, 201)
+            encode.assert_not_called()
+        second = Expense.objects.latest('pk')
+        self.assertEqual((second.image.name, second.image_variants), (first.image.name, first.image_variants))
+
+        # O'girilgan fayllar o'chirilsa, asl chek yozuvi ham o'chadi
+        for expense in (first, second):
+            expense.delete()
+        receipts.collect_garbage(grace=0)
+        self.assertFalse(ReceiptSource.objects.exists())
+
+    def test_save_keeps_file_deleted_by_gc(self):
+        storage = Expense._meta.get_field('image').storage
+        name = storage.save('expenses/chek.png', ContentFile(b'chek'))
+        ReceiptBlob.objects.filter(name=name).update(updated_at=timezone.now() - timedelta(hours=2))
+        # GC faylni o'chirdi, qator esa hali qulfdan chiqmagan
+        os.remove(storage.path(name))
+
+        self.assertEqual(storage.save('expenses/chek.png', ContentFile(b'chek')), name)
+        self.assertTrue(storage.exists(name))
+        # Qayta saqlangan fayl yangi muhlat oladi
+        self.assertEqual(receipts.collect_garbage(grace=60), 0)
+        self.assertTrue(storage.exists(name))
+
+    def test_rebuild_reference_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_expense(self.png_base64(size=(800, 600)))
+        expense = Expense.objects.get()
+        ReceiptBlob.objects.all().delete()
+
+        out = StringIO()
+        call_command('gc_receipts', '--rebuild', '--grace', '0', stdout=out)
+        self.assertIn('3 ta faylga havola qayta hisoblandi', out.getvalue())
+        for name in receipts.expense_files(expense.image, expense.image_variants):
+            self.assertEqual(ReceiptBlob.objects.get(name=name).refcount, 1)
+            self.assertTrue(expense.image.storage.exists(name))
+
+    def test_invalid_image_rejected_and_failed_encode_recorded(self):
+        response = self.create_expense('data:image/png;base64,bm90LWFuLWltYWdl')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_expense(self.png_base64())
+        expense = Expense.objects.get()
+        Expense.objects.filter(pk=expense.pk).update(image_status=Expense.ImageStatus.PENDING)
+        with mock.patch.object(webp, 'encode', side_effect=OSError('buzilgan fayl')), \
+                self.assertLogs('main.images', 'ERROR'):
+            self.assertFalse(images.encode_expense_image(expense.pk, expense.image.name))
+        expense.refresh_from_db()
+        self.assertEqual(expense.image_status, Expense.ImageStatus.FAILED)
+
+        out = StringIO()
+        call_command('encode_pending_images', '--failed', stdout=out)
+        self.assertIn("1 ta rasm WebP ga o'girildi", out.getvalue())
+        expense.refresh_from_db()
+        self.assertEqual(expense.image_status, Expense.ImageStatus.READY)
+
+
+class ImageUploadTests(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=f'{media.name}/media', UPLOAD_SESSION_DIR=f'{media.name}/uploads')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.building, = self.create_buildings(1)
+        output = io.BytesIO()
+        Image.effect_noise((120, 80), 60).convert('RGB').save(output, format='JPEG')
+        self.jpeg = output.getvalue()
+
+    def put_chunk(self, session_id, start, data, total=None, end=None):
+        total = len(self.jpeg) if total is None else total
+        end = start + len(data) - 1 if end is None else end
+        return self.client.put(
+            f'/api/uploads/{session_id}/', data, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{total}'
+        )
+
+    def test_multipart_upload(self):
+        self.client.force_authenticate(self.accountant)
+        upload = io.BytesIO(self.jpeg)
+        upload.name = 'chek.jpg'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/expenses/', {
+                'building': self.building.pk, 'description': 'Chek', 'amount': '100', 'image': upload
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        expense = Expense.objects.get()
+        self.assertEqual(expense.image_status, Expense.ImageStatus.READY)
+        self.assertTrue(expense.image.name.endswith('.webp'))
+
+    def test_chunked_upload_resumes_and_attaches(self):
+        self.client.force_authenticate(self.accountant)
+        response = self.client.post('/api/uploads/', {'size': len(self.jpeg), 'filename': 'chek.jpg'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        session_id = response.json()['id']
+
+        self.assertEqual(self.put_chunk(session_id, 0, self.jpeg[:1000]).json()['received'], 1000)
+        # Aloqa uzildi: 1000 bayt e'lon qilingan, 400 tasi yetib keldi
+        response = self.put_chunk(session_id, 1000, self.jpeg[1000:1400], end=1999)
+        self.assertEqual(response.json()['received'], 1400)
+        # Noto'g'ri joydan davom ettirish
+        response = self.put_chunk(session_id, 2000, self.jpeg[2000:3000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], 1400)
+
+        response = self.client.get(f'/api/uploads/{session_id}/')
+        offset = response.json()['received']
+        response = self.put_chunk(session_id, offset, self.jpeg[offset:])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'complete')
+        part = uploads.part_path(UploadSession.objects.get(pk=session_id))
+        self.assertEqual(part.read_bytes(), self.jpeg)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/expenses/', {
+                'building': self.building.pk, 'description': 'Chek', 'amount': '100', 'upload': session_id
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        expense = Expense.objects.get()
+        self.assertEqual(expense.image_status, Expense.ImageStatus.READY)
+        with Image.open(expense.image.path) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (120, 80)))
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(part.exists())
+
+    def test_rejects_foreign_incomplete_and_invalid_uploads(self):
+        self.client.force_authenticate(self.accountant)
+        session_id = self.client.post('/api/uploads/', {'size': 10}, format='json').json()['id']
+        payload = {'building': self.building.pk, 'description': 'Chek', 'amount': '100', 'upload': session_id}
+        # Hali tugallanmagan
+        self.assertEqual(self.client.post('/api/expenses/', payload, format='json').status_code, 400)
+        # Rasm emas
+        response = self.put_chunk(session_id, 0, b'0123456789', total=10)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], 'failed')
+
+        self.client.force_authenticate(self.ceo)
+        self.assertEqual(self.client.get(f'/api/uploads/{session_id}/').status_code, 404)
+        self.assertEqual(
+            self.client.post('/api/uploads/', {'size': uploads.max_size() + 1}, format='json').status_code, 400
+        )
+
+
+class ReceiptMediaTests(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        building, = self.create_buildings(1)
+        self.storage = Expense._meta.get_field('image').storage
+        self.content = bytes(range(256)) * 40
+        self.name = self.storage.save('expenses/chek.webp', ContentFile(self.content))
+        self.expense = Expense.objects.create(
+            building=building, description='Chek', amount=Decimal('10'), image=self.name,
+            image_status=Expense.ImageStatus.READY, created_by=self.accountant
+        )
+        self.url = f'/media/{self.name}'
+
+    def test_scope_checked(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        other = User.objects.create_user('kuzatuvchi', password='test12345')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        # Chiqimga biriktirilmagan fayl ham berilmaydi
+        orphan = self.storage.save('expenses/boshqa.webp', ContentFile(b'RIFF'))
+        self.client.force_authenticate(self.ceo)
+        self.assertEqual(self.client.get(f'/media/{orphan}').status_code, 404)
+
+        for user in (self.accountant, self.ceo):
+            self.client.force_authenticate(user)
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), self.content)
+            self.assertEqual(response['Content-Type'], 'image/webp')
+            self.assertIn('immutable', response['Cache-Control'])
+
+    def test_range_requests(self):
+        self.client.force_authenticate(self.accountant)
+        size = len(self.content)
+        for header, start, end in (('bytes=0-99', 0, 99), ('bytes=10000-', 10000, size - 1), ('bytes=-24', size - 24, size - 1)):
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+            self.assertEqual(b''.join(response.streaming_content), self.content[start:end + 1])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_transfer_delegated_to_proxy(self):
+        self.client.force_authenticate(self.accountant)
+        with override_settings(MEDIA_SENDFILE='nginx'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+        with override_settings(MEDIA_SENDFILE='apache'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.storage.path(self.name))
+        self.assertEqual(response.content, b'')
+
+
+class RoleClaimsTests(BaseAPITestCase):
+
+    def login(self, username):
+        response = self.client.post('/api/token/', {'username': username, 'password': 'test12345'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def create_category(self, access, slug):
+        return self.client.post(
+            '/api/expense-categories/', {'name': slug, 'slug': slug}, format='json', HTTP_AUTHORIZATION=f'Bearer {access}'
+        )
+
+    def test_claims_in_token(self):
+        access = AccessToken(self.login('ceoadmin')['access'])
+        self.assertEqual((access['role'], access['ceo']), ('Admin', True))
+        access = AccessToken(self.login('buxgalter1')['access'])
+        self.assertEqual((access['role'], access['ceo']), ('Accountant', False))
+        # Guruhga qo'shilganda versiya oshgan
+        self.assertEqual(access['rv'], RoleVersion.objects.get(user=self.accountant).version)
+
+    def test_permission_decided_without_groups_query(self):
+        access = self.login('buxgalter1')['access']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.create_category(access, 'tokendan').status_code, 201)
+        self.assertFalse([query for query in queries if 'auth_user_groups' in query['sql']])
+
+    def test_role_change_rejects_old_token(self):
+        tokens = self.login('buxgalter1')
+        self.accountant.groups.clear()
+
+        response = self.create_category(tokens['access'], 'eski-token')
+        self.assertEqual(response.status_code, 401)
+
+        # Refresh token bilan yangi rol olinadi
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        access = response.json()['access']
+        self.assertIsNone(AccessToken(access)['role'])
+        self.assertEqual(self.create_category(access, 'yangi-token').status_code, 403)
+
+        # Oddiy ma'lumot o'zgarishi tokenlarni bekor qilmaydi
+        self.accountant.first_name = 'Ali'
+        self.accountant.save()
+        self.assertEqual(self.client.get('/api/expense-categories/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 200)
+
+        self.accountant.is_superuser = True
+        self.accountant.save()
+        self.assertEqual(self.client.get('/api/expense-categories/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 401)
+
+    def test_user_cached_between_requests(self):
+        access = self.login('buxgalter1')['access']
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+
+        def user_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get('/api/expense-categories/', **auth).status_code, 200)
+            return [query for query in queries if 'FROM "auth_user"' in query['sql']]
+
+        self.assertEqual(len(user_queries()), 1)
+        self.assertEqual(user_queries(), [])
+
+        # Foydalanuvchi o'zgarsa yozuv eskiradi
+        self.accountant.first_name = 'Vali'
+        self.accountant.save()
+        self.assertEqual(len(user_queries()), 1)
+        self.assertEqual(user_queries(), [])
+
+        # Muddati o'tgan yozuv ishlatilmaydi
+        with override_settings(AUTH_USER_CACHE_TTL=0):
+            authentication.user_cache.clear()
+            self.assertEqual(len(user_queries()), 1)
+            self.assertEqual(len(user_queries()), 1)
+
+        User.objects.filter(pk=self.accountant.pk).update(is_active=False)
+        bump_generation('users')
+        self.assertEqual(self.client.get('/api/expense-categories/', **auth).status_code, 401)
+
+
+class QueryCountTests(BaseAPITestCase):
+    """
+    Har bir endpoint so'rovlari soni yozuvlar soniga bog'liq emas (N+1 yo'q)
+
+    Ma'lumotlar 1, 10 va 100 tagacha ko'paytiriladi va har bir bosqichda
+    so'rovlar soni bir xil bo'lishi tekshiriladi.
+    """
+    sizes = (1, 10, 100)
+
+    def seed(self, count):
+        accountant_group = Group.objects.get(name='Accountant')
+        expenses = []
+        for index in range(Building.objects.count(), count):
+            # Parolsiz - xeshlash testni sekinlashtiradi
+            user = User.objects.create(username=f'hisobchi{index}')
+            user.groups.add(accountant_group)
+            building = Building.objects.create(name=f'Bino {index}', budget=Decimal('1000000'))
+            category = ExpenseCategory.objects.create(name=f'Kategoriya {index}', slug=f'cat-{index}', order=index)
+            expenses.extend(
+                Expense(
+                    building=building, category=category, description=f'Chiqim {index}',
+                    amount=Decimal(100 + index), date=self.today - timedelta(days=index % 30), created_by=author
+                )
+                for author in (self.ceo, self.accountant)
+            )
+        Expense.objects.bulk_create(expenses)
+        rollup.record_created([rollup.expense_values(expense) for expense in expenses])
+        self.building = Building.objects.order_by('pk').first()
+        self.category = ExpenseCategory.objects.order_by('pk').first()
+
+    def count_queries(self, method, url, data=None):
+        cache.clear()
+        StatisticsSnapshot.objects.all().delete()
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, (url, response.content[:200]))
+        return len(ctx.captured_queries)
+
+    def read_requests(self, user):
+        expense = Expense.objects.filter(created_by=user).order_by('pk').first()
+        return [
+            ('get', '/api/users/'),
+            ('get', f'/api/users/{self.accountant.pk}/'),
+            ('get', '/api/users/me/'),
+            ('get', '/api/expense-categories/'),
+            ('get', f'/api/expense-categories/{self.category.pk}/'),
+            ('get', '/api/buildings/'),
+            ('get', f'/api/buildings/{self.building.pk}/'),
+            ('get', f'/api/buildings/{self.building.pk}/statistics/'),
+            ('get', '/api/expenses/'),
+            ('get', '/api/expenses/?pagination=cursor'),
+            ('get', f'/api/expenses/{expense.pk}/'),
+            ('get', '/api/expenses/statistics/'),
+            ('get', '/api/statistics/dashboard/'),
+            ('get', '/api/statistics/buildings/'),
+            ('get', '/api/statistics/weekly/'),
+            ('get', f'/api/statistics/monthly/?year={self.today.year}&month={self.today.month}'),
+        ]
+
+    def write_counts(self, step):
+        """Yaratish, o'zgartirish va o'chirish (har bosqichda yangi obyektlar bilan)"""
+        counts = {}
+        for model, prefix, payload, change in (
+            (ExpenseCategory, '/api/expense-categories/', {'name': f'Yangi {step}', 'slug': f'yangi-{step}'}, {'name': 'Nom'}),
+            (Building, '/api/buildings/', {'name': f'Yangi bino {step}', 'budget': '1000'}, {'name': 'Nom'}),
+            (Expense, '/api/expenses/', {
+                'building': self.building.pk, 'category': self.category.pk,
+                'description': 'Yangi', 'amount': '10', 'date': self.today.isoformat(),
+            }, {'amount': '20'}),
+        ):
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(prefix, payload, format='json')
+            self.assertEqual(response.status_code, 201, response.content[:200])
+            counts[('post', prefix)] = len(ctx.captured_queries)
+            url = f"{prefix}{model.objects.latest('pk').pk}/"
+            counts[('patch', prefix)] = self.count_queries('patch', url, change)
+            counts[('delete', prefix)] = self.count_queries('delete', url)
+        return counts
+
+    def test_query_counts_constant(self):
+        results = {self.ceo: [], self.accountant: []}
+        for step, size in enumerate(self.sizes):
+            self.seed(size)
+            for user, user_results in results.items():
+                self.client.force_authenticate(user)
+                counts = {
+                    (method, url): self.count_queries(method, url)
+                    for method, url in self.read_requests(user)
+                    if user == self.ceo or not url.startswith('/api/users/')
+                }
+                counts.update(self.write_counts(f'{user.pk}-{step}'))
+                user_results.append(counts)
+        for user, user_results in results.items():
+            for key in user_results[0]:
+                with self.subTest(user=user.username, request=key):
+                    self.assertEqual([counts[key] for counts in user_results], [user_results[0][key]] * len(self.sizes))
+
+
+@skipUnless(connection.vendor == 'sqlite', "PRAGMA lar faqat SQLite da")
+class SQLiteTuningTests(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_configured(self):
+        self.assertEqual(self.pragma('busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+        # Test bazasi xotirada (WAL emas) - NORMAL o'rniga FULL
+        self.assertEqual(self.pragma('journal_mode'), 'memory')
+        self.assertEqual(self.pragma('synchronous'), 2)  # FULL
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+        self.assertEqual(self.pragma('cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            raw = sqlite3.connect(os.path.join(directory, 'delete.sqlite3'))
+            raw.execute('CREATE TABLE t (id INTEGER)')
+            sqlite.apply_pragmas(raw, sqlite.pragmas())
+            # Ulanish baza fayli sarlavhasini (jurnal rejimini) o'zgartirmaydi
+            self.assertEqual(raw.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+            with self.assertRaises(ValueError):
+                sqlite.apply_pragmas(raw, {'cache_size': '1; DROP TABLE x'})
+            raw.close()
+
+    def test_optimize_command(self):
+        out = StringIO()
+        call_command('optimize_sqlite', '--analyze', stdout=out)
+        self.assertIn('ANALYZE bajarildi', out.getvalue())
+        self.assertIn('SQLite optimallashtirildi', out.getvalue())
+
+    def test_wal_enabled_only_by_optimize_command(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'wal.sqlite3')
+            wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': path}, alias='wal')
+            self.addCleanup(wrapper.close)
+
+            def journal_mode():
+                raw = sqlite3.connect(path)
+                try:
+                    return raw.execute('PRAGMA journal_mode').fetchone()[0]
+                finally:
+                    raw.close()
+
+            def synchronous():
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA synchronous')
+                    return cursor.fetchone()[0]
+
+            # Oddiy ulanish (connection_created) jurnal rejimini o'zgartirmaydi;
+            # rollback jurnalida NORMAL emas, FULL qo'llanadi
+            with wrapper.cursor() as cursor:
+                cursor.execute('CREATE TABLE t (id INTEGER)')
+            self.assertEqual(journal_mode(), 'delete')
+            self.assertEqual(synchronous(), 2)  # FULL
+
+            out = StringIO()
+            with mock.patch('main.management.commands.optimize_sqlite.connection', wrapper):
+                call_command('optimize_sqlite', '--wal', stdout=out)
+            self.assertIn('journal_mode=wal', out.getvalue())
+            self.assertEqual(journal_mode(), 'wal')
+
+            # WAL dagi bazaga yangi ulanishda NORMAL
+            wrapper.close()
+            self.assertEqual(synchronous(), 1)  # NORMAL
+
+
+class DatabaseSettingsTests(TestCase):
+
+    def load_settings(self, **environ):
+        script = (
+            'import json\n'
+            'from core import settings\n'
+            'database = dict(settings.DATABASES["default"], NAME=str(settings.DATABASES["default"]["NAME"]))\n'
+            'print(json.dumps(database))\n'
+        )
+        env = {key: value for key, value in os.environ.items() if not key.startswith(('DB_', 'POSTGRES_'))}
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, env={**env, **environ},
+            capture_output=True, text=True, check=True
+        )
+        return json.loads(result.stdout)
+
+    def test_postgres_profile_from_environment(self):
+        database = self.load_settings(DB_ENGINE='postgres', POSTGRES_DB='hisob', DB_POOL_MAX_SIZE='20')
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['NAME'], 'hisob')
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertFalse(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 20)
+        self.assertNotIn('CONN_MAX_AGE', database)
+
+        database = self.load_settings(DB_ENGINE='postgres', DB_POOL='0', DB_DISABLE_SERVER_SIDE_CURSORS='1')
+        self.assertNotIn('pool', database['OPTIONS'])
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+
+        database = self.load_settings()
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['OPTIONS'], {'transaction_mode': 'IMMEDIATE'})
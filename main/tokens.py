@@ -0,0 +1,101 @@
+"""
+JWT tokenidagi rol ma'lumotlari
+
+Access tokenga foydalanuvchi roli (`role`), ceoadmin ekanligi (`ceo`) va
+rol versiyasi (`rv`) yoziladi. Ruxsat klasslari (permissions.py) qarorni
+faqat shu ma'lumotlardan qabul qiladi - har bir so'rovda guruhlar jadvaliga
+murojaat qilinmaydi.
+
+Rol o'zgarsa (signals.py) `RoleVersion` oshiriladi: tokendagi `rv` joriy
+versiyadan farq qilsa, token rad etiladi (401) va mijoz refresh token
+bilan yangi ma'lumotli access token oladi. Joriy versiya keshda saqlanadi,
+shuning uchun tekshiruv odatda bazaga murojaat qilmaydi.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .generations import _cache
+from .models import RoleVersion
+from .stats import CEO_ADMIN_USERNAME
+
+
+ROLE_CLAIM = 'role'
+CEO_CLAIM = 'ceo'
+VERSION_CLAIM = 'rv'
+
+KEY_PREFIX = 'role-version:'
+
+
+def user_role(user):
+    """
+    Foydalanuvchining amaldagi roli
+
+    Superuser Admin huquqiga ega; bir nechta guruhda bo'lsa eng kattasi olinadi.
+    """
+    names = [group.name for group in user.groups.all()]
+    if user.is_superuser or 'Admin' in names:
+        return 'Admin'
+    if 'Accountant' in names:
+        return 'Accountant'
+    return names[0] if names else None
+
+
+def role_version(user_id):
+    """Joriy rol versiyasi (kesh, bo'lmasa baza)"""
+    cache = _cache()
+    key = f'{KEY_PREFIX}{user_id}'
+    version = cache.get(key)
+    if version is None:
+        version = RoleVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+        cache.add(key, version, None)
+    return version
+
+
+def bump_role_version(user_id):
+    """
+    Rol versiyasini oshirish - shu foydalanuvchining barcha eski tokenlari rad etiladi
+
+    Kesh kaliti darhol va tranzaksiya tasdiqlangach yana o'chiriladi
+    (qarang: generations.bump_generation).
+    """
+    updated = RoleVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+    if not updated:
+        RoleVersion.objects.get_or_create(user_id=user_id, defaults={'version': 1})
+    key = f'{KEY_PREFIX}{user_id}'
+    _cache().delete(key)
+    transaction.on_commit(lambda: _cache().delete(key))
+
+
+def add_role_claims(token, user):
+    token[ROLE_CLAIM] = user_role(user)
+    token[CEO_CLAIM] = user.username == CEO_ADMIN_USERNAME
+    token[VERSION_CLAIM] = role_version(user.pk)
+    return token
+
+
+def has_role_claims(token):
+    return token is not None and hasattr(token, 'payload') and VERSION_CLAIM in token.payload
+
+
+class ExpenseTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Login: tokenga rol ma'lumotlarini qo'shish"""
+
+    @classmethod
+    def get_token(cls, user):
+        # Refresh tokendagi ma'lumotlar undan olingan access tokenga ham o'tadi
+        return add_role_claims(super().get_token(user), user)
+
+
+class ExpenseTokenRefreshSerializer(TokenRefreshSerializer):
+    """Yangi access token rol ma'lumotlarini bazadan qayta oladi (rol o'zgargan bo'lishi mumkin)"""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = User.objects.get(**{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]})
+        data['access'] = str(add_role_claims(access, user))
+        return data
@@ -0,0 +1,158 @@
+"""
+Bo'laklab (chunked) va davom ettiriladigan fayl yuklash
+
+1. `POST /api/uploads/` - fayl hajmi (`size`) bilan sessiya ochiladi;
+2. `PUT /api/uploads/<id>/` - so'rov tanasi (application/octet-stream)
+   `Content-Range: bytes <start>-<end>/<size>` joyiga yoziladi. `start`
+   serverdagi `received` ga teng bo'lishi kerak, aks holda 409 va joriy
+   holat qaytariladi;
+3. aloqa uzilsa, `GET /api/uploads/<id>/` dan `received` olinadi va yuklash
+   shu joydan davom ettiriladi;
+4. oxirgi bo'lak yozilgach, rasm sarlavhasi tekshiriladi va sessiya
+   `complete` bo'ladi - chiqim yaratishda `upload` maydoniga uning ID si beriladi.
+
+Bo'laklar diskka oqim sifatida yoziladi: so'rov tanasi xotirada to'liq
+saqlanmaydi. `received` faqat yozilgan baytlardan keyin oshiriladi, shuning
+uchun yarim qolgan bo'lak keyingi urinishda shu joyning ustiga qayta yoziladi.
+"""
+import os
+import re
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from . import images
+from .models import UploadSession
+
+
+READ_SIZE = 64 * 1024
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    """Bo'lakni qabul qilib bo'lmaydi (`status` - HTTP holat kodi)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 20 * 1024 * 1024)
+
+
+def max_chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', 5 * 1024 * 1024)
+
+
+def part_path(session):
+    directory = Path(getattr(settings, 'UPLOAD_SESSION_DIR', settings.BASE_DIR / '.uploads'))
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f'{session.pk}.part'
+
+
+def parse_content_range(header, session):
+    """`Content-Range` sarlavhasidan (boshlanish, uzunlik); sarlavha bo'lmasa - davomi"""
+    if not header:
+        return session.received, None
+    match = CONTENT_RANGE.match(header.strip())
+    if match is None:
+        raise UploadError("Content-Range formati: bytes <start>-<end>/<size>")
+    start, end, total = (int(value) for value in match.groups())
+    if total != session.size or end < start or end >= session.size:
+        raise UploadError("Content-Range fayl hajmiga mos emas")
+    return start, end - start + 1
+
+
+def write_chunk(session, stream, content_range=None, content_length=None):
+    """
+    So'rov tanasini sessiya fayliga yozish
+
+    Natija: yangilangan sessiya. Oxirgi bo'lakdan keyin rasm tekshiriladi.
+    """
+    if session.status != UploadSession.Status.UPLOADING:
+        raise UploadError("Yuklash allaqachon tugagan", status=409)
+    start, length = parse_content_range(content_range, session)
+    if start != session.received:
+        raise UploadError(f"Bo'lak {session.received}-baytdan boshlanishi kerak", status=409)
+    if length is None:
+        length = content_length if content_length is not None else session.size - start
+    if length > max_chunk_size():
+        raise UploadError(f"Bitta bo'lak {max_chunk_size()} baytdan oshmasligi kerak", status=413)
+    length = min(length, session.size - start)
+
+    path = part_path(session)
+    written = 0
+    with open(path, 'r+b' if path.exists() else 'wb') as target:
+        target.seek(start)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                # Aloqa uzildi - yozilgan qismi saqlanadi, mijoz shu joydan davom etadi
+                break
+            target.write(data)
+            written += len(data)
+        target.truncate(start + written)
+
+    # Parallel so'rov shu joyni allaqachon yozgan bo'lsa, hisob ikki marta oshmaydi
+    updated = UploadSession.objects.filter(pk=session.pk, received=start).update(
+        received=start + written, updated_at=timezone.now()
+    )
+    if not updated:
+        raise UploadError("Bo'lak boshqa so'rov bilan allaqachon yozilgan", status=409)
+    session.received = start + written
+    if session.received == session.size:
+        complete(session)
+    return session
+
+
+def complete(session):
+    """Fayl to'liq yuklangach rasmni tekshirish"""
+    path = part_path(session)
+    try:
+        with open(path, 'rb') as source:
+            session.extension = images.image_extension(source)
+    except images.InvalidImage:
+        session.status = UploadSession.Status.FAILED
+        session.save(update_fields=['status', 'updated_at'])
+        path.unlink(missing_ok=True)
+        raise UploadError("Yuklangan fayl rasm emas")
+    session.status = UploadSession.Status.COMPLETE
+    session.save(update_fields=['extension', 'status', 'updated_at'])
+
+
+def open_completed(session):
+    """Tugallangan sessiya faylini chiqimga biriktirish uchun ochish"""
+    return File(open(part_path(session), 'rb'), name=images.original_name(session.extension))
+
+
+def attached(session, upload):
+    """
+    Fayl chiqimga saqlangach sessiyani o'chirish
+
+    Vaqtinchalik fayl tranzaksiya tasdiqlangach o'chiriladi.
+    """
+    upload.close()
+    path = part_path(session)
+    session.delete()
+    transaction.on_commit(lambda: path.unlink(missing_ok=True))
+
+
+def purge_expired():
+    """Muddati o'tgan (tugallanmagan yoki biriktirilmagan) sessiyalarni o'chirish"""
+    ttl = getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 60 * 60)
+    expired = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=ttl))
+    count = 0
+    for session in expired.iterator():
+        try:
+            os.remove(part_path(session))
+        except FileNotFoundError:
+            pass
+        session.delete()
+        count += 1
+    return count
@@ -1,9 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    UserViewSet, BuildingViewSet, ExpenseViewSet, ExpenseCategoryViewSet,
+    UserViewSet, BuildingViewSet, ExpenseViewSet, ExpenseCategoryViewSet, UploadSessionViewSet,
     DashboardStatisticsView, BuildingComparisonView, 
-    MonthlyReportView, WeeklyReportView
+    MonthlyReportView, WeeklyReportView, MetricsView
 )
 
 router = DefaultRouter()
@@ -11,6 +11,7 @@ router.register(r'users', UserViewSet, basename='user')
 router.register(r'buildings', BuildingViewSet, basename='building')
 router.register(r'expenses', ExpenseViewSet, basename='expense')
 router.register(r'expense-categories', ExpenseCategoryViewSet, basename='expense-category')
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -20,4 +21,7 @@ urlpatterns = [
     path('statistics/buildings/', BuildingComparisonView.as_view(), name='building-comparison'),
     path('statistics/monthly/', MonthlyReportView.as_view(), name='monthly-report'),
     path('statistics/weekly/', WeeklyReportView.as_view(), name='weekly-report'),
+
+    # Monitoring
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
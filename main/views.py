@@ -1,27 +1,34 @@
-from rest_framework import viewsets, status
+import csv
+import io
+
+from rest_framework import mixins, viewsets, status
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth.models import User, Group
-from django.db.models import Sum, Count, Avg, Max, Min
-from django.db.models.functions import TruncWeek, TruncMonth
-from django.utils import timezone
-from datetime import timedelta
+from django.http import Http404, HttpResponse
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
 
-from .models import Building, Expense, ExpenseCategory
+from .models import Building, Expense, ExpenseCategory, ExpenseImport, UploadSession
 from .serializers import (
     UserSerializer, UserCreateSerializer,
     BuildingListSerializer, BuildingDetailSerializer, BuildingCreateUpdateSerializer,
     ExpenseListSerializer, ExpenseDetailSerializer, ExpenseCreateUpdateSerializer,
-    ExpenseStatisticsSerializer, ExpenseCategorySerializer
+    ExpenseStatisticsSerializer, ExpenseCategorySerializer, ExpenseImportSerializer,
+    UploadSessionSerializer
 )
 from .permissions import (
     IsAdmin, IsAdminOrAccountant, IsAdminOrAccountantOrReadOnly, 
-    CanManageUsers
+    CanManageUsers, CanViewMetrics
 )
+from . import bulk, export, importer, media, metrics, snapshots, stats, uploads
+from .caching import cached_response_data
+from .conditional import ConditionalGetMixin
+from .generations import DATA_GENERATIONS, USER_GENERATIONS
+from .pagination import ExpensePagination
+from .stats import ExpenseFilter
 
 
 # CEO Admin username
@@ -75,15 +82,18 @@ CEO_ADMIN_USERNAME = 'ceoadmin'
         tags=['Foydalanuvchilar']
     )
 )
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Foydalanuvchilar bilan ishlash uchun API
     
     Bu API orqali foydalanuvchilarni ko'rish, yaratish, yangilash va o'chirish mumkin.
     Faqat ceoadmin uchun ruxsat etilgan.
     """
-    queryset = User.objects.all().order_by('-date_joined')
+    # Rol (`UserSerializer.get_role`) oldindan yuklangan guruhlardan olinadi
+    queryset = User.objects.prefetch_related('groups').order_by('-date_joined')
     permission_classes = [IsAuthenticated, CanManageUsers]
+    etag_generations = ('users',)
+    last_modified_field = 'date_joined'
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -134,7 +144,7 @@ class UserViewSet(viewsets.ModelViewSet):
         tags=['Kategoriyalar']
     )
 )
-class ExpenseCategoryViewSet(viewsets.ModelViewSet):
+class ExpenseCategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Chiqim kategoriyalari bilan ishlash uchun API
     
@@ -143,6 +153,8 @@ class ExpenseCategoryViewSet(viewsets.ModelViewSet):
     queryset = ExpenseCategory.objects.all()
     serializer_class = ExpenseCategorySerializer
     permission_classes = [IsAuthenticated, IsAdminOrAccountantOrReadOnly]
+    etag_generations = ('categories',)
+    last_modified_field = 'created_at'
     
     def get_queryset(self):
         queryset = ExpenseCategory.objects.all()
@@ -222,7 +234,7 @@ class ExpenseCategoryViewSet(viewsets.ModelViewSet):
         tags=['Binolar']
     )
 )
-class BuildingViewSet(viewsets.ModelViewSet):
+class BuildingViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Binolar bilan ishlash uchun API
     
@@ -230,6 +242,9 @@ class BuildingViewSet(viewsets.ModelViewSet):
     """
     queryset = Building.objects.all()
     permission_classes = [IsAuthenticated, IsAdminOrAccountantOrReadOnly]
+    # Ro'yxatdagi chiqimlar soni chiqim yozilganda ham o'zgaradi
+    etag_generations = ('buildings', 'expenses')
+    last_modified_field = 'updated_at'
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -277,125 +292,13 @@ class BuildingViewSet(viewsets.ModelViewSet):
         """Bino bo'yicha statistikani olish"""
         building = self.get_object()
         
-        # Chiqimlar statistikasi
-        expenses = building.expenses.all()
-        
-        # Filterlarni qo'llash
-        date_from = request.query_params.get('date_from')
-        if date_from:
-            expenses = expenses.filter(date__gte=date_from)
-        
-        date_to = request.query_params.get('date_to')
-        if date_to:
-            expenses = expenses.filter(date__lte=date_to)
-        
-        category = request.query_params.get('category')
-        if category:
-            expenses = expenses.filter(category_id=category)
-        
-        created_by = request.query_params.get('created_by')
-        if created_by and request.user.username == CEO_ADMIN_USERNAME:
-            expenses = expenses.filter(created_by_id=created_by)
-        
-        # Umumiy statistikalar
-        stats = expenses.aggregate(
-            total=Sum('amount'),
-            count=Count('id'),
-            avg=Avg('amount'),
-            max_amount=Max('amount')
-        )
-        total_expenses = stats['total'] or 0
-        expenses_count = stats['count'] or 0
-        avg_expense = stats['avg'] or 0
-        max_expense = stats['max_amount'] or 0
-        
-        # Kategoriya bo'yicha
-        by_category = {}
-        for cat in ExpenseCategory.objects.all():
-            amount = expenses.filter(category=cat).aggregate(total=Sum('amount'))['total'] or 0
-            by_category[cat.name] = float(amount)
-        
-        # Top foydalanuvchilar (faqat admin uchun)
-        top_users = []
-        if request.user.username == CEO_ADMIN_USERNAME:
-            top_users = list(
-                expenses.values('created_by__username', 'created_by_id')
-                .annotate(total=Sum('amount'), count=Count('id'))
-                .order_by('-total')[:10]
-            )
-        
-        # Kunlik chiqimlar (so'nggi 30 kun)
-        thirty_days_ago = timezone.now().date() - timedelta(days=30)
-        daily_expenses = list(
-            expenses.filter(date__gte=thirty_days_ago)
-            .values('date')
-            .annotate(total=Sum('amount'), count=Count('id'))
-            .order_by('date')
-        )
-        
-        # Oylik chiqimlar (so'nggi 12 oy)
-        twelve_months_ago = timezone.now().date() - timedelta(days=365)
-        monthly_expenses = list(
-            expenses.filter(date__gte=twelve_months_ago)
-            .annotate(month=TruncMonth('date'))
-            .values('month')
-            .annotate(total=Sum('amount'))
-            .order_by('month')
-        )
-        
-        # Format monthly data
-        monthly_data = []
-        for item in monthly_expenses:
-            if item['month']:
-                monthly_data.append({
-                    'month': item['month'].strftime('%Y-%m'),
-                    'month_name': item['month'].strftime('%B %Y'),
-                    'total': float(item['total'] or 0)
-                })
-        
-        # So'nggi chiqimlar
-        recent_expenses = list(
-            expenses.select_related('category', 'created_by')
-            .order_by('-date', '-created_at')[:10]
-            .values(
-                'id', 'description', 'amount', 'date',
-                'category__name', 'category__icon', 'category__color',
-                'created_by__username'
-            )
-        )
-        
-        # Format recent expenses
-        formatted_recent = []
-        for exp in recent_expenses:
-            formatted_recent.append({
-                'id': exp['id'],
-                'description': exp['description'],
-                'amount': float(exp['amount']),
-                'date': exp['date'].isoformat() if exp['date'] else None,
-                'category': exp['category__name'] or 'Boshqa',
-                'category_icon': exp['category__icon'] or 'MoreHorizontal',
-                'category_color': exp['category__color'] or 'text-slate-400 bg-slate-500/20 border-slate-500/30',
-                'created_by': exp['created_by__username'] or 'Noma\'lum'
-            })
-        
-        return Response({
-            'building_name': building.name,
-            'building_status': building.status,
-            'building_description': building.description,
-            'start_date': building.start_date.isoformat() if building.start_date else None,
-            'budget': float(building.budget),
-            'spent_amount': float(building.spent_amount),
-            'remaining_budget': float(building.remaining_budget),
-            'total_expenses': float(total_expenses),
-            'expenses_count': expenses_count,
-            'average_expense': float(avg_expense),
-            'max_expense': float(max_expense),
-            'expenses_by_category': by_category,
-            'top_users': top_users,
-            'daily_expenses': daily_expenses,
-            'monthly_expenses': monthly_data,
-            'recent_expenses': formatted_recent
-        })
+        spec = ExpenseFilter.from_request(request, building=building.pk)
+        include_users = request.user.username == CEO_ADMIN_USERNAME
+        return self.conditional_response(request, lambda: Response(cached_response_data(
+            request, 'building-statistics',
+            lambda: stats.building_statistics(building, spec, include_users=include_users),
+            extra=[('pk', building.pk)]
+        )), generations=DATA_GENERATIONS)
 
 
 @extend_schema_view(
@@ -410,6 +313,11 @@ class BuildingViewSet(viewsets.ModelViewSet):
         - `date_from`: Sanadan boshlab
         - `date_to`: Sanagacha
         - `created_by`: Foydalanuvchi ID si bo'yicha (faqat ceoadmin uchun)
+        
+        **Sahifalash:**
+        - Odatiy: `page` - sahifa raqami (`count` bilan)
+        - `pagination=cursor`: kursorli sahifalash - `next`/`previous` havolalari
+          orqali yuriladi, `count` qaytarilmaydi, chuqur sahifalar ham tez ochiladi
         """,
         tags=['Chiqimlar'],
         parameters=[
@@ -489,7 +397,7 @@ class BuildingViewSet(viewsets.ModelViewSet):
         tags=['Chiqimlar']
     )
 )
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Chiqimlar bilan ishlash uchun API
     
@@ -497,6 +405,11 @@ class ExpenseViewSet(viewsets.ModelViewSet):
     """
     queryset = Expense.objects.all()
     permission_classes = [IsAuthenticated, IsAdminOrAccountantOrReadOnly]
+    pagination_class = ExpensePagination
+    # Chiqimlar jadvali katta - validator uchun jadvalni skanerlamaymiz,
+    # har bir chiqim yozuvi 'expenses' avlodini almashtiradi. Qatorlarda
+    # `created_by_name` ham bor - foydalanuvchi nomi o'zgarsa ETag ham o'zgaradi
+    etag_generations = DATA_GENERATIONS + USER_GENERATIONS
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -506,37 +419,15 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         return ExpenseDetailSerializer
     
     def get_queryset(self):
-        queryset = Expense.objects.all()
-        
         # ceoadmin barcha chiqimlarni ko'radi, boshqalar faqat o'ziniki
+        owner = None
         if self.request.user.username != CEO_ADMIN_USERNAME:
-            queryset = queryset.filter(created_by=self.request.user)
-        
-        # Bino bo'yicha filtrlash
-        building = self.request.query_params.get('building')
-        if building:
-            queryset = queryset.filter(building_id=building)
-        
-        # Kategoriya bo'yicha
-        category = self.request.query_params.get('category')
-        if category:
-            queryset = queryset.filter(category=category)
-        
-        # Sana bo'yicha
-        date_from = self.request.query_params.get('date_from')
-        if date_from:
-            queryset = queryset.filter(date__gte=date_from)
-        
-        date_to = self.request.query_params.get('date_to')
-        if date_to:
-            queryset = queryset.filter(date__lte=date_to)
-        
-        # Foydalanuvchi bo'yicha filtrlash (faqat ceoadmin uchun)
-        created_by = self.request.query_params.get('created_by')
-        if created_by and self.request.user.username == CEO_ADMIN_USERNAME:
-            queryset = queryset.filter(created_by_id=created_by)
-        
-        return queryset
+            owner = self.request.user
+
+        # Bino, kategoriya, sana va foydalanuvchi (faqat ceoadmin) bo'yicha filtrlash
+        spec = ExpenseFilter.from_request(self.request, owner=owner)
+        # Serializerlar bino, kategoriya va muallif nomlarini ko'rsatadi
+        return spec.apply(Expense.objects.select_related('building', 'category', 'created_by'))
     
     @extend_schema(
         summary="Chiqimlar statistikasi",
@@ -571,116 +462,235 @@ class ExpenseViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Umumiy chiqimlar statistikasi"""
-        expenses = Expense.objects.all()
-        
-        # Filterlarni qo'llash
-        date_from = request.query_params.get('date_from')
-        if date_from:
-            expenses = expenses.filter(date__gte=date_from)
-        
-        date_to = request.query_params.get('date_to')
-        if date_to:
-            expenses = expenses.filter(date__lte=date_to)
-        
-        building = request.query_params.get('building')
-        if building:
-            expenses = expenses.filter(building_id=building)
-        
-        category = request.query_params.get('category')
-        if category:
-            expenses = expenses.filter(category_id=category)
-        
-        created_by = request.query_params.get('created_by')
-        if created_by and request.user.username == CEO_ADMIN_USERNAME:
-            expenses = expenses.filter(created_by_id=created_by)
-        
-        # Umumiy statistikalar
-        stats = expenses.aggregate(
-            total=Sum('amount'),
-            count=Count('id'),
-            avg=Avg('amount'),
-            max_amount=Max('amount'),
-            min_amount=Min('amount')
-        )
-        total_expenses = stats['total'] or 0
-        expenses_count = stats['count'] or 0
-        avg_expense = stats['avg'] or 0
-        max_expense = stats['max_amount'] or 0
-        min_expense = stats['min_amount'] or 0
-        
-        # Kategoriya bo'yicha
-        expenses_by_category = {}
-        for cat in ExpenseCategory.objects.all():
-            amount = expenses.filter(category=cat).aggregate(total=Sum('amount'))['total'] or 0
-            expenses_by_category[cat.name] = float(amount)
-        
-        # Binolar bo'yicha
-        expenses_by_building = list(
-            expenses.values('building__name', 'building_id')
-            .annotate(total=Sum('amount'), count=Count('id'))
-            .order_by('-total')[:10]
-        )
+        spec = ExpenseFilter.from_request(request)
+        include_users = request.user.username == CEO_ADMIN_USERNAME
+        return self.conditional_response(request, lambda: Response(cached_response_data(
+            request, 'expense-statistics',
+            lambda: stats.expense_statistics(spec, include_users=include_users)
+        )))
+
+    @extend_schema(
+        summary="Chiqimlarni eksport qilish",
+        description="""
+        Filtrlangan chiqimlarni CSV yoki XLSX fayl sifatida yuklab olish.
         
-        # Top foydalanuvchilar (faqat admin uchun)
-        top_users = []
-        if request.user.username == CEO_ADMIN_USERNAME:
-            top_users = list(
-                expenses.values('created_by__username', 'created_by_id')
-                .annotate(total=Sum('amount'), count=Count('id'))
-                .order_by('-total')[:10]
+        Ro'yxatdagi filtrlar (`building`, `category`, `date_from`, `date_to`,
+        `created_by`) va ruxsatlar bir xil: ceoadmin barcha chiqimlarni,
+        boshqalar faqat o'zinikini oladi. Fayl oqim (streaming) bilan yuboriladi,
+        sahifalash yo'q.
+        """,
+        tags=['Chiqimlar'],
+        parameters=[
+            OpenApiParameter(
+                name='file_format',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description="Fayl formati: csv (default) yoki xlsx",
+                enum=list(export.FORMATS),
+                required=False
+            ),
+        ],
+        responses={(200, 'text/csv'): OpenApiTypes.BINARY}
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Chiqimlarni CSV / XLSX formatida eksport qilish"""
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        if file_format not in export.FORMATS:
+            return Response(
+                {"error": "file_format faqat csv yoki xlsx bo'lishi mumkin"},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        return export.export_response(self.get_queryset(), file_format)
+
+    @extend_schema(
+        summary="Chiqimlarni ommaviy qo'shish",
+        description=f"""
+        Bir so'rovda bir nechta chiqim qo'shish (ko'pi bilan {bulk.MAX_ITEMS} ta).
         
-        # Kunlik (so'nggi 30 kun)
-        thirty_days_ago = timezone.now().date() - timedelta(days=30)
-        daily_expenses = list(
-            expenses.filter(date__gte=thirty_days_ago)
-            .values('date')
-            .annotate(total=Sum('amount'), count=Count('id'))
-            .order_by('date')
-        )
+        So'rov tanasi - chiqimlar ro'yxati (har biri oddiy qo'shishdagi kabi:
+        `building`, `category`, `description`, `amount`, `date`).
         
-        # Haftalik (oxirgi 8 hafta)
-        eight_weeks_ago = timezone.now().date() - timedelta(weeks=8)
-        weekly_expenses = list(
-            expenses.filter(date__gte=eight_weeks_ago)
-            .annotate(week=TruncWeek('date'))
-            .values('week')
-            .annotate(total=Sum('amount'), count=Count('id'))
-            .order_by('week')
-        )
+        To'g'ri qatorlar saqlanadi, xato qatorlar qolganlarini to'xtatmaydi:
+        - `created` - saqlangan chiqimlar
+        - `errors` - xato qatorlar (`index` - ro'yxatdagi o'rni, `errors` - xatolar)
         
-        # Oylik (oxirgi 12 oy)
-        twelve_months_ago = timezone.now().date() - timedelta(days=365)
-        monthly_expenses = list(
-            expenses.filter(date__gte=twelve_months_ago)
-            .annotate(month=TruncMonth('date'))
-            .values('month')
-            .annotate(total=Sum('amount'), count=Count('id'))
-            .order_by('month')
+        Hech bir qator saqlanmasa, 400 qaytariladi.
+        """,
+        tags=['Chiqimlar'],
+        request=bulk.BulkExpenseItemSerializer(many=True),
+        examples=[
+            OpenApiExample(
+                'Ommaviy qo\'shish',
+                value=[
+                    {'building': 1, 'category': 1, 'description': 'Sement', 'amount': 1500000},
+                    {'building': 1, 'category': 2, 'description': 'Ish haqi', 'amount': 3000000, 'date': '2024-01-15'}
+                ]
+            )
+        ]
+    )
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Chiqimlarni ommaviy qo'shish"""
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {"error": "So'rov tanasi chiqimlar ro'yxati bo'lishi kerak"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > bulk.MAX_ITEMS:
+            return Response(
+                {"error": f"Bir so'rovda ko'pi bilan {bulk.MAX_ITEMS} ta chiqim qo'shish mumkin"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        expenses, errors = bulk.create_expenses(items, request.user)
+        return Response(
+            {
+                'created': ExpenseListSerializer(expenses, many=True, context={'request': request}).data,
+                'errors': errors
+            },
+            status=status.HTTP_201_CREATED if expenses else status.HTTP_400_BAD_REQUEST
         )
+
+    @extend_schema(
+        summary="Chiqimlarni CSV fayldan import qilish",
+        description="""
+        CSV fayldagi chiqimlarni ommaviy qo'shish (multipart, `file` maydoni).
+        
+        Ustunlar eksport fayli bilan bir xil: `Sana`, `Bino`, `Kategoriya`, `Tavsif`,
+        `Summa`, `Kim tomonidan` (yoki `date`, `building`, `category`, `description`,
+        `amount`, `created_by`). Bino va kategoriya nomi (yoki bino ID si) bilan beriladi.
+        `Kim tomonidan` ustuni faqat ceoadmin uchun hisobga olinadi.
+        
+        Fayl paketlab o'qiladi va saqlanadi; xato qatorlar qolganlarini to'xtatmaydi.
+        Import uzilib qolsa, `import_id` bilan qayta yuborilganda (fayl shart emas)
+        to'xtagan joyidan davom ettiriladi. Import hali bajarilayotgan bo'lsa - 409.
         
-        return Response({
-            'total_expenses': float(total_expenses),
-            'expenses_count': expenses_count,
-            'average_expense': float(avg_expense),
-            'max_expense': float(max_expense),
-            'min_expense': float(min_expense),
-            'expenses_by_category': expenses_by_category,
-            'expenses_by_building': expenses_by_building,
-            'top_users': top_users,
-            'daily_expenses': daily_expenses,
-            'weekly_expenses': weekly_expenses,
-            'monthly_expenses': monthly_expenses
-        })
-
-
-class DashboardStatisticsView(APIView):
+        Javob: import holati (`rows_created`, `error_count`, `errors`) va `report`
+        (`rows`, `seconds`, `rows_per_second`).
+        """,
+        tags=['Chiqimlar'],
+        request={
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'file': {'type': 'string', 'format': 'binary'},
+                    'import_id': {'type': 'integer'},
+                },
+            }
+        },
+        responses={201: ExpenseImportSerializer}
+    )
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_csv(self, request):
+        """Chiqimlarni CSV fayldan import qilish"""
+        import_id = request.data.get('import_id')
+        if import_id:
+            job = ExpenseImport.objects.filter(pk=import_id, created_by=request.user).first()
+            if job is None:
+                return Response({"error": "Import topilmadi"}, status=status.HTTP_404_NOT_FOUND)
+            if job.status == ExpenseImport.Status.DONE:
+                return Response(ExpenseImportSerializer(job).data)
+        else:
+            uploaded = request.FILES.get('file')
+            if uploaded is None:
+                return Response({"error": "CSV fayl yuborilmadi (file)"}, status=status.HTTP_400_BAD_REQUEST)
+            job = ExpenseImport.objects.create(source=importer.save_upload(uploaded), created_by=request.user)
+
+        try:
+            report = importer.run_import(
+                job, allow_created_by=request.user.username == CEO_ADMIN_USERNAME
+            )
+        except importer.ImportBusyError as exc:
+            return Response(
+                dict(ExpenseImportSerializer(job).data, error=str(exc)),
+                status=status.HTTP_409_CONFLICT
+            )
+        except (UnicodeDecodeError, csv.Error, importer.ImportFileError) as exc:
+            return Response(
+                dict(ExpenseImportSerializer(job).data, error=str(exc)),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            dict(ExpenseImportSerializer(job).data, report=report),
+            status=status.HTTP_201_CREATED
+        )
+
+
+@extend_schema_view(
+    create=extend_schema(
+        summary="Bo'laklab yuklash sessiyasini ochish",
+        description="""
+        Katta rasmni bir nechta so'rov bilan yuklash uchun sessiya ochish.
+        `size` - fayl hajmi (bayt). Keyin fayl bo'laklari `PUT` bilan yuboriladi.
+        """,
+        tags=['Chiqimlar']
+    ),
+    retrieve=extend_schema(
+        summary="Yuklash holati",
+        description="`received` - serverda saqlangan baytlar soni. Uzilishdan keyin yuklash shu joydan davom ettiriladi.",
+        tags=['Chiqimlar']
+    ),
+    update=extend_schema(
+        summary="Fayl bo'lagini yuborish",
+        description="""
+        So'rov tanasi - faylning navbatdagi bo'lagi (`application/octet-stream`).
+        `Content-Range: bytes <start>-<end>/<size>` sarlavhasi ixtiyoriy; `start`
+        serverdagi `received` ga teng bo'lishi kerak, aks holda 409 qaytariladi.
+        Oxirgi bo'lakdan keyin `status` - `complete`, sessiya ID si chiqim
+        yaratishda `upload` maydoniga beriladi.
+        """,
+        tags=['Chiqimlar'],
+        request={'application/octet-stream': {'type': 'string', 'format': 'binary'}}
+    ),
+    destroy=extend_schema(summary="Yuklashni bekor qilish", tags=['Chiqimlar']),
+)
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Katta chek rasmlarini bo'laklab va davom ettirib yuklash
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated, IsAdminOrAccountant]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(created_by=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    def perform_destroy(self, instance):
+        uploads.part_path(instance).unlink(missing_ok=True)
+        instance.delete()
+
+    def update(self, request, *args, **kwargs):
+        session = self.get_object()
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0) or None
+        except ValueError:
+            content_length = None
+        try:
+            # So'rov tanasi DRF parserlarisiz, to'g'ridan-to'g'ri faylga oqim bilan yoziladi
+            stream = request.stream or io.BytesIO()
+            uploads.write_chunk(session, stream, request.headers.get('Content-Range'), content_length)
+        except uploads.UploadError as exc:
+            session.refresh_from_db()
+            return Response(
+                dict(self.get_serializer(session).data, error=str(exc)),
+                status=exc.status
+            )
+        return Response(self.get_serializer(session).data)
+
+
+class DashboardStatisticsView(ConditionalGetMixin, APIView):
     """
     Dashboard uchun umumiy statistika API
     
     Bu API orqali boshqaruv paneli uchun barcha kerakli statistik ma'lumotlarni olish mumkin.
     """
     permission_classes = [IsAuthenticated]
+    etag_generations = DATA_GENERATIONS
     
     @extend_schema(
         summary="Umumiy dashboard statistikasi",
@@ -708,67 +718,16 @@ class DashboardStatisticsView(APIView):
     )
     def get(self, request):
         """Umumiy dashboard statistikasi"""
-        
-        # Umumiy ko'rsatkichlar
-        total_buildings = Building.objects.count()
-        total_expenses = Expense.objects.aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Byudjet statistikasi
-        budget_stats = Building.objects.aggregate(
-            total_budget=Sum('budget'),
-            total_spent=Sum('spent_amount')
-        )
-        
-        # Binolar holati bo'yicha
-        buildings_by_status = {}
-        for status_choice in Building.Status.choices:
-            count = Building.objects.filter(status=status_choice[0]).count()
-            buildings_by_status[status_choice[1]] = count
-        
-        # Top 5 binolar (xarajat bo'yicha)
-        top_buildings = list(
-            Building.objects.annotate(
-                expenses_total=Sum('expenses__amount')
-            ).order_by('-expenses_total')[:5].values(
-                'id', 'name', 'status', 'budget', 'spent_amount', 'expenses_total'
-            )
-        )
-        
-        # So'nggi 5 ta chiqim
-        recent_expenses = list(
-            Expense.objects.select_related('building', 'category').order_by('-created_at')[:5].values(
-                'id', 'description', 'amount', 'category__name', 'date', 'building__name'
-            )
-        )
-        
-        # category__name ni category ga o'zgartirish (frontend uchun)
-        for expense in recent_expenses:
-            expense['category'] = expense.pop('category__name', 'Boshqa')
-        
-        return Response({
-            # Umumiy ko'rsatkichlar
-            'total_buildings': total_buildings,
-            'total_expenses': float(total_expenses),
-            'total_budget': float(budget_stats['total_budget'] or 0),
-            'total_spent': float(budget_stats['total_spent'] or 0),
-            'remaining_budget': float((budget_stats['total_budget'] or 0) - (budget_stats['total_spent'] or 0)),
-            
-            # Holat bo'yicha
-            'buildings_by_status': buildings_by_status,
-            
-            # Top binolar
-            'top_buildings_by_expenses': top_buildings,
-            
-            # So'nggi faoliyat
-            'recent_expenses': recent_expenses
-        })
-
-
-class BuildingComparisonView(APIView):
+        payload, tokens = snapshots.dashboard()
+        return self.conditional_response(request, lambda: Response(payload), tokens=tokens)
+
+
+class BuildingComparisonView(ConditionalGetMixin, APIView):
     """
     Binolarni solishtirish uchun API
     """
     permission_classes = [IsAuthenticated]
+    etag_generations = DATA_GENERATIONS
     
     @extend_schema(
         summary="Binolarni solishtirish",
@@ -788,42 +747,17 @@ class BuildingComparisonView(APIView):
     def get(self, request):
         """Binolarni solishtirish statistikasi"""
         
-        buildings = Building.objects.annotate(
-            expenses_count=Count('expenses'),
-            expenses_total=Sum('expenses__amount')
-        ).order_by('-budget')
-        
-        comparison_data = []
-        for building in buildings:
-            budget = float(building.budget)
-            spent = float(building.spent_amount)
-            remaining = budget - spent
-            usage_percent = (spent / budget * 100) if budget > 0 else 0
-            
-            comparison_data.append({
-                'id': building.id,
-                'name': building.name,
-                'status': building.status,
-                'status_display': building.get_status_display(),
-                'budget': budget,
-                'spent_amount': spent,
-                'remaining_budget': remaining,
-                'usage_percent': round(usage_percent, 2),
-                'expenses_count': building.expenses_count,
-                'expenses_total': float(building.expenses_total or 0)
-            })
-        
-        return Response({
-            'buildings': comparison_data,
-            'total_count': len(comparison_data)
-        })
+        return self.conditional_response(request, lambda: Response(
+            cached_response_data(request, 'building-comparison', stats.building_comparison)
+        ))
 
 
-class MonthlyReportView(APIView):
+class MonthlyReportView(ConditionalGetMixin, APIView):
     """
     Oylik hisobot uchun API
     """
     permission_classes = [IsAuthenticated]
+    etag_generations = DATA_GENERATIONS
     
     @extend_schema(
         summary="Oylik hisobot",
@@ -860,7 +794,6 @@ class MonthlyReportView(APIView):
     )
     def get(self, request):
         """Oylik hisobot"""
-        from django.db.models.functions import TruncDate
         from calendar import monthrange
         
         year = request.query_params.get('year')
@@ -887,57 +820,26 @@ class MonthlyReportView(APIView):
         _, last_day = monthrange(year, month)
         end_date = date(year, month, last_day)
         
-        # Oylik chiqimlar
-        monthly_expenses = Expense.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        )
-        
-        total_amount = monthly_expenses.aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Kategoriya bo'yicha
-        by_category = {}
-        for cat in ExpenseCategory.objects.all():
-            amount = monthly_expenses.filter(category=cat).aggregate(total=Sum('amount'))['total'] or 0
-            by_category[cat.name] = float(amount)
-        
-        # Binolar bo'yicha
-        by_building = list(
-            monthly_expenses.values('building__name')
-            .annotate(total=Sum('amount'), count=Count('id'))
-            .order_by('-total')
-        )
-        
-        # Kunlik chiqimlar
-        daily_expenses = list(
-            monthly_expenses.annotate(day=TruncDate('date'))
-            .values('day')
-            .annotate(total=Sum('amount'), count=Count('id'))
-            .order_by('day')
-        )
-        
-        return Response({
+        return self.conditional_response(request, lambda: Response({
             'period': {
                 'year': year,
                 'month': month,
                 'start_date': str(start_date),
                 'end_date': str(end_date)
             },
-            'expenses': {
-                'total_amount': float(total_amount),
-                'count': monthly_expenses.count(),
-                'by_category': by_category,
-                'by_building': by_building,
-                'daily': daily_expenses
-            }
-        })
+            'expenses': cached_response_data(
+                request, 'monthly-report',
+                lambda: stats.monthly_report(start_date, end_date)
+            )
+        }))
 
 
-class WeeklyReportView(APIView):
+class WeeklyReportView(ConditionalGetMixin, APIView):
     """
     Haftalik hisobot uchun API
     """
     permission_classes = [IsAuthenticated]
+    etag_generations = DATA_GENERATIONS
     
     @extend_schema(
         summary="Haftalik hisobot",
@@ -972,38 +874,65 @@ class WeeklyReportView(APIView):
         except ValueError:
             weeks = 8
         
-        weeks_ago = timezone.now().date() - timedelta(weeks=weeks)
-        
-        weekly_data = list(
-            Expense.objects.filter(date__gte=weeks_ago)
-            .annotate(week=TruncWeek('date'))
-            .values('week')
-            .annotate(
-                total=Sum('amount'),
-                count=Count('id')
-            )
-            .order_by('week')
-        )
-        
-        # Haftalik o'rtacha
-        totals = [float(w['total'] or 0) for w in weekly_data]
-        avg_weekly = sum(totals) / len(totals) if totals else 0
-        
-        # O'sish/pasayish
-        if len(totals) >= 2:
-            change = totals[-1] - totals[-2]
-            change_percent = (change / totals[-2] * 100) if totals[-2] > 0 else 0
-        else:
-            change = 0
-            change_percent = 0
-        
-        return Response({
-            'weeks_count': weeks,
-            'weekly_data': weekly_data,
-            'summary': {
-                'total': sum(totals),
-                'average_weekly': round(avg_weekly, 2),
-                'latest_week_change': round(change, 2),
-                'change_percent': round(change_percent, 2)
-            }
-        })
+        def build_response():
+            weekly_data = cached_response_data(request, 'weekly-report', lambda: stats.weekly_report(weeks))
+        
+            # Haftalik o'rtacha
+            totals = [float(w['total'] or 0) for w in weekly_data]
+            avg_weekly = sum(totals) / len(totals) if totals else 0
+        
+            # O'sish/pasayish
+            if len(totals) >= 2:
+                change = totals[-1] - totals[-2]
+                change_percent = (change / totals[-2] * 100) if totals[-2] > 0 else 0
+            else:
+                change = 0
+                change_percent = 0
+        
+            return Response({
+                'weeks_count': weeks,
+                'weekly_data': weekly_data,
+                'summary': {
+                    'total': sum(totals),
+                    'average_weekly': round(avg_weekly, 2),
+                    'latest_week_change': round(change, 2),
+                    'change_percent': round(change_percent, 2)
+                }
+            })
+
+        return self.conditional_response(request, build_response)
+
+
+class MetricsView(APIView):
+    """
+    Prometheus formatidagi metrikalar
+
+    Barcha worker jarayonlari metrikalari qo'shib qaytariladi (qarang: metrics.py).
+    """
+    permission_classes = [CanViewMetrics]
+
+    @extend_schema(exclude=True)
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ReceiptMediaView(APIView):
+    """
+    Chek rasmini berish (`MEDIA_URL` ostida)
+
+    Fayl faqat uni ko'rishga ruxsati bor foydalanuvchiga beriladi: ceoadmin -
+    barcha chiqimlar, boshqalar - faqat o'z chiqimlari rasmlari. Baytlarni
+    proksi uzatadi (qarang: media.py).
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(exclude=True)
+    def get(self, request, name):
+        owner = None
+        if request.user.username != CEO_ADMIN_USERNAME:
+            owner = request.user
+        storage = Expense._meta.get_field('image').storage
+        # Boshqa foydalanuvchining cheki ham "topilmadi" - mavjudligi oshkor qilinmaydi
+        if not media.visible_expenses(name, owner).exists() or not storage.exists(name):
+            raise Http404
+        return media.file_response(request, storage, name)
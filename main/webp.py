@@ -0,0 +1,89 @@
+"""
+Rasmni WebP formatiga o'girish
+
+Bu modul Django'ni import qilmaydi - funksiyalar alohida jarayonlar
+(ProcessPoolExecutor) ichida ham ishlaydi va faqat baytlar bilan ishlaydi.
+
+Xotira sarfi cheklangan:
+- piksellar soni `max_pixels` dan oshsa, rasm ochilmaydi (dekompressiya bombasi);
+- JPEG `draft` rejimida darhol kichraytirib o'qiladi (1/2, 1/4, 1/8 masshtab) -
+  to'liq o'lchamdagi bitmap xotirada hosil bo'lmaydi;
+- saqlanadigan rasm `max_dimension` dan katta bo'lmaydi.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+
+QUALITY = 80
+
+# 12 MP telefon rasmi bemalol o'tadi, 50 MP dan kattasi rad etiladi
+MAX_PIXELS = 50_000_000
+
+MAX_DIMENSION = 2048
+
+
+class TooLarge(ValueError):
+    """Rasm piksellari soni ruxsat etilganidan ko'p"""
+
+
+def open_image(fileobj, max_pixels=MAX_PIXELS):
+    """Rasmni ochish (faqat sarlavha o'qiladi) va piksellar sonini tekshirish"""
+    image = Image.open(fileobj)
+    if image.width * image.height > max_pixels:
+        raise TooLarge(f"Rasm juda katta: {image.width}x{image.height}")
+    return image
+
+
+def _fit(size, bound):
+    """Eng uzun tomoni `bound` dan oshmaydigan o'lcham (proporsiya saqlanadi)"""
+    width, height = size
+    scale = min(1.0, bound / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _convert(image):
+    """WebP saqlay oladigan rejimga o'tkazish (shaffoflik saqlanadi)"""
+    has_alpha = image.mode in ('LA', 'PA', 'RGBa') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def _save(image, quality):
+    output = io.BytesIO()
+    # Metadata (EXIF, XMP, ICC) yozilmaydi - faqat piksellar
+    image.save(output, format='WEBP', quality=quality)
+    return output.getvalue()
+
+
+def encode(data, sizes=(), quality=QUALITY, full=True, max_dimension=MAX_DIMENSION, max_pixels=MAX_PIXELS):
+    """
+    Rasm baytlarini WebP ga o'girish
+
+    `sizes` - kichraytirilgan nusxalar (eng uzun tomoni shu o'lchamdan oshmaydi).
+    Natija: (to'liq rasm yoki `full=False` bo'lsa None, {o'lcham: nusxa}).
+    """
+    image = open_image(io.BytesIO(data), max_pixels)
+    # EXIF orientatsiyasi burilgandan keyin ham eng uzun tomon bir xil -
+    # kvadrat chegaraga kichraytirish burishdan oldin bajarilishi mumkin
+    target = max_dimension if full else max(sizes)
+    if image.mode in ('1', 'P'):
+        # Palitrali rasm faqat NEAREST bilan kichraytiriladi - avval RGB(A) ga
+        image = _convert(image)
+    size = _fit(image.size, target)
+    if size != image.size:
+        # JPEG: dekoder o'zi 1/2, 1/4 yoki 1/8 masshtabda o'qiydi (natija `size` dan kichik emas)
+        image.draft(None, size)
+    image.thumbnail((target, target), reducing_gap=3.0)
+    ImageOps.exif_transpose(image, in_place=True)
+    if image.mode not in ('RGB', 'RGBA'):
+        # Masalan CMYK JPEG yoki kulrang PNG
+        image = _convert(image)
+
+    encoded = _save(image, quality) if full else None
+
+    variants = {}
+    # Kattasidan kichigiga: har bir nusxa oldingisidan kichraytiriladi (rasm joyida o'zgaradi)
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), reducing_gap=3.0)
+        variants[size] = _save(image, quality)
+    return encoded, variants